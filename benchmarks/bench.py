@@ -0,0 +1,233 @@
+"""
+Benchmarks of the hot paths of searoute: import, network loading, KD-tree, search,
+route processing and GeoJson building.
+
+The corpus of origin-destination pairs is drawn from the ports of the package with a fixed
+seed, across ocean basins and with several sets of restrictions, so that runs are comparable.
+Each phase is timed `--repeat` times (min and median are reported), then run once more under
+tracemalloc for its peak memory.
+
+benchmarks/baseline.json is recorded with the versions pinned in requirements.txt, compare with
+a baseline of the same environment (`meta` gives the versions of a run).
+
+Examples
+--------
+python benchmarks/bench.py --output results.json
+python benchmarks/bench.py --baseline benchmarks/baseline.json --tolerance 0.25  # exits with 1 on regressions
+python benchmarks/bench.py --save-baseline  # updates benchmarks/baseline.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from copy import copy
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import geojson
+import networkx as nx
+import numpy as np
+from geojson import Feature, LineString
+
+import searoute
+from searoute.main import setup_M, setup_P
+from searoute.utils import distance_length, process_route
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# (min lon, min lat, max lon, max lat)
+BASINS = {
+    'north_atlantic': (-80, 20, 0, 65),
+    'south_atlantic': (-60, -45, 20, 0),
+    'mediterranean': (-5, 30, 36, 46),
+    'indian': (40, -40, 100, 25),
+    'north_pacific': (100, 0, 180, 60),
+    'east_pacific': (-180, -50, -70, 60),
+    'oceania': (110, -50, 180, 0),
+}
+
+RESTRICTIONS = [['northwest'], [], ['northwest', 'suez'], ['northwest', 'panama'], ['northwest', 'babalmandab']]
+
+
+def corpus(pairs=40, seed=7):
+    """
+    Origin-destination pairs between ports, across all pairs of basins
+
+    Returns
+    -------
+    A list of (origin, destination, restrictions)
+    """
+    rng = random.Random(seed)
+    ports = sorted(setup_P().nodes)
+    basins = {name: [p for p in ports if box[0] <= p[0] <= box[2] and box[1] <= p[1] <= box[3]]
+              for name, box in BASINS.items()}
+    names = sorted(basins)
+    routes = []
+    for k in range(pairs):
+        a, b = names[k % len(names)], names[(k * 3 + k // len(names)) % len(names)]
+        routes.append((rng.choice(basins[a]), rng.choice(basins[b]), RESTRICTIONS[k % len(RESTRICTIONS)]))
+    return routes
+
+
+def measure(function, repeat):
+    """Seconds of the runs of a function, and peak memory in KB of one more run"""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak / 1024
+
+
+def phases(routes):
+    """Phases to benchmark, name -> (function, number of operations), in order"""
+    # a copy with its own indexes, the ones of setup_M() are shared by its other shallow copies
+    M = copy(setup_M())
+    M._indexes = {}
+    origins = [o for o, _, _ in routes]
+    destinations = [d for _, d, _ in routes]
+    paths = [M.shortest_path(o, d, restrictions=r) for o, d, r in routes]
+    lines = [process_route(path, M, return_passages=True)[0] for path in paths]
+
+    def import_():
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        subprocess.run([sys.executable, '-c', 'import searoute'], check=True, env=env, cwd=ROOT)
+
+    def kdtree_build():
+        M.update_kdtree()
+
+    def kdtree_query():
+        for point in origins + destinations:
+            M.kdtree.query(point)
+
+    def search_graph():
+        fresh = copy(M)
+        fresh._indexes = {}
+        fresh.search_graph
+
+    def shortest_path():
+        for o, d, r in routes:
+            M.shortest_path(o, d, restrictions=r)
+
+    def process_route_():
+        for path in paths:
+            process_route(path, M, return_passages=True)
+
+    def distance_length_():
+        for line in lines:
+            distance_length(line, units='naut')
+
+    def geojson_():
+        for line in lines:
+            geojson.dumps(Feature(geometry=LineString(line), properties={'length': 0.0, 'units': 'naut'}))
+
+    def searoute_():
+        for o, d, r in routes:
+            searoute.searoute(o, d, restrictions=r, M=M, return_passages=True)
+
+    return {
+        'import': (import_, 1),
+        'load_marnet': (setup_M.__wrapped__, 1),
+        'load_ports': (setup_P.__wrapped__, 1),
+        'kdtree_build': (kdtree_build, 1),
+        'kdtree_query': (kdtree_query, 2 * len(routes)),
+        'search_graph': (search_graph, 1),
+        'shortest_path': (shortest_path, len(routes)),
+        'process_route': (process_route_, len(routes)),
+        'distance_length': (distance_length_, len(routes)),
+        'geojson': (geojson_, len(routes)),
+        'searoute': (searoute_, len(routes)),
+    }
+
+
+def run(pairs=40, seed=7, repeat=5, only=None):
+    """
+    Runs the benchmarks
+
+    Returns
+    -------
+    dict with `meta` (environment and corpus) and `results`, phase -> `ops`, `min_s`, `median_s`,
+    `per_op_us` (of the min) and `peak_kb`
+    """
+    routes = corpus(pairs, seed)
+    digest = hashlib.sha1(json.dumps(routes).encode()).hexdigest()
+    results = {}
+    for name, (function, ops) in phases(routes).items():
+        if only and name not in only:
+            continue
+        seconds, peak = measure(function, repeat)
+        results[name] = {'ops': ops, 'min_s': min(seconds), 'median_s': statistics.median(seconds),
+                         'per_op_us': min(seconds) / ops * 1e6, 'peak_kb': peak}
+        print(f"{name:<16}{results[name]['min_s'] * 1000:>10.2f} ms{results[name]['per_op_us']:>12.1f} us/op"
+              f"{peak:>12.0f} KB", file=sys.stderr)
+    meta = {'python': platform.python_version(), 'platform': platform.platform(), 'numpy': np.__version__,
+            'networkx': nx.__version__, 'pairs': pairs, 'seed': seed, 'repeat': repeat, 'corpus': digest}
+    return {'meta': meta, 'results': results}
+
+
+def compare(report, baseline, tolerance=0.25):
+    """
+    Phases slower than the baseline by more than the tolerance, comparing the min times
+
+    Returns
+    -------
+    A list of (phase, baseline seconds, seconds, ratio)
+    """
+    if report['meta']['corpus'] != baseline['meta']['corpus']:
+        print('Warning: the corpus differs from the one of the baseline', file=sys.stderr)
+    regressions = []
+    for name, result in report['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['min_s'] / base['min_s']
+        print(f"{name:<16}{base['min_s'] * 1000:>10.2f} ms{result['min_s'] * 1000:>10.2f} ms{ratio:>8.2f}x"
+              + ('  REGRESSION' if ratio > 1 + tolerance else ''), file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append((name, base['min_s'], result['min_s'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of searoute.')
+    parser.add_argument('--pairs', type=int, default=40, help='number of origin-destination pairs, default 40')
+    parser.add_argument('--seed', type=int, default=7, help='seed of the corpus, default 7')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs of each phase, default 5')
+    parser.add_argument('--phases', nargs='+', help='phases to run, default all')
+    parser.add_argument('--output', help='JSON file of the results')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before a regression, default 0.25')
+    parser.add_argument('--save-baseline', action='store_true', help=f'write the results to {BASELINE}')
+    args = parser.parse_args(argv)
+
+    report = run(args.pairs, args.seed, args.repeat, args.phases)
+    for path in ([args.output] if args.output else []) + ([BASELINE] if args.save_baseline else []):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(name for name, *_ in regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
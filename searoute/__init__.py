@@ -1,4 +1,7 @@
-from .main import searoute, setup_P, setup_M, from_nodes_edges_set
+from .main import searoute, searoute_alternatives, reachable_ports, optimize_rotation, hub_routes, fleet_costs, setup_P, setup_M, from_nodes_edges_set
 from .classes import marnet, ports
+from .classes.route_book import RouteBook
+from .classes.cost_overlay import CostOverlay
+from .classes.map_matcher import MapMatcher
 
-__all__ = ['searoute', 'setup_P', 'setup_M', 'from_nodes_edges_set', 'marnet', 'ports']
+__all__ = ['searoute', 'searoute_alternatives', 'reachable_ports', 'optimize_rotation', 'hub_routes', 'fleet_costs', 'setup_P', 'setup_M', 'from_nodes_edges_set', 'marnet', 'ports', 'RouteBook', 'CostOverlay', 'MapMatcher']
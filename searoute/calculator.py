@@ -0,0 +1,364 @@
+"""
+Sea Route Calculator, a Tkinter application computing the distance, duration and bunker cost
+of a voyage between ports, through waypoints.
+
+The network is loaded in a background thread when the window opens, and the legs are computed
+by a pool of worker threads, so the window stays responsive. Legs are cached: editing a waypoint
+only recomputes the legs before and after it.
+
+Run with `python -m searoute.calculator`.
+"""
+import bisect
+import re
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import tkinter as tk
+from tkinter import messagebox
+from tkinter import ttk
+
+from searoute.main import searoute, setup_M, setup_P
+from searoute.data.ports_dict import node_list
+
+
+def normalize_port_name(port_name):
+    return re.sub(r'\s+', '', port_name).lower()
+
+
+class PortIndex:
+    """
+    Index of the port names, for lookups and completions without scanning all ports
+
+    Parameters
+    ----------
+    ports : dict of (lon, lat) -> port attributes with `name`, default the ports of the package
+    """
+
+    def __init__(self, ports=None):
+        ports = node_list if ports is None else ports
+        self.coords = {}
+        self.names = {}
+        for coords, port_info in ports.items():
+            key = normalize_port_name(port_info['name'])
+            if key not in self.coords:
+                self.coords[key] = [port_info['x'], port_info['y']]
+                self.names[key] = port_info['name']
+        self.keys = sorted(self.coords)
+
+    def lookup(self, port_name):
+        """Coordinates [lon, lat] of a port name, ignoring case and spaces"""
+        coords = self.coords.get(normalize_port_name(port_name))
+        if coords is None:
+            raise ValueError("항구 이름을 찾을 수 없습니다: {}".format(port_name))
+        return coords
+
+    def complete(self, prefix, limit=20):
+        """Port names starting with a prefix, ignoring case and spaces"""
+        prefix = normalize_port_name(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        names = []
+        for key in self.keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            names.append(self.names[key])
+        return names
+
+
+_port_index = None
+
+
+def port_name_to_coords(port_name):
+    global _port_index
+    if _port_index is None:
+        _port_index = PortIndex()
+    return _port_index.lookup(port_name)
+
+
+def _load_networks():
+    M = setup_M()
+    P = setup_P()
+    # built once, before the first search
+    M.search_graph
+    return M, P
+
+
+class LegCache:
+    """Lengths in nautical miles of the legs between locations, computed once"""
+
+    def __init__(self):
+        self.lengths = {}
+        self.lock = threading.Lock()
+
+    def get(self, origin, destination):
+        with self.lock:
+            return self.lengths.get((tuple(origin), tuple(destination)))
+
+    def compute(self, origin, destination, networks):
+        length = self.get(origin, destination)
+        if length is None:
+            M, P = networks.result()
+            route = searoute(origin, destination, units='naut', M=M, P=P)
+            length = route.properties['length']
+            with self.lock:
+                self.lengths[(tuple(origin), tuple(destination))] = length
+        return length
+
+
+class Calculator:
+    """
+    The calculator window
+
+    Parameters
+    ----------
+    max_workers : int, default 4, number of threads computing the legs
+    """
+
+    POLL_MS = 100
+
+    def __init__(self, max_workers=4):
+        self.index = PortIndex()
+        self.cache = LegCache()
+        self.executor = ThreadPoolExecutor(max_workers)
+        self.networks = self.executor.submit(_load_networks)
+        self.job = None
+        self.waypoint_entries = []
+        self._build()
+        self.app.after(self.POLL_MS, self._poll_networks)
+
+    def _build(self):
+        app = self.app = tk.Tk()
+        app.title("Sea Route Calculator")
+        app.protocol("WM_DELETE_WINDOW", self.close)  # Close the app properly
+
+        main_frame = ttk.Frame(app, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        input_frame = ttk.Frame(main_frame)
+        input_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        ttk.Label(input_frame, text="출발지 항구 이름").grid(column=0, row=0, sticky=tk.W)
+        self.entry_origin_name = self._port_entry(input_frame)
+        self.entry_origin_name.grid(column=1, row=0, sticky=(tk.W, tk.E))
+        self.entry_origin_name.bind("<Return>", self.focus_next_widget)
+
+        ttk.Label(input_frame, text="도착지 항구 이름").grid(column=0, row=1, sticky=tk.W)
+        self.entry_destination_name = self._port_entry(input_frame)
+        self.entry_destination_name.grid(column=1, row=1, sticky=(tk.W, tk.E))
+        self.entry_destination_name.bind("<Return>", self.focus_next_widget)
+
+        self.entry_speed = self._number_entry(input_frame, "선박 속도 (Knot)", 2)
+        self.entry_mfo = self._number_entry(input_frame, "MFO 소모량 (톤/일)", 3)
+        self.entry_mgo = self._number_entry(input_frame, "MGO 소모량 (톤/일)", 4)
+        self.entry_bunker_price = self._number_entry(input_frame, "Bunker 가격 ($/톤)", 5)
+
+        self.waypoints_frame = ttk.LabelFrame(main_frame, text="경유지")
+        self.waypoints_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
+
+        ttk.Button(main_frame, text="경유지 추가", command=self.add_waypoint).grid(row=2, column=0, sticky=(tk.W, tk.E))
+
+        self.calculate_button = ttk.Button(main_frame, text="계산", command=self.calculate_route)
+        self.calculate_button.grid(row=3, column=0, sticky=(tk.W, tk.E))
+
+        self.cancel_button = ttk.Button(main_frame, text="취소", command=self.cancel, state=tk.DISABLED)
+        self.cancel_button.grid(row=4, column=0, sticky=(tk.W, tk.E))
+
+        reset_button = ttk.Button(main_frame, text="리셋", command=self.reset_fields)
+        reset_button.grid(row=5, column=0, sticky=(tk.W, tk.E))
+
+        self.progress = ttk.Progressbar(main_frame, mode='determinate')
+        self.progress.grid(row=6, column=0, sticky=(tk.W, tk.E))
+        self.status = tk.StringVar(value="네트워크 로딩 중...")
+        ttk.Label(main_frame, textvariable=self.status).grid(row=7, column=0, sticky=(tk.W, tk.E))
+
+        self.result = tk.StringVar()
+        result_label = ttk.Label(main_frame, textvariable=self.result, wraplength=400)
+        result_label.grid(row=8, column=0, sticky=(tk.W, tk.E))
+
+        for child in main_frame.winfo_children():
+            child.grid_configure(padx=5, pady=5)
+
+        app.bind_all("<Tab>", self.focus_next_widget)
+
+    def _port_entry(self, master):
+        """A port name entry completing the names from the index"""
+        entry = ttk.Combobox(master)
+        entry.bind("<KeyRelease>", self._complete)
+        return entry
+
+    def _complete(self, event):
+        if event.keysym in ('Return', 'Tab', 'Up', 'Down', 'Escape'):
+            return
+        event.widget['values'] = self.index.complete(event.widget.get())
+
+    def _number_entry(self, master, label, row):
+        ttk.Label(master, text=label).grid(column=0, row=row, sticky=tk.W)
+        entry = ttk.Entry(master)
+        entry.grid(column=1, row=row, sticky=(tk.W, tk.E))
+        entry.bind("<Return>", self.focus_next_widget)
+        return entry
+
+    def _poll_networks(self):
+        if not self.networks.done():
+            self.app.after(self.POLL_MS, self._poll_networks)
+        elif self.networks.exception() is not None:
+            self.status.set(f"네트워크 로딩 실패: {self.networks.exception()}")
+        elif self.job is None:
+            self.status.set("준비 완료")
+
+    def calculate_route(self, event=None):
+        try:
+            waypoints = [self.entry_origin_name.get()] + [entry.get() for entry in self.waypoint_entries if entry.get()] + [self.entry_destination_name.get()]
+
+            if len(waypoints) < 2:
+                raise ValueError("최소한 출발지와 도착지를 입력해야 합니다.")
+
+            speed_knot = float(self.entry_speed.get())
+            mfo_consumption = float(self.entry_mfo.get())
+            mgo_consumption = float(self.entry_mgo.get())
+            bunker_price = float(self.entry_bunker_price.get())
+
+            coords = [self.index.lookup(waypoint) for waypoint in waypoints]
+        except Exception as e:
+            self.show_error(e)
+            return
+
+        self.cancel()
+        legs = list(zip(coords, coords[1:]))
+        futures = [self.executor.submit(self.cache.compute, origin, destination, self.networks) for origin, destination in legs]
+        self.job = {
+            'waypoints': waypoints, 'futures': futures, 'speed_knot': speed_knot,
+            'mfo_consumption': mfo_consumption, 'mgo_consumption': mgo_consumption, 'bunker_price': bunker_price,
+        }
+        self.progress.configure(maximum=len(futures), value=0)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.app.after(self.POLL_MS, self._poll_job, self.job)
+
+    def _poll_job(self, job):
+        if job is not self.job:
+            # cancelled or replaced by a new calculation
+            return
+        done = sum(future.done() for future in job['futures'])
+        self.progress.configure(value=done)
+        if done < len(job['futures']):
+            self.status.set(f"계산 중... {done}/{len(job['futures'])}" if self.networks.done() else "네트워크 로딩 중...")
+            self.app.after(self.POLL_MS, self._poll_job, job)
+            return
+
+        self.job = None
+        self.cancel_button.configure(state=tk.DISABLED)
+        try:
+            lengths = [future.result() for future in job['futures']]
+        except Exception as e:
+            self.status.set("")
+            self.show_error(e)
+            return
+        self.status.set("준비 완료")
+        self.show_result(job, lengths)
+
+    def show_result(self, job, lengths):
+        waypoints, speed_knot = job['waypoints'], job['speed_knot']
+        route_details = []
+        total_distance = 0
+        total_duration = 0
+        for i, distance_nm in enumerate(lengths):
+            duration_hours = distance_nm / speed_knot if speed_knot > 0 else 0
+            duration_days = duration_hours / 24  # 시간을 일로 변환
+            total_distance += distance_nm
+            total_duration += duration_hours
+            route_details.append(f"{waypoints[i]} → {waypoints[i+1]}: {distance_nm:.1f} n.miles, {duration_days:.2f} days")
+
+        total_duration_days = total_duration / 24
+        mfo_cost = job['mfo_consumption'] * total_duration_days * job['bunker_price']
+        mgo_cost = job['mgo_consumption'] * total_duration_days * job['bunker_price']
+        total_cost = mfo_cost + mgo_cost
+
+        result_text = "경로 세부 정보:\n" + "\n".join(route_details) + f"\n\n총 거리: {total_distance:.1f} n.miles\n"
+        result_text += f"총 소요 시간: {total_duration_days:.2f} days\n"
+        result_text += f"총 비용: ${total_cost:.2f}\n"
+        result_text += f"출발지: {waypoints[0]}\n"
+        result_text += f"도착지: {waypoints[-1]}"
+
+        self.result.set(result_text)
+
+    def show_error(self, e):
+        error_message = f"오류 발생: {str(e)}\n"
+        error_message += f"오류 타입: {type(e).__name__}\n"
+        error_message += f"오류 위치:\n{traceback.format_exc()}"
+        messagebox.showerror("오류", error_message)
+        print(error_message)  # 콘솔에도 오류 메시지 출력
+
+    def cancel(self):
+        """Cancels the legs not started, the legs being computed are kept in the cache"""
+        if self.job is not None:
+            for future in self.job['futures']:
+                future.cancel()
+            self.job = None
+            self.status.set("취소됨")
+        self.progress.configure(value=0)
+        self.cancel_button.configure(state=tk.DISABLED)
+
+    def reset_fields(self):
+        self.cancel()
+        self.entry_origin_name.delete(0, tk.END)
+        self.entry_destination_name.delete(0, tk.END)
+        self.entry_speed.delete(0, tk.END)
+        self.entry_mfo.delete(0, tk.END)
+        self.entry_mgo.delete(0, tk.END)
+        self.entry_bunker_price.delete(0, tk.END)
+        for entry in self.waypoint_entries:
+            entry.master.destroy()
+        self.waypoint_entries.clear()
+        self.result.set("")
+
+    def add_waypoint(self, event=None):
+        waypoint_frame = ttk.Frame(self.waypoints_frame)
+        waypoint_frame.pack(fill=tk.X, padx=5, pady=2)
+
+        waypoint_entry = self._port_entry(waypoint_frame)
+        waypoint_entry.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        waypoint_entry.bind("<Return>", self.on_waypoint_enter)
+
+        remove_button = ttk.Button(waypoint_frame, text="삭제", command=lambda: self.remove_waypoint(waypoint_frame, waypoint_entry))
+        remove_button.pack(side=tk.RIGHT)
+
+        self.waypoint_entries.append(waypoint_entry)
+
+        waypoint_entry.focus()  # 새로 추가된 입력 칸에 포커스 설정
+
+    def on_waypoint_enter(self, event):
+        if event.widget.get().strip():
+            self.add_waypoint()
+        else:
+            event.widget.tk_focusNext().focus()
+        return "break"
+
+    def remove_waypoint(self, frame, entry):
+        frame.destroy()
+        if entry in self.waypoint_entries:
+            self.waypoint_entries.remove(entry)
+
+    @staticmethod
+    def focus_next_widget(event):
+        event.widget.tk_focusNext().focus()
+        return "break"
+
+    def close(self):
+        # pending futures are cancelled here, cancel_futures of shutdown needs Python 3.9
+        self.cancel()
+        self.networks.cancel()
+        self.executor.shutdown(wait=False)
+        self.app.destroy()
+
+    def run(self):
+        self.app.mainloop()
+
+
+def main():
+    Calculator().run()
+
+
+if __name__ == '__main__':
+    main()
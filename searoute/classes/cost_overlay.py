@@ -0,0 +1,134 @@
+class CostOverlay:
+    """
+    Edge costs layered over a Marnet, without changing the Marnet.
+
+    The cost of an edge used by searches becomes `weight * factor + penalty`,
+    factors and penalties being set on a few edges (e.g. weather, piracy risk,
+    congestion) and updated in place. The effective weights are maintained
+    incrementally, so an update costs O(1) per edge and searches given the
+    overlay have no extra cost.
+
+    Lower bounds computed on the weights of the Marnet (e.g. landmarks) remain valid
+    with the overlay once multiplied by `scale`, so they are never rebuilt for an update.
+
+    Parameters
+    ----------
+    M : the Marnet
+
+    Examples
+    --------
+    >>> overlay = CostOverlay(M)
+    >>> overlay.set(u, v, factor=1.5)             # 50% more expensive
+    >>> overlay.set_passage('babalmandab', penalty=2000)
+    >>> sr.searoute(origin, destination, M=M, overlay=overlay)
+    """
+
+    def __init__(self, M):
+        self.M = M
+        self.costs = {}
+        self.version = 0
+        # identifies the overlay in caches with its version, unlike its id it is never reused
+        self.token = object()
+        self._search_graph = None
+        self._weights = None
+        self._factors = {}
+
+    def __len__(self):
+        return len(self.costs)
+
+    def __contains__(self, edge):
+        return self._key(*edge) in self.costs
+
+    @staticmethod
+    def _key(u, v):
+        u, v = tuple(u), tuple(v)
+        return (u, v) if u <= v else (v, u)
+
+    def set(self, u, v, factor=1.0, penalty=0.0):
+        """
+        Set the cost of an edge
+
+        Parameters
+        ----------
+        u, v : nodes (lon, lat) of the edge
+        factor : float, default 1, multiplier of the weight
+        penalty : float, default 0, added to the weight (km)
+        """
+        self.update({(u, v): (factor, penalty)})
+
+    def update(self, costs):
+        """
+        Set the costs of many edges
+
+        Parameters
+        ----------
+        costs : dict of (u, v) -> (factor, penalty)
+        """
+        sg = self._sync()
+        for (u, v), (factor, penalty) in costs.items():
+            if factor < 0:
+                raise ValueError(f'Factor of edge {u}-{v} must be positive')
+            iu, iv = sg.index.get(tuple(u)), sg.index.get(tuple(v))
+            e = sg.edge(iu, iv) if iu is not None and iv is not None else None
+            if e is None:
+                raise KeyError(f'No edge {u}-{v} in the Marnet')
+            if sg.weights[e] * factor + penalty < 0:
+                raise ValueError(f'Cost of edge {u}-{v} must be positive')
+            key = self._key(u, v)
+            if factor == 1 and penalty == 0:
+                self.costs.pop(key, None)
+                self._factors.pop(key, None)
+            else:
+                self.costs[key] = (factor, penalty)
+                self._factors[key] = factor if penalty >= 0 else 0
+            self._weights[e] = sg.weights[e] * factor + penalty
+        self.version += 1
+
+    def set_passage(self, passage, factor=1.0, penalty=0.0):
+        """Set the cost of all edges of a passage"""
+        sg = self._sync()
+        bit = sg.passage_bits.get(passage, 0)
+        self.update({(sg.nodes[sg.edges_u[e]], sg.nodes[sg.edges_v[e]]): (factor, penalty)
+                     for e, bits in enumerate(sg.edge_passages) if bits & bit})
+
+    def remove(self, u, v):
+        """Remove the cost of an edge"""
+        self.set(u, v)
+
+    def clear(self):
+        """Remove all costs"""
+        self.update({edge: (1.0, 0.0) for edge in self.costs})
+
+    @property
+    def scale(self):
+        """
+        Multiplier making lower bounds of the Marnet weights valid lower bounds of the overlay costs,
+        1 unless an edge is cheaper with the overlay
+        """
+        return min(1.0, min(self._factors.values(), default=1.0))
+
+    def weights(self, search_graph=None):
+        """
+        Effective weights of the edges of the search graph of the Marnet
+
+        Parameters
+        ----------
+        search_graph : the SearchGraph, default None uses the one of the Marnet
+        """
+        sg = self._sync()
+        if search_graph is not None and search_graph is not sg:
+            raise ValueError('Overlay was built for another network')
+        return self._weights
+
+    def _sync(self):
+        # the Marnet was changed, costs are mapped to its new search graph
+        sg = self.M.search_graph
+        if sg is not self._search_graph:
+            self._search_graph = sg
+            self._weights = list(sg.weights)
+            for (u, v), (factor, penalty) in self.costs.items():
+                iu, iv = sg.index.get(u), sg.index.get(v)
+                e = sg.edge(iu, iv) if iu is not None and iv is not None else None
+                if e is not None:
+                    self._weights[e] = sg.weights[e] * factor + penalty
+        return sg
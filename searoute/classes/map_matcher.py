@@ -0,0 +1,290 @@
+import math
+from collections import OrderedDict, deque, namedtuple
+from itertools import islice
+
+import numpy as np
+
+from ..utils import distance
+
+# km per degree of latitude, on a sphere of 6371 km
+KM_PER_DEGREE = 6371 * math.pi / 180
+
+Match = namedtuple('Match', ['time', 'lon', 'lat', 'edge', 'offset', 'distance', 'position', 'nodes'])
+Match.__doc__ = """
+A position matched onto the Marnet.
+
+time, lon, lat : the record
+edge : (u, v) nodes of the matched edge, None if no edge is within the search radius
+offset : distance in km from u along the edge
+distance : distance in km between the position and the edge
+position : (lon, lat) of the matched point on the edge
+nodes : nodes of the Marnet passed since the previous matched position,
+    concatenated over the matches they build the node sequence of the track
+"""
+
+# moves[j]: transitions (previous state, score gain, via) into the candidate j
+_Column = namedtuple('_Column', ['record', 'candidates', 'score', 'back', 'moves'])
+
+
+class MapMatcher:
+    """
+    Streaming map-matching of positions (AIS tracks) onto the edges of a Marnet.
+
+    The most likely sequence of edges is found with a hidden Markov model:
+    a position is emitted by the edges close to it (gaussian of the distance to the edge),
+    and a transition between two positions is likely when the distance along the
+    network is close to the great circle distance between them.
+
+    Records are read in batches and their candidate edges looked up together from
+    the spatial index of the edges. Viterbi decoding runs with a fixed lag: a position
+    is decided once `lag` more positions are known, so memory does not grow with the track.
+    Network distances come from small bounded searches, cached by node.
+
+    Parameters
+    ----------
+    M : the Marnet
+    sigma : float, default 10, standard deviation in km of the distance to the lanes
+    beta : float, default 20, scale in km of the difference between network and great circle distances
+    radius : float, default 50, search radius in km of the candidate edges
+    candidates : int, default 5, maximum number of candidate edges of a position
+    lag : int, default 10, number of positions read before deciding a position
+    batch_size : int, default 1024, number of records looked up together
+    cache_size : int, default 4096, number of bounded searches kept
+
+    Examples
+    --------
+    >>> matcher = MapMatcher(sr.setup_M())
+    >>> for match in matcher.match(records):  # iterable of (time, lon, lat)
+    ...     print(match.time, match.edge, match.offset, match.nodes)
+    """
+
+    def __init__(self, M, sigma=10.0, beta=20.0, radius=50.0, candidates=5, lag=10, batch_size=1024, cache_size=4096):
+        self.M = M
+        self.sigma = sigma
+        self.beta = beta
+        self.radius = radius
+        self.candidates = candidates
+        self.lag = lag
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._search_graph = None
+
+    def _sync(self):
+        sg = self.M.search_graph
+        if sg is not self._search_graph:
+            self._search_graph = sg
+            a, b = sg.edge_segments()
+            self._starts = a
+            self._vectors = b - a
+            self._cells = {}
+            self._searches = OrderedDict()
+        return sg
+
+    def match(self, records):
+        """
+        Match positions onto the Marnet
+
+        Parameters
+        ----------
+        records : iterable of (time, lon, lat) of a track, in time order
+
+        Returns
+        -------
+        A generator of Match, one per record and in the same order
+        """
+        self._sync()
+        window = deque()
+        records = iter(records)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            for record, candidates in zip(batch, self._candidates(batch)):
+                yield from self._step(window, record, candidates)
+        yield from self._flush(window)
+
+    def _cell(self, cx, cy):
+        """Edges close to a cell of the spatial index and their segments"""
+        cached = self._cells.get((cx, cy))
+        if cached is not None:
+            return cached
+
+        sg = self._search_graph
+        size = sg.GRID_SIZE
+        grid = sg.edge_grid()
+        latitude = min(max(abs(cy * size), abs((cy + 1) * size)), 89.0)
+        rows = math.ceil(self.radius / (KM_PER_DEGREE * size))
+        columns = math.ceil(self.radius / (KM_PER_DEGREE * size * math.cos(math.radians(latitude))))
+        turn = round(360 / size)
+        edges = set()
+        for x in range(cx - columns, cx + columns + 1):
+            for y in range(cy - rows, cy + rows + 1):
+                for shift in (-turn, 0, turn):
+                    edges.update(grid.get((x + shift, y), ()))
+        edges = np.array(sorted(edges), dtype=int)
+        cached = self._cells[(cx, cy)] = (edges, self._starts[edges], self._vectors[edges])
+        return cached
+
+    def _candidates(self, batch):
+        """Candidate edges of a batch of records, lists of (edge, fraction along the edge, distance km)"""
+        coords = np.array([record[1:3] for record in batch], dtype=float)
+        cells = np.floor(coords / self._search_graph.GRID_SIZE).astype(int)
+        keys, inverse = np.unique(cells, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        result = [[] for _ in batch]
+        for k, (cx, cy) in enumerate(keys.tolist()):
+            edges, starts, vectors = self._cell(cx, cy)
+            if not len(edges):
+                continue
+            members = np.flatnonzero(inverse == k)
+            points = coords[members]
+
+            # equirectangular plane around each position, in degrees of latitude
+            scale = np.cos(np.radians(points[:, 1]))[:, None]
+            px = ((points[:, None, 0] - starts[None, :, 0] + 180) % 360 - 180) * scale
+            py = points[:, None, 1] - starts[None, :, 1]
+            vx = vectors[None, :, 0] * scale
+            vy = np.broadcast_to(vectors[None, :, 1], px.shape)
+            length2 = vx * vx + vy * vy
+            with np.errstate(invalid='ignore', divide='ignore'):
+                t = np.clip(np.where(length2 > 0, (px * vx + py * vy) / length2, 0), 0, 1)
+            dist = np.hypot(px - t * vx, py - t * vy) * KM_PER_DEGREE
+
+            for row, i in enumerate(members.tolist()):
+                close = np.flatnonzero(dist[row] <= self.radius)
+                if len(close) > self.candidates:
+                    close = close[np.argpartition(dist[row, close], self.candidates)[:self.candidates]]
+                result[i] = [(e, f, d) for e, f, d in zip(edges[close].tolist(), t[row, close].tolist(), dist[row, close].tolist())]
+        return result
+
+    def _search(self, node, cutoff):
+        """Bounded search from a node, (distances, predecessors) cached by node"""
+        searches = self._searches
+        cached = searches.get(node)
+        if cached is not None and cached[0] >= cutoff:
+            searches.move_to_end(node)
+            return cached[1], cached[2]
+        # larger searches are reused by the next positions
+        cutoff = max(cutoff, 4 * self.radius)
+        dist, pred = self._search_graph.neighbourhood(node, cutoff)
+        searches[node] = (cutoff, dist, pred)
+        searches.move_to_end(node)
+        if len(searches) > self.cache_size:
+            searches.popitem(last=False)
+        return dist, pred
+
+    def _step(self, window, record, candidates):
+        if not candidates:
+            yield from self._flush(window)
+            yield Match(record[0], record[1], record[2], None, None, None, None, [])
+            return
+
+        emission = [-0.5 * (d / self.sigma) ** 2 for _, _, d in candidates]
+        if not window:
+            window.append(_Column(record, candidates, emission, [None] * len(candidates), None))
+            return
+
+        sg = self._search_graph
+        edges_u, edges_v, weights = sg.edges_u, sg.edges_v, sg.weights
+        previous = window[-1]
+        gc = distance(previous.record[1:3], record[1:3])
+        cutoff = 2 * gc + 2 * self.radius
+        inf = float('inf')
+
+        score = [-inf] * len(candidates)
+        back = [None] * len(candidates)
+        moves = [[] for _ in candidates]
+        ends = [(edges_u[e], f * weights[e], edges_v[e], (1 - f) * weights[e]) for e, f, _ in candidates]
+        for i, (e1, f1, _) in enumerate(previous.candidates):
+            base = previous.score[i]
+            if base == -inf:
+                continue
+            w1 = weights[e1]
+            starts = ((edges_u[e1], f1 * w1), (edges_v[e1], (1 - f1) * w1))
+            searches = [(x1, c1, self._search(x1, cutoff)[0]) for x1, c1 in starts]
+            for j, (e2, f2, _) in enumerate(candidates):
+                if e1 == e2:
+                    route, via = abs(f1 - f2) * w1, (i, None, None, 0)
+                else:
+                    route, via = inf, None
+                    u2, cu, v2, cv = ends[j]
+                    for x1, c1, dist in searches:
+                        for x2, c2 in ((u2, cu), (v2, cv)):
+                            between = dist.get(x2, inf)
+                            if c1 + between + c2 < route:
+                                route, via = c1 + between + c2, (i, x1, x2, between)
+                if route > cutoff:
+                    continue
+                gain = emission[j] - abs(route - gc) / self.beta
+                moves[j].append((i, gain, via))
+                s = base + gain
+                if s > score[j]:
+                    score[j], back[j] = s, via
+
+        if all(s == -inf for s in score):
+            # no likely transition, the track restarts
+            yield from self._flush(window)
+            window.append(_Column(record, candidates, emission, [None] * len(candidates), None))
+            return
+
+        window.append(_Column(record, candidates, score, back, moves))
+        if len(window) > self.lag:
+            yield self._commit(window)
+
+    def _states(self, window):
+        """States of the most likely sequence of the columns of the window"""
+        last = window[-1].score
+        state = max(range(len(last)), key=last.__getitem__)
+        states = [state]
+        for k in range(len(window) - 1, 0, -1):
+            state = window[k].back[state][0]
+            states.append(state)
+        states.reverse()
+        return states
+
+    def _commit(self, window):
+        """Decide the oldest position of the window"""
+        state = self._states(window)[0]
+        column = window.popleft()
+        # the next positions must follow the decided state, scores and back pointers
+        # of the window are computed again from it
+        inf = float('-inf')
+        previous = [inf] * len(column.candidates)
+        previous[state] = column.score[state]
+        for following in window:
+            score, back = following.score, following.back
+            for j, moves in enumerate(following.moves):
+                score[j], back[j] = inf, None
+                for i, gain, via in moves:
+                    if previous[i] + gain > score[j]:
+                        score[j], back[j] = previous[i] + gain, via
+            previous = score
+        return self._match(column, state)
+
+    def _flush(self, window):
+        if window:
+            for column, state in zip(list(window), self._states(window)):
+                yield self._match(column, state)
+            window.clear()
+
+    def _match(self, column, state):
+        sg = self._search_graph
+        e, f, d = column.candidates[state]
+        u, v = sg.edges_u[e], sg.edges_v[e]
+        lon, lat = (self._starts[e] + f * self._vectors[e]).tolist()
+        lon = (lon + 180) % 360 - 180
+
+        nodes = []
+        via = column.back[state]
+        if via is not None and via[1] is not None:
+            _, x1, x2, between = via
+            _, pred = self._search(x1, between)
+            x = x2
+            while x >= 0:
+                nodes.append(sg.nodes[x])
+                x = pred[x]
+            nodes.reverse()
+
+        record = column.record
+        return Match(record[0], record[1], record[2], (sg.nodes[u], sg.nodes[v]), f * sg.weights[e], d, (lon, lat), nodes)
@@ -1,7 +1,15 @@
+import os
+import threading
+from collections import OrderedDict
+from itertools import combinations
+
 import networkx as nx
+import numpy as np
 from .passages import Passage
-from ..utils import load_from_geojson, distance
+from ..utils import load_from_geojson, distance, distances
+from ..instrumentation import count, instrumented, phase
 from .kdtree import KDTree
+from .search_graph import SearchGraph
 
 
 class Marnet(nx.Graph):
@@ -22,6 +30,12 @@ class Marnet(nx.Graph):
         self.graph['crs'] = DEFAULT_CRF  # CRS attribute for the graph
         self.restrictions = [Passage.northwest]
         self.kdtree = KDTree()
+        # indexes derived from the graph, shared by shallow copies
+        self._indexes = {}
+        # guards the fill of the indexes, shared by shallow copies
+        self._lock = threading.RLock()
+        # file of precomputed landmarks, see `landmarks`
+        self.landmarks_path = None
 
     def add_node(self, node, **attr):
         if not isinstance(node, tuple):
@@ -32,6 +46,7 @@ class Marnet(nx.Graph):
         attr['y'] = y
 
         self.kdtree.add_point(node)
+        self._indexes.clear()
         super().add_node(node, **attr)
 
     def add_edge(self, u, v, **attr):
@@ -48,24 +63,89 @@ class Marnet(nx.Graph):
         if not "weight" in attr:
             length = distance(u, v)
             attr["weight"] = round(length, 1)
+        self._indexes.clear()
         super().add_edge(u, v, **attr)
 
     def add_edges_from_list(self, edge_list):
+        """
+        Add edges in bulk, a faster alternative to `add_edge` for large lists.
+        Missing weights are computed at once and the spatial index is rebuilt a single time.
+
+        Parameters
+        ----------
+        edge_list : list of (u, v, attributes) where u and v are (lon, lat) tuples
+        """
         if not edge_list:
             return
-        
+
+        # the attributes are copied, as `add_edge` does, before adding the weights
+        edge_list = [(u, v, {**args}) for u, v, args in edge_list]
+        missing = []
         for edge in edge_list:
-            u,v,args = edge
-            self.add_edge(u, v, **args)
+            u, v, args = edge
+            if not isinstance(u, tuple) or not isinstance(v, tuple):
+                raise TypeError(
+                    "Nodes must be tuples representing the coordinates.")
+            if not "weight" in args:
+                missing.append(edge)
+
+        if missing:
+            lengths = distances([u for u, _, _ in missing], [v for _, v, _ in missing])
+            for (_, _, args), length in zip(missing, lengths.round(1).tolist()):
+                args["weight"] = length
+
+        new_nodes = {}
+        for u, v, _ in edge_list:
+            for n in (u, v):
+                if n not in self._node and n not in new_nodes:
+                    new_nodes[n] = {'x': n[0], 'y': n[1]}
+
+        super().add_nodes_from(new_nodes.items())
+        super().add_edges_from(edge_list)
+        self._indexes.clear()
+        if new_nodes:
+            self.update_kdtree()
 
     def add_nodes_from_list(self, node_list):
+        """
+        Add nodes in bulk, a faster alternative to `add_node` for large lists.
+        The spatial index is rebuilt a single time.
+
+        Parameters
+        ----------
+        node_list : list of (node, attributes) where node is a (lon, lat) tuple
+        """
         if not node_list:
             return
-        
-        for node in node_list:
-            n, args = node
-            self.add_node(n, **args)
 
+        for n, _ in node_list:
+            if not isinstance(n, tuple):
+                raise TypeError(
+                    "Node must be a tuple representing the coordinates.")
+
+        super().add_nodes_from((n, {**args, 'x': n[0], 'y': n[1]}) for n, args in node_list)
+        self.update_kdtree()
+
+
+    def update_weights(self, overwrite=False):
+        """
+        Compute the `weight` (distance in km) of the edges in one vectorized pass
+
+        Parameters
+        ----------
+        overwrite : boolean, default False
+            Recompute the weight of all edges, otherwise only of edges without weight
+        """
+        edges = [(u, v) for u, v, w in self.edges(data='weight') if overwrite or w is None]
+        if not edges:
+            return
+
+        lengths = distances([u for u, _ in edges], [v for _, v in edges])
+        for (u, v), length in zip(edges, lengths.round(1).tolist()):
+            # both directions, edge data may not be shared
+            self._adj[u][v]['weight'] = length
+            self._adj[v][u]['weight'] = length
+        self._indexes.clear()
 
     def subgraph(self, nodes):
 
@@ -131,15 +211,276 @@ class Marnet(nx.Graph):
             self.kdtree = KDTree(nodes)
         else:
             self.kdtree = KDTree(self._node)
+        self._indexes.clear()
+
+    @property
+    def search_graph(self):
+        """
+        The SearchGraph of the Marnet used by path searches, built on first use.
+        It is rebuilt after changes made with the methods of the Marnet,
+        call `update_kdtree` after editing nodes or edges directly.
+        """
+        search_graph = self._indexes.get('search_graph')
+        if search_graph is None:
+            with self._lock:
+                search_graph = self._indexes.get('search_graph')
+                if search_graph is None:
+                    search_graph = self._indexes['search_graph'] = SearchGraph(self)
+        return search_graph
+
+    def passage_names(self, mask):
+        """
+        Names of the passages of a bitmask returned by `shortest_path`
+
+        Parameters
+        ----------
+        mask : int, bitmask of passages
+
+        Returns
+        -------
+        A list of passage names
+        """
+        return self.search_graph.passage_names(mask)
+
+    def closed_edges(self, restrictions=None, zones=None):
+        """
+        Edges of `search_graph` closed by restrictions and exclusion zones, see `SearchGraph.closed_edges`
+
+        Parameters
+        ----------
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+        zones : exclusion zones, default None
+            An AreaFeature, a list of AreaFeature or a FeatureCollection of them (AreaFeature.create),
+            edges crossing them are closed. Compiled once per set of zones and cached.
+        """
+        sg = self.search_graph
+        mask = sg.passage_mask(self.restrictions if restrictions is None else restrictions)
+        return sg.closed_edges(mask, self.zones_key(zones))
+
+    @staticmethod
+    def zones_key(zones):
+        """Hashable key of exclusion zones, a sorted tuple of the outer rings of the polygons"""
+        if not zones:
+            return None
+        if isinstance(zones, dict) and zones.get('type') == 'FeatureCollection':
+            zones = zones['features']
+        elif isinstance(zones, dict):
+            zones = [zones]
+
+        rings = set()
+        for zone in zones:
+            geometry = zone.get('geometry', zone)
+            polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+            for polygon in polygons:
+                rings.add(tuple(tuple(point[:2]) for point in polygon[0]))
+        return tuple(sorted(rings))
+
+    def landmarks(self, restrictions=None, zones=None):
+        """
+        Landmarks of `search_graph` for ALT searches, see `SearchGraph.landmarks`.
+        They are loaded from `landmarks_path` on first use when it was computed for this network,
+        otherwise computed and cached by restrictions and zones.
+
+        Parameters
+        ----------
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+        zones : exclusion zones, default None
+
+        Returns
+        -------
+        A tuple of (list of landmark node indexes, float32 numpy array of distances)
+        """
+        sg = self.search_graph
+        if 'landmarks_loaded' not in self._indexes:
+            with self._lock:
+                if 'landmarks_loaded' not in self._indexes:
+                    path = self.landmarks_path
+                    self._indexes['landmarks_loaded'] = bool(path) and os.path.exists(path) and sg.load_landmarks(path)
+        mask = sg.passage_mask(self.restrictions if restrictions is None else restrictions)
+        return sg.landmarks(mask, self.zones_key(zones))
+
+    def save_landmarks(self, path, restrictions_list=None):
+        """
+        Compute and store landmarks to a compressed numpy file (.npz), to be loaded with `landmarks_path`
+
+        Parameters
+        ----------
+        path : path of the file
+        restrictions_list : list of lists of passages to be restricted,
+            by default None stores the restrictions of the Marnet and no restrictions
+        """
+        sg = self.search_graph
+        if restrictions_list is None:
+            restrictions_list = [self.restrictions, []]
+        sg.save_landmarks(path, [sg.passage_mask(restrictions) for restrictions in restrictions_list])
+
+    def components(self, restrictions=None, zones=None):
+        """
+        Connected components of `search_graph` with restrictions and zones, see `SearchGraph.components`
 
-    # Get the shortest route by distance
-    def __custom_w(self, u, v, data):
-        return data.get('weight') if data.get('passage') not in self.restrictions else float('inf')
+        Returns
+        -------
+        A list indexed by node of component labels
+        """
+        sg = self.search_graph
+        mask = sg.passage_mask(self.restrictions if restrictions is None else restrictions)
+        return sg.components(mask, self.zones_key(zones))
 
-    def shortest_path(self, origin, destination):
+    def snap(self, points):
+        """
+        Closest nodes of locations
+
+        Parameters
+        ----------
+        points : list of locations (lon, lat)
+
+        Returns
+        -------
+        A list of node indexes of `search_graph`
+        """
+        index = self.search_graph.index
+        return [index[self.kdtree.query(tuple(point))] for point in points]
+
+    def port_nodes(self, P):
+        """
+        Closest nodes of the ports of a Ports network, cached until P or the Marnet changes
+
+        Parameters
+        ----------
+        P : a Ports network
+
+        Returns
+        -------
+        A tuple of (list of ports, list of their closest node indexes of `search_graph`)
+        """
+        key = ('port_nodes', id(P._node), len(P))
+        cached = self._indexes.get(key)
+        if cached is None:
+            ports = list(P._node)
+            cached = (ports, self.snap(ports))
+            with self._lock:
+                cached = self._indexes.setdefault(key, cached)
+        return cached
+
+    def _leg_target(self, source, target, mask, zones_key, unreachable, origin, destination):
+        """
+        Restrictions bitmask and target node of a leg: when the target can only be reached through
+        restricted passages, the fewest of them are lifted (see `_lift_restrictions`), exclusion zones
+        are kept. When the target can not be reached at all, it is moved to the closest node reachable
+        ('snap') or NetworkXNoPath is raised
+        """
+        sg = self.search_graph
+        labels = sg.components(mask, zones_key)
+        if labels[source] == labels[target]:
+            return mask, target
+        labels = sg.components(0, zones_key)
+        if labels[source] != labels[target]:
+            if unreachable == 'raise':
+                raise nx.NetworkXNoPath(
+                    f"Destination {tuple(destination)} can not be reached from origin {tuple(origin)}"
+                    + (" outside of the exclusion zones." if zones_key else "."))
+            target = sg.nearest_in_component(target, labels, labels[source])
+        return self._lift_restrictions(source, target, mask, zones_key), target
+
+    def _lift_restrictions(self, source, target, mask, zones_key):
+        """
+        Restrictions bitmask without the fewest restricted passages separating the target from the source,
+        the first ones in the order of the passages of `search_graph` between as many
+        """
+        sg = self.search_graph
+        bits = [1 << i for i in range(len(sg.passages)) if mask >> i & 1]
+        for size in range(len(bits) + 1):
+            for lifted in combinations(bits, size):
+                kept = mask & ~sum(lifted)
+                labels = sg.components(kept, zones_key)
+                if labels[source] == labels[target]:
+                    return kept
+        return 0
+
+    def shortest_paths_from(self, origin, destinations, restrictions=None, overlay=None, zones=None, unreachable='raise'):
+        """
+        Shortest paths from an origin to many destinations, with a single search
+        stopping once all destinations are reached. Parameters are the ones of `shortest_path`.
+
+        Parameters
+        ----------
+        origin : location (lon, lat)
+        destinations : list of locations (lon, lat)
+
+        Returns
+        -------
+        A list of tuples (list of node indexes of `search_graph`, passages bitmask), one per destination
+        """
+        if unreachable not in ('raise', 'snap'):
+            raise ValueError(f"Invalid unreachable '{unreachable}', must be raise or snap")
+
+        sg = self.search_graph
+        with phase('snap'):
+            source, *targets = self.snap([origin, *destinations])
+        zones_key = self.zones_key(zones)
+        restricted = sg.passage_mask(self.restrictions if restrictions is None else restrictions)
+        weights = overlay.weights(sg) if overlay is not None else None
+
+        with phase('reachability'):
+            ends = [self._leg_target(source, target, restricted, zones_key, unreachable, origin, destination)
+                    for target, destination in zip(targets, destinations)]
+        trees = {}
+        with phase('search'):
+            for mask in set(mask for mask, _ in ends):
+                nodes = set(end for m, end in ends if m == mask)
+                _, pred_node, pred_edge = sg.dijkstra({source: 0}, nodes, sg.closed_edges(mask, zones_key), weights=weights)
+                trees[mask] = (pred_node, pred_edge)
+            return [sg.reconstruct(end, *trees[mask]) for mask, end in ends]
+
+    # number of trees of `search_tree` kept
+    SEARCH_TREES = 64
+
+    def search_tree(self, source, restrictions=None, zones=None, overlay=None):
+        """
+        Shortest paths from a node of `search_graph` to all the others, cached by source,
+        restrictions, zones and overlay version until the Marnet changes.
+        The `SEARCH_TREES` trees used last are kept.
+
+        Parameters
+        ----------
+        source : node index of `search_graph`
+        restrictions, zones, overlay : see `shortest_path`
+
+        Returns
+        -------
+        A tuple of (numpy array of distances, list of predecessor nodes, list of predecessor edges), indexed by node
+        """
+        sg = self.search_graph
+        mask = sg.passage_mask(self.restrictions if restrictions is None else restrictions)
+        zones_key = self.zones_key(zones)
+        key = (source, mask, zones_key, None if overlay is None else (overlay.token, overlay.version))
+        with self._lock:
+            trees = self._indexes.setdefault('search_trees', OrderedDict())
+            tree = trees.get(key)
+            if tree is not None:
+                trees.move_to_end(key)
+        if tree is not None:
+            count('cache_hits')
+            return tree
+
+        count('cache_misses')
+        weights = overlay.weights(sg) if overlay is not None else None
+        dist, pred_node, pred_edge = sg.dijkstra({source: 0}, closed=sg.closed_edges(mask, zones_key), weights=weights)
+        tree = (np.array(dist), pred_node, pred_edge)
+        # the search runs outside of the lock, a tree computed meanwhile by another thread is kept
+        with self._lock:
+            tree = trees.setdefault(key, tree)
+            trees.move_to_end(key)
+            if len(trees) > self.SEARCH_TREES:
+                trees.popitem(last=False)
+        return tree
+
+    def shortest_path(self, origin, destination, return_passages=False, restrictions=None, overlay=None, zones=None, heuristic=None, unreachable='raise', instrument=None):
         """
         Shortest Path between the origin and the destination.
-        Dijkstra algorithm is used to perform the calculation.
+        Dijkstra algorithm is used to perform the calculation, or A* with landmarks when heuristic is 'alt'.
 
         Parameters
         ----------
@@ -147,17 +488,94 @@ class Marnet(nx.Graph):
             if origin is not a known node, a closed node search will be performed
         destination : destination location in the graph or not
             if destination is not a known node, a closed node search will be performed
+        return_passages : boolean, default False
+            Also returns the passages traversed as a bitmask, see `passage_names`
+        restrictions : list of passages to be restricted
+            A list of str, by default is None which means the restrictions of the Marnet
+        overlay : CostOverlay, default None
+            Costs of edges replacing their weight during the search
+        zones : exclusion zones, default None
+            Edges crossing them are avoided, see `closed_edges`
+        heuristic : str, default None
+            'alt' for A* search with lower bounds from landmarks (see `landmarks`),
+            faster than Dijkstra once landmarks are computed or loaded
+        unreachable : str, default 'raise'
+            When the destination can not be reached from the origin (see `components`),
+            'raise' raises NetworkXNoPath before any search,
+            'snap' routes to the closest node reachable from the origin instead
+        instrument : default None, True or a callable receiving the phase times and search counters,
+            see `searoute.instrumentation`
 
         Returns
         -------
-        A list of nodes building the shortest path
+        A list of nodes building the shortest path,
+        or a tuple of (list of nodes, passages bitmask) if return_passages is True.
+        Restricted passages are avoided, unless the destination can only be reached through them:
+        the fewest of them are then lifted, exclusion zones are kept.
         
         """
-        origin_node = self.kdtree.query(origin)
-        destination_node = self.kdtree.query(destination)
+        with instrumented(instrument):
+            paths = self.shortest_paths([origin, destination], restrictions, overlay, zones, heuristic, unreachable)
+        path, mask = paths[0]
+        path = [self.search_graph.nodes[i] for i in path]
+
+        if return_passages:
+            return path, mask
+        return path
+
+    def shortest_paths(self, points, restrictions=None, overlay=None, zones=None, heuristic=None, unreachable='raise'):
+        """
+        Shortest paths of the legs between consecutive points (origin, waypoints, destination).
 
-        return nx.shortest_path(
-            self, origin_node, destination_node, weight=self.__custom_w) 
+        All points are snapped at once, the restrictions, zones and overlay are prepared once
+        for all legs, and a leg repeated in the list (in either direction) is searched once.
+        Parameters are the ones of `shortest_path`.
+
+        Parameters
+        ----------
+        points : list of locations (lon, lat)
+
+        Returns
+        -------
+        A list of tuples (list of node indexes of `search_graph`, passages bitmask), one per leg
+        """
+        if heuristic not in (None, 'alt'):
+            raise ValueError(f"Invalid heuristic '{heuristic}', must be None or 'alt'")
+        if unreachable not in ('raise', 'snap'):
+            raise ValueError(f"Invalid unreachable '{unreachable}', must be raise or snap")
+
+        sg = self.search_graph
+        with phase('snap'):
+            nodes = self.snap(points)
+        zones_key = self.zones_key(zones)
+        restricted = sg.passage_mask(self.restrictions if restrictions is None else restrictions)
+        weights = overlay.weights(sg) if overlay is not None else None
+        scale = overlay.scale if overlay is not None else 1.0
+
+        legs = {}
+        paths = []
+        for k in range(len(points) - 1):
+            source, target = nodes[k], nodes[k + 1]
+            leg = legs.get((source, target))
+            if leg is None:
+                reverse = legs.get((target, source))
+                if reverse is not None and reverse[0][0] == target and reverse[0][-1] == source:
+                    leg = (reverse[0][::-1], reverse[1])
+            if leg is not None:
+                count('cache_hits')
+            else:
+                with phase('reachability'):
+                    mask, end = self._leg_target(source, target, restricted, zones_key, unreachable, points[k], points[k + 1])
+                bounds = None
+                if heuristic == 'alt':
+                    with phase('landmarks'):
+                        _, table = self.landmarks(restrictions if mask else [], zones)
+                        bounds = sg.alt_heuristic(end, table, scale)
+                with phase('search'):
+                    leg = sg.shortest_path(source, end, sg.closed_edges(mask, zones_key), weights, bounds)
+            legs[(source, target)] = leg
+            paths.append(leg)
+        return paths
 
     @staticmethod
     def from_geojson(*path):
@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+
 class Passage(str):
     babalmandab = 'babalmandab'
     bosporus = 'bosporus'
@@ -13,8 +16,9 @@ class Passage(str):
 
 
     @classmethod
+    @lru_cache(maxsize=None)
     def valid_passages(cls):
-        return {value for key, value in cls.__dict__.items() if not key.startswith('__') and not callable(value)}
+        return frozenset(value for key, value in cls.__dict__.items() if not key.startswith('__') and not callable(value))
     
     @classmethod
     def filter_valid_passages(cls, potential_values):
@@ -139,18 +139,31 @@ s
     def add_edges_from_list(self, edge_list):
         if not edge_list:
             return
-        
-        for edge in edge_list:
-            u,v,args = edge
-            self.add_edge(u, v, **args)
+
+        super().add_edges_from(edge_list)
 
     def add_nodes_from_list(self, node_list):
+        """
+        Add ports in bulk, a faster alternative to `add_node` for large lists.
+        The spatial index is rebuilt a single time.
+
+        Parameters
+        ----------
+        node_list : list of (node, attributes) where node is a (lon, lat) tuple
+        """
         if not node_list:
             return
 
-        for node in node_list:
-            n, args = node
-            self.add_node(n, **args)
+        for n, args in node_list:
+            if not isinstance(n, tuple):
+                raise TypeError(
+                    "Node must be a str representing coordinates of a port.")
+            if not (args.get('port') and args.get('cty')):
+                raise TypeError(
+                    "Node port requires to have both port name (name), and country (cty) in properties to be correctly mapped")
+
+        super().add_nodes_from((n, {**args, 'x': n[0], 'y': n[1]}) for n, args in node_list)
+        self.update_kdtree()
 
     def update_kdtree(self, nodes = None):
         if nodes:
@@ -0,0 +1,173 @@
+import numpy as np
+from geojson import Feature, LineString
+
+from ..utils import cumulative_distances, distance_matrix, encode_polyline, linestring_to_wkb, speed_coef, to_unit_vectors
+
+
+class Route:
+    """
+    A lightweight route result.
+
+    Coordinates are kept as a numpy array of (lon, lat) and the GeoJSON Feature
+    is only built when it is requested, by `feature` or `__geo_interface__`.
+
+    Parameters
+    ----------
+    coordinates : array-like of shape (n, 2) of (lon, lat)
+    properties : dict of the route properties (`length`, `units`, `duration_hours`, ...)
+    precision : int, default None
+        Number of decimals of the coordinates, None keeps them as they are
+    speed_knot : float, default None
+        Speed of the boat, required by the positions along the route
+    departure : datetime or numpy datetime64, default None
+        Time of departure, times can then be given as datetimes instead of hours since departure
+
+    Examples
+    --------
+    >>> route = sr.searoute(origin, destination, speed_knot=14, output='route')
+    >>> route.position_at(36.5)                 # (lon, lat) 36.5 hours after departure
+    >>> route.positions_at(np.arange(0, 240))   # hourly positions, array of shape (240, 2)
+    """
+
+    def __init__(self, coordinates, properties=None, precision=None, speed_knot=None, departure=None):
+        coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        if precision is not None:
+            # rounded as geojson does, np.round differs on values close to a half
+            coordinates = np.array([[round(x, precision), round(y, precision)] for x, y in coordinates.tolist()],
+                                   dtype=float).reshape(-1, 2)
+        self.coordinates = coordinates
+        self.properties = properties if properties is not None else {}
+        self.precision = precision
+        self.speed_knot = speed_knot
+        self.departure = departure
+        self._feature = None
+        self._cumulative = None
+        self._vectors = None
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def __repr__(self):
+        return f"Route({len(self)} coordinates, {self.properties})"
+
+    @property
+    def feature(self):
+        """The route as a GeoJSON Feature of LineString, built on first access"""
+        if self._feature is None:
+            geometry = LineString(self.coordinates.tolist(), precision=6 if self.precision is None else self.precision)
+            self._feature = Feature(geometry=geometry, properties=self.properties)
+        return self._feature
+
+    @property
+    def __geo_interface__(self):
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': self.coordinates.tolist()},
+            'properties': self.properties,
+        }
+
+    def to_geojson(self):
+        return self.feature
+
+    def to_polyline(self, precision=None):
+        """The coordinates as a Google encoded polyline, default precision is 5"""
+        if precision is None:
+            precision = 5 if self.precision is None else self.precision
+        return encode_polyline(self.coordinates, precision)
+
+    def to_wkb(self):
+        """The coordinates as a WKB LineString"""
+        return linestring_to_wkb(self.coordinates)
+
+    @property
+    def cumulative(self):
+        """Cumulative distance in km along the coordinates, computed on first access"""
+        if self._cumulative is None:
+            self._cumulative = cumulative_distances(self.coordinates, units='km')
+        return self._cumulative
+
+    def _hours(self, times):
+        times = np.asarray(times)
+        if times.dtype.kind in 'MO':
+            if self.departure is None:
+                raise ValueError('departure is required for times given as datetimes')
+            return (times.astype('datetime64[us]') - np.datetime64(self.departure, 'us')) / np.timedelta64(1, 'h')
+        return times.astype(float)
+
+    def _speed(self):
+        """Speed in km of the coordinates per hour"""
+        if not self.speed_knot or self.speed_knot <= 0:
+            raise ValueError('speed_knot is required for positions along the route')
+        speed = self.speed_knot * 1.852
+        length, units = self.properties.get('length'), self.properties.get('units')
+        if length and units:
+            # the coordinates may be simplified or rounded, positions are spread over the reported duration
+            speed *= self.cumulative[-1] / (length / speed_coef(units) * 1.852)
+        return speed
+
+    def positions_at(self, times):
+        """
+        Positions along the route at times, interpolated on the great circle of each segment
+
+        Parameters
+        ----------
+        times : array-like of hours since departure, or of datetimes when `departure` is set
+
+        Returns
+        -------
+        A numpy array of shape (n, 2) of (lon, lat), positions before departure are the
+        origin and after arrival the destination
+        """
+        cumulative = self.cumulative
+        if len(self.coordinates) < 2:
+            return np.repeat(self.coordinates[:1], np.size(times), axis=0)
+        if self._vectors is None:
+            self._vectors = to_unit_vectors(self.coordinates)
+
+        along = np.clip(np.ravel(self._hours(times)) * self._speed(), 0, cumulative[-1])
+        segment = np.clip(np.searchsorted(cumulative, along, side='right') - 1, 0, len(cumulative) - 2)
+        start, end = cumulative[segment], cumulative[segment + 1]
+        fraction = np.divide(along - start, end - start, out=np.zeros_like(along), where=end > start)
+
+        a, b = self._vectors[segment], self._vectors[segment + 1]
+        angle = np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1, 1))
+        sin_angle = np.sin(angle)
+        small = sin_angle < 1e-12
+        safe = np.where(small, 1, sin_angle)
+        wa = np.where(small, 1 - fraction, np.sin((1 - fraction) * angle) / safe)
+        wb = np.where(small, fraction, np.sin(fraction * angle) / safe)
+        p = wa[:, None] * a + wb[:, None] * b
+
+        lon = np.degrees(np.arctan2(p[:, 1], p[:, 0]))
+        lat = np.degrees(np.arctan2(p[:, 2], np.hypot(p[:, 0], p[:, 1])))
+        # same longitude range as the coordinates of the segment
+        start_lon = self.coordinates[segment, 0]
+        lon = start_lon + (lon - start_lon + 180) % 360 - 180
+        return np.column_stack((lon, lat))
+
+    def position_at(self, time):
+        """Position (lon, lat) along the route at a time, see `positions_at`"""
+        return tuple(self.positions_at([time])[0].tolist())
+
+    def etas(self, points):
+        """
+        Times at which the route passes by points, as waypoints in their order
+
+        Parameters
+        ----------
+        points : list of (lon, lat), each is matched with the closest coordinate of the route
+            after the coordinate of the previous point
+
+        Returns
+        -------
+        A numpy array of hours since departure, or of datetime64 when `departure` is set
+        """
+        dist = distance_matrix(np.asarray(points, dtype=float).reshape(-1, 2), self.coordinates)
+        index, first = [], 0
+        for row in dist:
+            first += int(np.argmin(row[first:]))
+            index.append(first)
+        hours = self.cumulative[index] / self._speed()
+        if self.departure is None:
+            return hours
+        return np.datetime64(self.departure, 'us') + (hours * 3600e6).astype('timedelta64[us]')
@@ -0,0 +1,182 @@
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .passages import Passage
+from ..main import searoute
+
+_networks = (None, None)
+
+
+def _init_worker(M, P):
+    global _networks
+    _networks = (M, P)
+
+
+def _worker_route_properties(job):
+    return _route_properties(job, *_networks)
+
+
+def _route_properties(job, M, P):
+    key, origin, destination, waypoints, restrictions, params = job
+    try:
+        feature = searoute(origin, destination, waypoints=list(waypoints) if waypoints else None,
+                           restrictions=restrictions, M=M, P=P, return_passages=True, **params)
+    except Exception as e:
+        return key, {'error': str(e) or type(e).__name__}
+    return key, feature.properties
+
+
+class RouteBook:
+    """
+    A book of routes between origin-destination pairs, computed with `searoute`.
+
+    Routes are indexed by the passages they traverse, so that when restrictions
+    change, only the routes crossing a newly restricted passage are recomputed.
+    A route that can not be computed (e.g. NetworkXNoPath) is stored with its `error`
+    instead of its properties.
+
+    Parameters
+    ----------
+    restrictions : list of passages to be restricted, default is ['northwest']
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports
+    max_workers : int, default None
+        Number of processes computing routes, None or 1 computes in the current process
+    params : other parameters of `searoute`, as `units` or `speed_knot`
+
+    Examples
+    --------
+    >>> book = RouteBook(units='naut', speed_knot=14)
+    >>> book.add_many([('FRLEH-CNTSN', (0.107, 49.486), (117.745, 38.987)), ...])
+    >>> diff = book.apply_restrictions(['northwest', 'suez'])  # only routes through Suez
+    """
+
+    def __init__(self, restrictions=[Passage.northwest], M=None, P=None, max_workers=None, **params):
+        self.restrictions = list(restrictions)
+        self.M = M
+        self.P = P
+        self.max_workers = max_workers
+        self.params = params
+        self.routes = {}
+        self.passage_index = defaultdict(set)
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __contains__(self, key):
+        return key in self.routes
+
+    def __getitem__(self, key):
+        return self.routes[key]
+
+    def add(self, key, origin, destination, waypoints=None):
+        """Add a route to the book, returns its properties"""
+        return self.add_many([(key, origin, destination, waypoints)])[key]
+
+    def add_many(self, od_pairs):
+        """
+        Add routes to the book, computed in parallel when `max_workers` is set.
+
+        Parameters
+        ----------
+        od_pairs : iterable of (key, origin, destination) or (key, origin, destination, waypoints)
+
+        Returns
+        -------
+        dict of key -> route properties (`length`, `duration_hours`, `traversed_passages`, ...),
+        or {'error': message} for the routes that can not be computed
+        """
+        jobs = []
+        for od in od_pairs:
+            key, origin, destination = od[:3]
+            waypoints = od[3] if len(od) > 3 else None
+            self._remove(key)
+            self.routes[key] = {'origin': origin, 'destination': destination, 'waypoints': waypoints}
+            jobs.append(key)
+
+        results = self._compute(jobs, self.restrictions)
+        for key, properties in results.items():
+            self._store(key, properties)
+        return results
+
+    @property
+    def failed(self):
+        """dict of key -> error of the routes that can not be computed"""
+        return {key: route['error'] for key, route in self.routes.items() if 'error' in route}
+
+    def routes_through(self, passages):
+        """Keys of the routes traversing any of the passages"""
+        keys = set()
+        for passage in passages:
+            keys |= self.passage_index.get(passage, set())
+        return keys
+
+    def apply_restrictions(self, restrictions):
+        """
+        Change the restrictions of the book and recompute the affected routes.
+
+        Only the routes traversing a newly restricted passage are recomputed.
+        When a restriction is lifted any route may become shorter, so all routes are recomputed.
+
+        Parameters
+        ----------
+        restrictions : list of passages to be restricted
+
+        Returns
+        -------
+        dict of key -> diff of the recomputed routes, a diff being a dict of
+        `length_before`, `length_after`, `length_delta`, `duration_hours_before`,
+        `duration_hours_after`, `duration_delta`, `passages_before`, `passages_after`.
+        Routes that can not be computed before or after have no diff, see `failed`
+        """
+        restrictions = list(restrictions)
+        added = set(restrictions) - set(self.restrictions)
+        lifted = set(self.restrictions) - set(restrictions)
+        self.restrictions = restrictions
+
+        affected = self.routes_through(added)
+        keys = [key for key in self.routes if lifted or key in affected]
+        before = {key: dict(self.routes[key]) for key in keys}
+        results = self._compute(keys, restrictions)
+
+        diff = {}
+        for key, properties in results.items():
+            old = before[key]
+            self._store(key, properties)
+            if 'error' in old or 'error' in properties:
+                continue
+            diff[key] = {
+                'length_before': old['length'],
+                'length_after': properties['length'],
+                'length_delta': properties['length'] - old['length'],
+                'duration_hours_before': old['duration_hours'],
+                'duration_hours_after': properties['duration_hours'],
+                'duration_delta': properties['duration_hours'] - old['duration_hours'],
+                'passages_before': old['traversed_passages'],
+                'passages_after': properties['traversed_passages'],
+            }
+        return diff
+
+    def _compute(self, keys, restrictions):
+        jobs = [(key, self.routes[key]['origin'], self.routes[key]['destination'], self.routes[key]['waypoints'],
+                 restrictions, self.params) for key in keys]
+        if not self.max_workers or self.max_workers == 1 or len(jobs) < 2:
+            return dict(_route_properties(job, self.M, self.P) for job in jobs)
+
+        chunksize = max(1, len(jobs) // (self.max_workers * 4))
+        with ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=(self.M, self.P)) as executor:
+            return dict(executor.map(_worker_route_properties, jobs, chunksize=chunksize))
+
+    def _store(self, key, properties):
+        self._remove(key)
+        route = self.routes[key]
+        # the properties, or the error, of a previous computation are replaced
+        od = {k: route[k] for k in ('origin', 'destination', 'waypoints')}
+        route.clear()
+        route.update(od, **properties)
+        for passage in properties.get('traversed_passages', ()):
+            self.passage_index[passage].add(key)
+
+    def _remove(self, key):
+        for passage in (self.routes.get(key) or {}).get('traversed_passages', ()):
+            self.passage_index[passage].discard(key)
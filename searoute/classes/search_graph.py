@@ -0,0 +1,777 @@
+import hashlib
+import heapq
+import json
+from collections import defaultdict
+
+import networkx as nx
+import numpy as np
+
+from .. import instrumentation
+from ..utils import distances, segments_cross_polygon
+
+
+class SearchGraph:
+    """
+    Compact representation of a Marnet used for path searches.
+
+    Nodes are numbered from 0 to n-1 and each edge of the undirected graph
+    is numbered from 0 to m-1 and stored once, with its weight and a bitmask
+    of its passage. The adjacency is stored as arcs (both directions of
+    an edge) in CSR form: arcs of node `u` are `indptr[u]` to `indptr[u+1]`.
+
+    Passages are numbered in order of appearance, the passage `i` being the
+    bit `1 << i`, so that the passages of a path are collected as an int
+    and only decoded to names when needed.
+
+    Parameters
+    ----------
+    G : a Marnet (or any networkx Graph of (lon, lat) nodes)
+    """
+
+    def __init__(self, G):
+        self.nodes = list(G._node)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.coords = np.array(self.nodes, dtype=float).reshape(-1, 2)
+
+        self.passages = []
+        passage_bits = {}
+        edges_u, edges_v, weights, bits = [], [], [], []
+        index = self.index
+        for u, nbrs in G._adj.items():
+            iu = index[u]
+            for v, data in nbrs.items():
+                iv = index[v]
+                if iv < iu:
+                    continue
+                weight = data.get('weight')
+                if weight is None:
+                    # as networkx, an edge without weight is hidden
+                    continue
+                passage = data.get('passage')
+                bit = 0
+                if passage is not None:
+                    if passage not in passage_bits:
+                        passage_bits[passage] = 1 << len(self.passages)
+                        self.passages.append(passage)
+                    bit = passage_bits[passage]
+                edges_u.append(iu)
+                edges_v.append(iv)
+                weights.append(float(weight))
+                bits.append(bit)
+
+        self.passage_bits = passage_bits
+        self.edges_u = edges_u
+        self.edges_v = edges_v
+        self.weights = weights
+        self.edge_passages = bits
+        self._build_arcs()
+        self._closed = {}
+        self._edge_index = None
+        self._edge_grid = None
+        self._zones = {}
+        self._landmarks = {}
+        self._components = {}
+
+    def _build_arcs(self):
+        n = len(self.nodes)
+        degree = [0] * (n + 1)
+        for u, v in zip(self.edges_u, self.edges_v):
+            degree[u + 1] += 1
+            if u != v:
+                degree[v + 1] += 1
+
+        indptr = degree
+        for i in range(n):
+            indptr[i + 1] += indptr[i]
+
+        position = indptr[:-1]
+        arc_head = [0] * indptr[-1]
+        arc_edge = [0] * indptr[-1]
+        for e, (u, v) in enumerate(zip(self.edges_u, self.edges_v)):
+            arc_head[position[u]] = v
+            arc_edge[position[u]] = e
+            position[u] += 1
+            if u != v:
+                arc_head[position[v]] = u
+                arc_edge[position[v]] = e
+                position[v] += 1
+
+        # position was a copy, indptr is intact
+        self.indptr = indptr
+        self.arc_head = arc_head
+        self.arc_edge = arc_edge
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def number_of_edges(self):
+        return len(self.weights)
+
+    def edge(self, u, v):
+        """Edge index between two node indexes, None if there is no edge"""
+        edge_index = self._edge_index
+        if edge_index is None:
+            edge_index = self._edge_index = {(u, v): e for e, (u, v) in enumerate(zip(self.edges_u, self.edges_v))}
+        return edge_index.get((u, v) if u <= v else (v, u))
+
+    def passage_mask(self, passages):
+        """Bitmask of a list of passage names, unknown names are ignored"""
+        mask = 0
+        for passage in passages or ():
+            mask |= self.passage_bits.get(passage, 0)
+        return mask
+
+    def passage_names(self, mask):
+        """Passage names of a bitmask"""
+        return [name for i, name in enumerate(self.passages) if mask >> i & 1]
+
+    def closed_edges(self, mask, zones=None):
+        """
+        Edges closed by a restriction bitmask and exclusion zones, as a bytearray (1 if closed)
+        cached by mask and zones. None when no edge is closed.
+
+        Parameters
+        ----------
+        mask : int, bitmask of restricted passages
+        zones : tuple of polygon rings, see `zone_edges`
+        """
+        if not mask and not zones:
+            return None
+        key = (mask, zones)
+        if key in self._closed:
+            instrumentation.count('cache_hits')
+            return self._closed[key]
+        instrumentation.count('cache_misses')
+
+        closed = bytearray(1 if bit & mask else 0 for bit in self.edge_passages)
+        if zones:
+            closed = bytearray(c | z for c, z in zip(closed, self.zone_edges(zones)))
+        if not any(closed):
+            closed = None
+        self._closed[key] = closed
+        return closed
+
+    GRID_SIZE = 5
+
+    def edge_segments(self):
+        """
+        Segments of the edges as two arrays of shape (m, 2),
+        the second end being moved by 360 degrees for edges crossing the antimeridian
+        """
+        a = self.coords[self.edges_u]
+        b = self.coords[self.edges_v].copy()
+        dlon = b[:, 0] - a[:, 0]
+        b[:, 0] -= 360 * np.round(dlon / 360)
+        return a, b
+
+    def edge_grid(self):
+        """Spatial index of the edges, dict of (column, row) cell of `GRID_SIZE` degrees -> edge indexes"""
+        if self._edge_grid is None:
+            a, b = self.edge_segments()
+            low = np.floor(np.minimum(a, b) / self.GRID_SIZE).astype(int).tolist()
+            high = np.floor(np.maximum(a, b) / self.GRID_SIZE).astype(int).tolist()
+            grid = defaultdict(list)
+            for e, ((x0, y0), (x1, y1)) in enumerate(zip(low, high)):
+                for x in range(x0, x1 + 1):
+                    for y in range(y0, y1 + 1):
+                        grid[(x, y)].append(e)
+            self._edge_grid = dict(grid)
+        return self._edge_grid
+
+    def edges_in_box(self, min_x, min_y, max_x, max_y):
+        """Candidate edges for a bounding box, from the spatial index"""
+        grid = self.edge_grid()
+        size = self.GRID_SIZE
+        edges = set()
+        for x in range(int(np.floor(min_x / size)), int(np.floor(max_x / size)) + 1):
+            for y in range(int(np.floor(min_y / size)), int(np.floor(max_y / size)) + 1):
+                edges.update(grid.get((x, y), ()))
+        return edges
+
+    def zone_edges(self, zones):
+        """
+        Edges crossing polygons (exclusion zones), as a bytearray (1 if crossing) cached by zones.
+
+        Parameters
+        ----------
+        zones : tuple of polygon rings, each a tuple of (lon, lat)
+        """
+        blocked = self._zones.get(zones)
+        if blocked is not None:
+            return blocked
+
+        blocked = bytearray(len(self.weights))
+        a, b = self.edge_segments()
+        for ring in zones:
+            ring = np.asarray(ring, dtype=float)
+            min_x, min_y = ring.min(axis=0)
+            max_x, max_y = ring.max(axis=0)
+            # copies of the polygon around the antimeridian
+            for shift in (-360, 0, 360):
+                if max_x + shift < -180 - self.GRID_SIZE or min_x + shift > 180 + self.GRID_SIZE:
+                    continue
+                candidates = sorted(self.edges_in_box(min_x + shift, min_y, max_x + shift, max_y))
+                if not candidates:
+                    continue
+                shifted = ring + (shift, 0)
+                crossing = segments_cross_polygon(a[candidates], b[candidates], shifted)
+                for e in np.asarray(candidates)[crossing].tolist():
+                    blocked[e] = 1
+
+        self._zones[zones] = blocked
+        return blocked
+
+    def fingerprint(self):
+        """Hash of the nodes, edges and weights, identifying precomputed data of this graph"""
+        digest = hashlib.sha1()
+        digest.update(self.coords.tobytes())
+        digest.update(np.array([self.edges_u, self.edges_v], dtype=np.int64).tobytes())
+        digest.update(np.array(self.weights, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def components(self, mask=0, zones=None):
+        """
+        Connected components of the graph with restrictions, computed on first use and cached by restrictions.
+
+        Parameters
+        ----------
+        mask : int, bitmask of restricted passages
+        zones : tuple of polygon rings, see `zone_edges`
+
+        Returns
+        -------
+        A list indexed by node of component labels, two nodes are connected if they have the same label
+        """
+        key = (mask, zones)
+        labels = self._components.get(key)
+        if labels is not None:
+            instrumentation.count('cache_hits')
+            return labels
+        instrumentation.count('cache_misses')
+
+        closed = self.closed_edges(mask, zones)
+        indptr, arc_head, arc_edge = self.indptr, self.arc_head, self.arc_edge
+        labels = [-1] * len(self.nodes)
+        label = 0
+        for start in range(len(labels)):
+            if labels[start] >= 0:
+                continue
+            labels[start] = label
+            stack = [start]
+            while stack:
+                u = stack.pop()
+                for a in range(indptr[u], indptr[u + 1]):
+                    v = arc_head[a]
+                    if labels[v] < 0 and (closed is None or not closed[arc_edge[a]]):
+                        labels[v] = label
+                        stack.append(v)
+            label += 1
+
+        self._components[key] = labels
+        return labels
+
+    def nearest_in_component(self, node, labels, label):
+        """Node of a component closest to a node (great circle distance), see `components`"""
+        members = np.flatnonzero(np.asarray(labels) == label)
+        lon, lat = self.coords[node]
+        dist = distances((lon, lat), self.coords[members])
+        return int(members[np.argmin(dist)])
+
+    def landmarks(self, mask=0, zones=None, count=8):
+        """
+        Landmarks of the graph with restrictions and their distances to every node,
+        computed on first use and cached by restrictions.
+
+        Landmarks are selected one by one as the node farthest from the landmarks
+        already selected, which places them on the edges of the network.
+
+        Parameters
+        ----------
+        mask : int, bitmask of restricted passages
+        zones : tuple of polygon rings, see `zone_edges`
+        count : number of landmarks, default 8
+
+        Returns
+        -------
+        A tuple of (list of landmark node indexes, float32 numpy array of shape (count, n) of distances)
+        """
+        key = (mask, zones)
+        cached = self._landmarks.get(key)
+        if cached is not None:
+            instrumentation.count('cache_hits')
+            return cached
+        instrumentation.count('cache_misses')
+
+        closed = self.closed_edges(mask, zones)
+        n = len(self.nodes)
+        selected = []
+        table = np.empty((0, n), dtype=np.float32)
+        # distance to the closest landmark, the first landmark is the farthest node from node 0
+        nearest = np.array(self.dijkstra({0: 0}, closed=closed)[0]) if n else np.zeros(0)
+
+        while len(selected) < min(count, n):
+            finite = np.where(np.isfinite(nearest), nearest, -1)
+            finite[selected] = -1
+            landmark = int(np.argmax(finite))
+            if finite[landmark] < 0:
+                break
+            dist = np.array(self.dijkstra({landmark: 0}, closed=closed)[0])
+            selected.append(landmark)
+            table = np.vstack((table, dist.astype(np.float32)))
+            nearest = dist if len(selected) == 1 else np.minimum(nearest, dist)
+
+        self._landmarks[key] = (selected, table)
+        return self._landmarks[key]
+
+    def alt_heuristic(self, target, table, scale=1.0):
+        """
+        ALT lower bounds of the distance of every node to target, from landmark distances
+        (triangle inequality: |d(L, target) - d(L, v)| <= d(v, target)).
+
+        Parameters
+        ----------
+        target : node index
+        table : landmark distances, see `landmarks`
+        scale : float, multiplier of the bounds, see `CostOverlay.scale`
+
+        Returns
+        -------
+        A list indexed by node, `inf` for nodes not reaching the target
+        """
+        if not len(table):
+            return [0.0] * len(self.nodes)
+        table = table.astype(np.float64)
+        to_target = table[:, target:target + 1]
+        with np.errstate(invalid='ignore'):
+            bounds = np.abs(to_target - table)
+        # nan when both are unreachable from a landmark, no information
+        bounds = np.nan_to_num(bounds, nan=0.0, posinf=np.inf)
+        # float32 rounding, bounds must not overestimate
+        bounds = np.maximum(bounds.max(axis=0) - 1e-6 * table[np.isfinite(table)].max(initial=0) - 1e-3, 0)
+        return (bounds * scale).tolist()
+
+    def save_landmarks(self, path, masks):
+        """
+        Store the landmarks of restriction bitmasks to a compressed numpy file (.npz)
+
+        Parameters
+        ----------
+        path : path of the file
+        masks : list of bitmasks of restricted passages
+        """
+        entries, arrays = [], {}
+        for i, mask in enumerate(masks):
+            selected, table = self.landmarks(mask)
+            entries.append({'passages': self.passage_names(mask), 'landmarks': selected})
+            arrays[f'distances_{i}'] = table
+        meta = json.dumps({'fingerprint': self.fingerprint(), 'entries': entries})
+        np.savez_compressed(path, meta=np.array(meta), **arrays)
+
+    def load_landmarks(self, path):
+        """
+        Load landmarks stored by `save_landmarks`, ignored if they were computed for another graph
+
+        Returns
+        -------
+        boolean, True if the landmarks were loaded
+        """
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['fingerprint'] != self.fingerprint():
+                return False
+            for i, entry in enumerate(meta['entries']):
+                mask = self.passage_mask(entry['passages'])
+                self._landmarks.setdefault((mask, None), (entry['landmarks'], data[f'distances_{i}']))
+        return True
+
+    def dijkstra(self, sources, target=None, closed=None, cutoff=None, weights=None):
+        """
+        Dijkstra search from sources, stopping when target is settled.
+
+        Parameters
+        ----------
+        sources : dict of node index -> initial distance
+        target : node index, or a set of node indexes stopping when all are settled,
+            default None searches the whole graph
+        closed : bytearray of closed edges, see `closed_edges`
+        cutoff : float, default None
+            Stops the search at this distance, only nodes within it are settled
+        weights : list of edge weights, default None uses the weights of the graph
+
+        Returns
+        -------
+        tuple of lists indexed by node: (distance, predecessor node, predecessor edge)
+        """
+        n = len(self.nodes)
+        inf = float('inf')
+        dist = [inf] * n
+        pred_node = [-1] * n
+        pred_edge = [-1] * n
+        done = bytearray(n)
+
+        indptr, arc_head, arc_edge = self.indptr, self.arc_head, self.arc_edge
+        weights = self.weights if weights is None else weights
+        heappush, heappop = heapq.heappush, heapq.heappop
+        trace = instrumentation.current()
+        if trace is not None:
+            heappush, heappop = _counting_heap(trace)
+
+        heap = []
+        for s, d in sources.items():
+            if d < dist[s]:
+                dist[s] = d
+                heap.append((d, s))
+        heapq.heapify(heap)
+
+        if cutoff is None:
+            cutoff = inf
+        remaining = None
+        if isinstance(target, (set, frozenset, list, tuple)):
+            remaining, target = set(target), None
+            if not remaining:
+                heap = []
+
+        while heap:
+            d, u = heappop(heap)
+            if done[u]:
+                continue
+            if d > cutoff:
+                break
+            done[u] = 1
+            if u == target:
+                break
+            if remaining is not None and u in remaining:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            for a in range(indptr[u], indptr[u + 1]):
+                e = arc_edge[a]
+                if closed is not None and closed[e]:
+                    continue
+                v = arc_head[a]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred_node[v] = u
+                    pred_edge[v] = e
+                    heappush(heap, (nd, v))
+
+        if trace is not None:
+            _count_search(trace, done, indptr)
+        return dist, pred_node, pred_edge
+
+    def neighbourhood(self, source, cutoff, closed=None):
+        """
+        Dijkstra search from a node bounded by a distance, with dicts
+        instead of lists of all nodes, for many small searches.
+
+        Returns
+        -------
+        tuple of dicts of the nodes within cutoff: (node -> distance, node -> predecessor node)
+        """
+        indptr, arc_head, arc_edge, weights = self.indptr, self.arc_head, self.arc_edge, self.weights
+        heappush, heappop = heapq.heappush, heapq.heappop
+        dist = {}
+        pred = {source: -1}
+        seen = {source: 0}
+        heap = [(0, source)]
+        while heap:
+            d, u = heappop(heap)
+            if u in dist:
+                continue
+            dist[u] = d
+            for a in range(indptr[u], indptr[u + 1]):
+                e = arc_edge[a]
+                if closed is not None and closed[e]:
+                    continue
+                v = arc_head[a]
+                nd = d + weights[e]
+                if nd <= cutoff and nd < seen.get(v, cutoff + 1):
+                    seen[v] = nd
+                    pred[v] = u
+                    heappush(heap, (nd, v))
+        return dist, pred
+
+    def astar(self, sources, target, heuristic, closed=None, weights=None):
+        """
+        A* search from sources to target.
+
+        Parameters
+        ----------
+        sources : dict of node index -> initial distance
+        target : node index
+        heuristic : list indexed by node of lower bounds of the distance to target,
+            must be consistent, `inf` for nodes not reaching the target
+        closed : bytearray of closed edges, see `closed_edges`
+        weights : list of edge weights, default None uses the weights of the graph
+
+        Returns
+        -------
+        tuple of lists indexed by node: (distance, predecessor node, predecessor edge)
+        """
+        n = len(self.nodes)
+        inf = float('inf')
+        dist = [inf] * n
+        pred_node = [-1] * n
+        pred_edge = [-1] * n
+        done = bytearray(n)
+
+        indptr, arc_head, arc_edge = self.indptr, self.arc_head, self.arc_edge
+        weights = self.weights if weights is None else weights
+        heappush, heappop = heapq.heappush, heapq.heappop
+        trace = instrumentation.current()
+        if trace is not None:
+            heappush, heappop = _counting_heap(trace)
+
+        heap = []
+        for s, d in sources.items():
+            if d < dist[s]:
+                dist[s] = d
+                heap.append((d + heuristic[s], d, s))
+        heapq.heapify(heap)
+
+        while heap:
+            _, d, u = heappop(heap)
+            if done[u]:
+                continue
+            done[u] = 1
+            if u == target:
+                break
+            for a in range(indptr[u], indptr[u + 1]):
+                e = arc_edge[a]
+                if closed is not None and closed[e]:
+                    continue
+                v = arc_head[a]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    h = heuristic[v]
+                    if h == inf:
+                        continue
+                    dist[v] = nd
+                    pred_node[v] = u
+                    pred_edge[v] = e
+                    heappush(heap, (nd + h, nd, v))
+
+        if trace is not None:
+            _count_search(trace, done, indptr)
+        return dist, pred_node, pred_edge
+
+    def k_shortest_paths(self, source, target, k, closed=None, key=None, max_paths=None, weights=None):
+        """
+        Loopless k shortest paths with Yen's algorithm.
+
+        The shortest path tree towards the target is computed once, it gives the
+        first path and is reused as an exact heuristic of the A* spur searches.
+
+        Parameters
+        ----------
+        source, target : node indexes
+        k : number of paths
+        closed : bytearray of closed edges, see `closed_edges`
+        key : function of a passages bitmask, default None
+            When set, a path is only kept if its key differs from the keys of the paths already kept
+        max_paths : int, default None
+            Maximum number of paths examined, default is k, or 20 * k when `key` is set.
+            The next paths being mostly small variations of the shortest one, fewer than k paths
+            of distinct keys are often found, see `penalized_paths`
+        weights : list of edge weights, default None uses the weights of the graph
+
+        Returns
+        -------
+        A list of up to k tuples of (length, list of node indexes, passages bitmask), by length
+        """
+        inf = float('inf')
+        weights = self.weights if weights is None else weights
+        indptr, arc_edge = self.indptr, self.arc_edge
+        max_paths = max_paths or (k if key is None else 20 * k)
+
+        # undirected, the tree from the target leads each node to the target
+        tree, next_node, next_edge = self.dijkstra({target: 0}, closed=closed, weights=weights)
+        if tree[source] == inf:
+            raise nx.NetworkXNoPath(f"No path between {self.nodes[source]} and {self.nodes[target]}.")
+
+        path, edges = [source], []
+        while path[-1] != target:
+            edges.append(next_edge[path[-1]])
+            path.append(next_node[path[-1]])
+
+        found = [(tree[source], path, edges)]
+        seen = {tuple(path)}
+        candidates = []
+        kept, keys = [], set()
+
+        while True:
+            length, path, edges = found[-1]
+            mask = self.mask_of(edges)
+            path_key = key(mask) if key is not None else None
+            if key is None or path_key not in keys:
+                kept.append((length, path, mask))
+                keys.add(path_key)
+            if len(kept) >= k or len(found) >= max_paths:
+                break
+
+            base = bytearray(closed) if closed is not None else bytearray(len(weights))
+            root_length = 0
+            for i in range(len(path) - 1):
+                spur = path[i]
+                if i:
+                    # the root path is removed
+                    u = path[i - 1]
+                    for a in range(indptr[u], indptr[u + 1]):
+                        base[arc_edge[a]] = 1
+                    root_length += weights[edges[i - 1]]
+
+                blocked = bytearray(base)
+                root = path[:i + 1]
+                for _, other, other_edges in found:
+                    if len(other_edges) > i and other[:i + 1] == root:
+                        blocked[other_edges[i]] = 1
+
+                dist, pred_node, pred_edge = self.astar({spur: root_length}, target, tree, blocked, weights)
+                if dist[target] == inf:
+                    continue
+                spur_path, spur_edges = self.path_edges(target, pred_node, pred_edge)
+                candidate = path[:i] + spur_path
+                if tuple(candidate) in seen:
+                    continue
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (dist[target], len(seen), candidate, edges[:i] + spur_edges))
+
+            if not candidates:
+                break
+            length, _, path, edges = heapq.heappop(candidates)
+            found.append((length, path, edges))
+
+        return kept
+
+    def penalized_paths(self, source, target, k, closed=None, key=None, penalty=0.5, max_paths=None, weights=None):
+        """
+        Alternative paths by penalty: after each path, the weights of its edges are increased
+        by `penalty` (relative), and of all edges of its passages when `key` is set,
+        so that the next search finds a different route.
+
+        Parameters
+        ----------
+        source, target : node indexes
+        k : number of paths
+        closed : bytearray of closed edges, see `closed_edges`
+        key : function of a passages bitmask, default None
+            When set, a path is only kept if its key differs from the keys of the paths already kept
+        penalty : float, default 0.5, relative increase of the weights of used edges
+        max_paths : int, default None
+            Maximum number of searches, default is 5 * k
+        weights : list of edge weights, default None uses the weights of the graph
+
+        Returns
+        -------
+        A list of up to k tuples of (length, list of node indexes, passages bitmask), by length
+        """
+        base = self.weights if weights is None else weights
+        weights = list(base)
+        max_paths = max_paths or 5 * k
+        kept, keys, seen = [], set(), set()
+
+        for _ in range(max_paths):
+            _, pred_node, pred_edge = self.dijkstra({source: 0}, target, closed, weights=weights)
+            if source != target and pred_node[target] < 0:
+                break
+            path, edges = self.path_edges(target, pred_node, pred_edge)
+            mask = self.mask_of(edges)
+            path_key = key(mask) if key is not None else None
+
+            if tuple(path) not in seen and (key is None or path_key not in keys):
+                seen.add(tuple(path))
+                keys.add(path_key)
+                kept.append((sum(base[e] for e in edges), path, mask))
+                if len(kept) >= k:
+                    break
+
+            for e in edges:
+                weights[e] += base[e] * penalty
+            if key is not None and mask:
+                for e, bits in enumerate(self.edge_passages):
+                    if bits & mask:
+                        weights[e] += base[e] * penalty
+
+        kept.sort(key=lambda path: path[0])
+        return kept
+
+    def mask_of(self, edges):
+        """Passages bitmask of a list of edges"""
+        mask = 0
+        edge_passages = self.edge_passages
+        for e in edges:
+            mask |= edge_passages[e]
+        return mask
+
+    def path_edges(self, target, pred_node, pred_edge):
+        """Path to target and its edges, from predecessors of a search"""
+        path, edges = [target], []
+        u = target
+        while pred_node[u] >= 0:
+            edges.append(pred_edge[u])
+            u = pred_node[u]
+            path.append(u)
+        path.reverse()
+        edges.reverse()
+        return path, edges
+
+    def shortest_path(self, source, target, closed=None, weights=None, heuristic=None):
+        """
+        Shortest path between two node indexes.
+        Dijkstra algorithm is used, or A* when a heuristic is given (see `alt_heuristic`).
+
+        Returns
+        -------
+        tuple of (list of node indexes, passages bitmask of the path)
+
+        Raises
+        ------
+        NetworkXNoPath when target can not be reached
+        """
+        if heuristic is None:
+            _, pred_node, pred_edge = self.dijkstra({source: 0}, target, closed, weights=weights)
+        else:
+            _, pred_node, pred_edge = self.astar({source: 0}, target, heuristic, closed, weights=weights)
+        if source != target and pred_node[target] < 0:
+            raise nx.NetworkXNoPath(f"No path between {self.nodes[source]} and {self.nodes[target]}.")
+        return self.reconstruct(target, pred_node, pred_edge)
+
+    def reconstruct(self, target, pred_node, pred_edge):
+        """Path to target and its passages bitmask, from predecessors of a search"""
+        path = [target]
+        mask = 0
+        edge_passages = self.edge_passages
+        u = target
+        while pred_node[u] >= 0:
+            mask |= edge_passages[pred_edge[u]]
+            u = pred_node[u]
+            path.append(u)
+        path.reverse()
+        return path, mask
+
+
+def _counting_heap(trace):
+    """heappush and heappop counting their calls in a trace"""
+    counters = trace.counters
+
+    def heappush(heap, item):
+        counters['heap_pushes'] += 1
+        heapq.heappush(heap, item)
+
+    def heappop(heap):
+        counters['heap_pops'] += 1
+        return heapq.heappop(heap)
+
+    return heappush, heappop
+
+
+def _count_search(trace, done, indptr):
+    """Nodes settled by a search and edges relaxed from them"""
+    settled = np.flatnonzero(np.frombuffer(done, dtype=np.uint8))
+    indptr = np.asarray(indptr)
+    counters = trace.counters
+    counters['searches'] += 1
+    counters['nodes_settled'] += len(settled)
+    counters['edges_relaxed'] += int((indptr[settled + 1] - indptr[settled]).sum())
@@ -0,0 +1,276 @@
+"""
+Command line bulk routing of origin-destination files.
+
+The input is a CSV file (or Parquet with pyarrow installed) with a header and either
+`origin` and `destination` columns of port codes (e.g. FRLEH) or of "lon,lat", or
+`origin_lon`, `origin_lat`, `destination_lon` and `destination_lat` columns.
+An `id` column is copied to the output, the row number is used otherwise.
+
+Rows are read in chunks routed by a pool of processes, and the results are appended to the
+output CSV in input order with `length`, `units`, `duration_hours`, `traversed_passages`,
+optionally the `geometry`, and an `error` for the rows that could not be routed. Only a few
+chunks are in memory at once, whatever the size of the input.
+
+After each chunk the number of rows written is saved in a checkpoint file: an interrupted job
+started again with the same arguments resumes after the last chunk written, a job with other
+routing or output options is refused.
+
+Examples
+--------
+searoute od.csv routes.csv --workers 8 --units km --speed-knot 14 --geometry polyline
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from searoute.classes.passages import Passage
+from searoute.main import searoute, setup_M, setup_P
+
+COLUMNS = ['id', 'origin', 'destination', 'length', 'units', 'duration_hours', 'traversed_passages', 'geometry', 'error']
+GEOMETRIES = ('none', 'polyline', 'geojson')
+
+_context = None
+
+
+def _init_worker(options):
+    global _context
+    M, P = setup_M(), setup_P()
+    codes = {data['port']: node for node, data in P.nodes(data=True) if data.get('port')}
+    _context = (M, P, codes, options)
+
+
+def _worker_route_chunk(rows):
+    return _route_chunk(rows, *_context)
+
+
+def _location(value, codes):
+    """(lon, lat) of a port code or of a "lon,lat" string"""
+    if isinstance(value, (list, tuple)):
+        return tuple(float(v) for v in value)
+    value = str(value).strip()
+    if value.upper() in codes:
+        return codes[value.upper()]
+    parts = value.split(',')
+    if len(parts) != 2:
+        raise ValueError(f'Unknown port code or location {value}')
+    return float(parts[0]), float(parts[1])
+
+
+def _route_chunk(rows, M, P, codes, options):
+    geometry = options['geometry']
+    output = {'none': 'array', 'polyline': 'polyline', 'geojson': 'array'}[geometry]
+    results = []
+    for key, origin, destination in rows:
+        row = {'id': key, 'origin': _format(origin), 'destination': _format(destination)}
+        try:
+            shape, properties = searoute(_location(origin, codes), _location(destination, codes), M=M, P=P,
+                                         units=options['units'], speed_knot=options['speed_knot'],
+                                         restrictions=options['restrictions'], return_passages=True,
+                                         simplify=options['simplify'], output=output, precision=options['precision'])
+        except Exception as e:
+            row['error'] = str(e) or type(e).__name__
+        else:
+            row['length'] = properties['length']
+            row['units'] = properties['units']
+            row['duration_hours'] = properties['duration_hours']
+            row['traversed_passages'] = ';'.join(properties['traversed_passages'])
+            if geometry == 'polyline':
+                row['geometry'] = shape
+            elif geometry == 'geojson':
+                row['geometry'] = json.dumps({'type': 'LineString', 'coordinates': shape.tolist()})
+        results.append(row)
+    return results
+
+
+def _format(location):
+    return ','.join(str(v) for v in location) if isinstance(location, (list, tuple)) else location
+
+
+def read_rows(path, chunk_size=10000):
+    """
+    Origin-destination rows of a CSV or Parquet file, read lazily
+
+    Returns
+    -------
+    A generator of (id, origin, destination), origin and destination being a port code,
+    a "lon,lat" string or a (lon, lat) tuple
+    """
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('Reading Parquet files requires pyarrow: pip install pyarrow')
+        records = (record for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+                   for record in batch.to_pylist())
+        yield from _od_rows(records)
+    else:
+        with open(path, newline='') as f:
+            yield from _od_rows(csv.DictReader(f))
+
+
+def _od_rows(records):
+    for i, record in enumerate(records):
+        key = record.get('id', i)
+        if 'origin' in record and 'destination' in record:
+            yield key, record['origin'], record['destination']
+        else:
+            try:
+                yield (key, (record['origin_lon'], record['origin_lat']),
+                       (record['destination_lon'], record['destination_lat']))
+            except KeyError:
+                raise ValueError('The input must have origin and destination columns, '
+                                 'or origin_lon, origin_lat, destination_lon and destination_lat columns')
+
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _load_checkpoint(path, input_path, options):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        raise ValueError(f'Checkpoint {path} is of another input: {checkpoint.get("input")}')
+    if checkpoint.get('options') != options:
+        raise ValueError(f'Checkpoint {path} was written with other options: {checkpoint.get("options")}')
+    return checkpoint
+
+
+def _save_checkpoint(path, input_path, options, rows, output_bytes):
+    temp = path + '.tmp'
+    with open(temp, 'w') as f:
+        json.dump({'input': os.path.abspath(input_path), 'options': options, 'rows': rows, 'output_bytes': output_bytes}, f)
+    os.replace(temp, path)
+
+
+def _csv_bytes(columns, rows, header=False):
+    text = io.StringIO(newline='')
+    writer = csv.DictWriter(text, columns, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return text.getvalue().encode()
+
+
+def route_file(input_path, output_path, checkpoint_path=None, workers=None, chunk_size=1000, units='naut', speed_knot=24,
+               restrictions=[Passage.northwest], geometry='none', simplify=None, precision=None, report=sys.stderr):
+    """
+    Routes the origin-destination pairs of a file into a CSV file, see the module documentation
+
+    Parameters
+    ----------
+    input_path : path of a CSV or Parquet file
+    output_path : path of the CSV output
+    checkpoint_path : path of the checkpoint, default is output_path + '.checkpoint'
+    workers : int, default None uses the number of CPUs, 1 routes in the current process
+    chunk_size : int, default 1000, number of rows sent at once to a process
+    units, speed_knot, restrictions, simplify, precision : see `searoute`
+    geometry : str, default 'none', 'polyline' or 'geojson' to add the geometry of the routes
+    report : file receiving the progress and throughput, None is silent
+
+    Returns
+    -------
+    The number of rows routed by this call
+    """
+    if geometry not in GEOMETRIES:
+        raise ValueError(f"Invalid geometry '{geometry}', must be one of {', '.join(GEOMETRIES)}")
+    checkpoint_path = checkpoint_path or output_path + '.checkpoint'
+    workers = workers or os.cpu_count() or 1
+    options = {'units': units, 'speed_knot': speed_knot, 'restrictions': list(restrictions), 'geometry': geometry,
+               'simplify': simplify, 'precision': precision}
+
+    # as saved in JSON, to be compared with the options of a checkpoint
+    options = json.loads(json.dumps(options))
+    checkpoint = _load_checkpoint(checkpoint_path, input_path, options)
+    done = checkpoint['rows'] if checkpoint else 0
+    rows = islice(read_rows(input_path, chunk_size), done, None)
+
+    columns = COLUMNS if geometry != 'none' else [c for c in COLUMNS if c != 'geometry']
+    # binary, so that the offsets of the checkpoint are byte offsets
+    out = open(output_path, 'r+b' if checkpoint else 'wb')
+    if checkpoint:
+        # drops the rows written after the checkpoint
+        out.truncate(checkpoint['output_bytes'])
+        out.seek(checkpoint['output_bytes'])
+    else:
+        out.write(_csv_bytes(columns, [], header=True))
+
+    start = time.perf_counter()
+    routed = 0
+
+    def write(results):
+        nonlocal done, routed
+        out.write(_csv_bytes(columns, results))
+        out.flush()
+        os.fsync(out.fileno())
+        done += len(results)
+        routed += len(results)
+        _save_checkpoint(checkpoint_path, input_path, options, done, out.tell())
+        if report is not None:
+            elapsed = time.perf_counter() - start
+            print(f'{done} rows, {routed / elapsed:.1f} rows/s, {elapsed:.1f}s', file=report, flush=True)
+
+    try:
+        if workers == 1:
+            _init_worker(options)
+            for chunk in _chunks(rows, chunk_size):
+                write(_worker_route_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(options,)) as executor:
+                # a bounded number of chunks in flight keeps the memory fixed
+                pending = deque()
+                for chunk in _chunks(rows, chunk_size):
+                    pending.append(executor.submit(_worker_route_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        out.close()
+
+    os.remove(checkpoint_path)
+    if report is not None:
+        elapsed = time.perf_counter() - start
+        print(f'Done: {routed} rows routed in {elapsed:.1f}s ({routed / max(elapsed, 1e-9):.1f} rows/s), '
+              f'{done} rows in {output_path}', file=report, flush=True)
+    return routed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='searoute', description='Routes the origin-destination pairs of a CSV or Parquet file.')
+    parser.add_argument('input', help='CSV or Parquet (.parquet) file of origins and destinations')
+    parser.add_argument('output', help='CSV file of the routes')
+    parser.add_argument('--checkpoint', help='checkpoint file, default is the output path with .checkpoint')
+    parser.add_argument('--workers', type=int, help='number of processes, default the number of CPUs')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='rows sent at once to a process, default 1000')
+    parser.add_argument('--units', default='naut', help='units of the lengths, default naut')
+    parser.add_argument('--speed-knot', type=float, default=24, help='speed of the boat, default 24 knots')
+    parser.add_argument('--restrictions', default=Passage.northwest,
+                        help='comma separated passages to be restricted, default northwest, "" for none')
+    parser.add_argument('--geometry', choices=GEOMETRIES, default='none', help='geometry of the routes, default none')
+    parser.add_argument('--simplify', type=float, help='tolerance of the simplification of the geometry, in units')
+    parser.add_argument('--precision', type=int, help='decimals of the coordinates of the geometry')
+    parser.add_argument('--quiet', action='store_true', help='no progress report')
+    args = parser.parse_args(argv)
+
+    restrictions = [r.strip() for r in args.restrictions.split(',') if r.strip()]
+    route_file(args.input, args.output, args.checkpoint, args.workers, args.chunk_size, args.units, args.speed_knot,
+               restrictions, args.geometry, args.simplify, args.precision, None if args.quiet else sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
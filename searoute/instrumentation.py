@@ -0,0 +1,181 @@
+"""
+Opt-in instrumentation of the routing: wall time of the phases (snapping, search, geometry,
+lengths, ...) and counters of the search effort (nodes settled, edges relaxed, heap operations,
+cache hits) of a call of `searoute` or `Marnet.shortest_path` with `instrument` set.
+
+The trace of the running call is kept in a context variable, the instrumented code only looks
+it up, so nothing is measured or counted when instrumentation is off.
+Every trace is also recorded by the process-wide `collector`, aggregating histograms of the phases.
+
+Examples
+--------
+>>> route = sr.searoute(origin, destination, instrument=True)
+>>> route.properties['instrumentation']
+{'total': 0.012, 'phases': {'snap': 0.0001, 'search': 0.011, ...}, 'counters': {'nodes_settled': 5012, ...}}
+>>> sr.searoute(origin, destination, instrument=lambda trace: print(trace['phases']))
+>>> from searoute.instrumentation import collector
+>>> collector.summary()
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_active = ContextVar('searoute_trace', default=None)
+
+
+class Trace:
+    """Phase times in seconds and counters of an instrumented call"""
+
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.start = time.perf_counter()
+        self.total = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def stop(self):
+        self.total = time.perf_counter() - self.start
+
+    def as_dict(self):
+        return {'total': self.total, 'phases': dict(self.phases), 'counters': dict(self.counters)}
+
+
+class Collector:
+    """
+    Aggregates traces: histograms of the total and phase times, and sums of the counters.
+    It can be given as `instrument`, it is then called with each trace.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self._histograms = {}
+            self.counters = defaultdict(int)
+
+    def __call__(self, trace):
+        self.record(trace)
+
+    def record(self, trace):
+        """Adds a trace, a Trace or the dict of `Trace.as_dict`"""
+        if isinstance(trace, Trace):
+            trace = trace.as_dict()
+        with self._lock:
+            self.count += 1
+            self._observe('total', trace['total'])
+            for name, seconds in trace['phases'].items():
+                self._observe(name, seconds)
+            for name, n in trace['counters'].items():
+                self.counters[name] += n
+
+    def _observe(self, name, seconds):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = {'counts': [0] * (len(self.buckets) + 1), 'count': 0, 'sum': 0.0}
+        i = 0
+        while i < len(self.buckets) and seconds > self.buckets[i]:
+            i += 1
+        histogram['counts'][i] += 1
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+    def histograms(self):
+        """
+        Histograms of the total and phase times
+
+        Returns
+        -------
+        dict of phase -> {'buckets': list of (upper bound in seconds, count), the last bound being inf,
+        'count': number of traces with the phase, 'sum': seconds}
+        """
+        with self._lock:
+            bounds = self.buckets + (float('inf'),)
+            return {name: {'buckets': list(zip(bounds, h['counts'])), 'count': h['count'], 'sum': h['sum']}
+                    for name, h in self._histograms.items()}
+
+    def summary(self):
+        """Number of traces, mean seconds of the total and phases, and mean counters per trace"""
+        with self._lock:
+            count = self.count
+            return {'count': count,
+                    'seconds': {name: h['sum'] / h['count'] for name, h in self._histograms.items()},
+                    'counters': {name: n / count for name, n in self.counters.items()} if count else {}}
+
+
+# traces of all instrumented calls of the process
+collector = Collector()
+
+
+class _NoPhase:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def current():
+    """Trace of the running instrumented call, None when instrumentation is off"""
+    return _active.get()
+
+
+def phase(name):
+    """Context manager timing a phase of the running instrumented call, doing nothing when instrumentation is off"""
+    trace = _active.get()
+    return _NO_PHASE if trace is None else trace.phase(name)
+
+
+def count(name, n=1):
+    """Adds to a counter of the running instrumented call, does nothing when instrumentation is off"""
+    trace = _active.get()
+    if trace is not None:
+        trace.counters[name] += n
+
+
+@contextmanager
+def instrumented(instrument):
+    """
+    Traces the block when `instrument` is set, yields the Trace or None.
+
+    Parameters
+    ----------
+    instrument : None or False does nothing, True records the trace in `collector`,
+        a callable (e.g. a Collector) is also called with the dict of the trace.
+        Inside an instrumented call, the trace of that call is used.
+    """
+    trace = _active.get()
+    if not instrument or trace is not None:
+        yield trace
+        return
+
+    trace = Trace()
+    token = _active.set(trace)
+    try:
+        yield trace
+    finally:
+        _active.reset(token)
+        trace.stop()
+    collector.record(trace)
+    if callable(instrument) and instrument is not collector:
+        instrument(trace.as_dict())
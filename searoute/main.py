@@ -1,19 +1,20 @@
 import sys
 import os
-import tkinter as tk
-from tkinter import messagebox
-from tkinter import ttk
-import re
-import traceback
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from searoute.classes import ports, marnet, passages
-from searoute.utils import get_duration, distance_length, from_nodes_edges_set, process_route, validate_lon_lat
-from geojson import Feature, LineString
+from searoute.classes.route import Route
+from searoute.classes.cost_overlay import CostOverlay
+from searoute.instrumentation import instrumented, phase
+from searoute.utils import get_duration, distance_length, distances, from_nodes_edges_set, process_route, validate_lon_lat, simplify_linestring, conversions, speed_coef, convex_hull, normalize_linestring, shortest_visit_order
+from geojson import Feature, FeatureCollection, LineString, Point, Polygon
 from functools import lru_cache
+import numpy as np
+import networkx as nx
 from copy import copy
-from searoute.data.ports_dict import node_list
+
+OUTPUTS = ('geojson', 'route', 'array', 'polyline', 'wkb')
 
 @lru_cache(maxsize=None)
 def setup_P():
@@ -23,13 +24,17 @@ def setup_P():
 @lru_cache(maxsize=None)
 def setup_M():
     from searoute.data.marnet_dict import edge_list as marnet_e, node_list as marnet_n
-    return from_nodes_edges_set(marnet.Marnet(), marnet_n, marnet_e)
+    M = from_nodes_edges_set(marnet.Marnet(), marnet_n, marnet_e)
+    M.landmarks_path = os.path.join(os.path.dirname(__file__), 'data', 'marnet_landmarks.npz')
+    return M
 
-def searoute(origin, destination, waypoints=None, units='naut', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False):
+def searoute(origin, destination, waypoints=None, units='naut', speed_knot=24, append_orig_dest=False, restrictions=[passages.Passage.northwest], include_ports=False, port_params={}, M:marnet.Marnet=None, P:ports.Ports=None, return_passages:bool = False, simplify:float = None, output:str = 'geojson', precision:int = None, overlay:CostOverlay = None, zones=None, heuristic:str = None, unreachable:str = 'raise', instrument=None):
     if M is None:
         M = copy(setup_M())
     if P is None:
         P = copy(setup_P())
+    if output not in OUTPUTS:
+        raise ValueError(f"Invalid output '{output}', must be one of {', '.join(OUTPUTS)}")
     validate_lon_lat(origin)
     validate_lon_lat(destination)
 
@@ -45,202 +50,506 @@ def searoute(origin, destination, waypoints=None, units='naut', speed_knot=24, a
     if M is None:
         raise Exception('Marnet network must not be None')
 
-    waypoints.insert(0, origin)
-    waypoints.append(destination)
-
-    total_length = 0
-    total_duration = 0
-    complete_route = []
-    traversed_passages = []
-
-    for i in range(len(waypoints) - 1):
-        o_origin = tuple(waypoints[i])
-        o_destination = tuple(waypoints[i+1])
-        
-        shortest_route_by_distance = M.shortest_path(o_origin, o_destination)
-
-        if shortest_route_by_distance is None:
-            shortest_route_by_distance = []
-        
-        ls, passages_in_segment = process_route(shortest_route_by_distance, M, return_passages)
-        length_segment = distance_length(ls, units=units)
-        duration_segment = get_duration(speed_knot, length_segment, units)
-
-        total_length += length_segment
-        total_duration += duration_segment
-        complete_route.extend(ls)
-        if passages_in_segment:
-            traversed_passages.extend(passages_in_segment)
-
-    feature = Feature(geometry=LineString(complete_route), properties={
-                      'length': total_length, 'units': units, 'duration_hours': total_duration})
-
-    if return_passages:
-        feature.properties['traversed_passages'] = passages.Passage.filter_valid_passages(traversed_passages)
-
-    return feature
-
-def port_name_to_coords(port_name):
-    port_name = re.sub(r'\s+', '', port_name).lower()
-    for coords, port_info in node_list.items():
-        if port_info['name'].replace(' ', '').lower() == port_name:
-            return [port_info['x'], port_info['y']]
-    raise ValueError("항구 이름을 찾을 수 없습니다: {}".format(port_name))
-
-def calculate_route(event=None):
-    try:
-        waypoints = [entry_origin_name.get()] + [entry.get() for entry in waypoint_entries if entry.get()] + [entry_destination_name.get()]
-        
-        if len(waypoints) < 2:
-            raise ValueError("최소한 출발지와 도착지를 입력해야 합니다.")
-        
-        speed_knot = float(entry_speed.get())
-        mfo_consumption = float(entry_mfo.get())
-        mgo_consumption = float(entry_mgo.get())
-        bunker_price = float(entry_bunker_price.get())
-
-        total_distance = 0
+    with instrumented(instrument) as trace:
+        points = [tuple(origin), *(tuple(waypoint) for waypoint in waypoints), tuple(destination)]
+        legs = M.shortest_paths(points, restrictions=restrictions, overlay=overlay, zones=zones, heuristic=heuristic, unreachable=unreachable)
+        result = _build_route(M, legs, units, speed_knot, return_passages, simplify, output, precision)
+
+    if instrument is True:
+        properties = result.properties if output in ('geojson', 'route') else result[1]
+        properties['instrumentation'] = trace.as_dict()
+    return result
+
+def _build_route(M, legs, units='naut', speed_knot=24, return_passages=False, simplify=None, output='geojson', precision=None):
+    """Result of `searoute` from the paths of its legs, see `Marnet.shortest_paths`"""
+    # geometry of all legs in a single buffer, longitudes normalized along each leg
+    with phase('geometry'):
+        coords = M.search_graph.coords
+        complete_route = np.empty((sum(len(path) for path, _ in legs), 2))
+        bounds = []
+        start = 0
+        traversed_passages = 0
+        for path, mask in legs:
+            leg = complete_route[start:start + len(path)]
+            leg[:] = coords[path]
+            steps = np.diff(leg[:, 0])
+            leg[1:, 0] += np.cumsum(np.where(steps < -180, 360, np.where(steps > 180, -360, 0)))
+            bounds.append((start, start + len(path)))
+            start += len(path)
+            traversed_passages |= mask
+
+    with phase('length'):
+        segments = distances(complete_route[:-1], complete_route[1:], units)
+        total_length = 0
         total_duration = 0
-        route_details = []
-
-        for i in range(len(waypoints) - 1):
-            origin = port_name_to_coords(waypoints[i])
-            destination = port_name_to_coords(waypoints[i+1])
-            
-            print(f"Segment {i+1}: Origin: {origin}, Destination: {destination}")  # 디버깅용 출력
-            
-            route = searoute(origin, destination, units='naut', speed_knot=speed_knot)
-            
-            distance_nm = route.properties['length']
-            duration_hours = route.properties['duration_hours']
-            duration_days = duration_hours / 24  # 시간을 일로 변환
-            
-            total_distance += distance_nm
-            total_duration += duration_hours
-            
-            route_details.append(f"{waypoints[i]} → {waypoints[i+1]}: {distance_nm:.1f} n.miles, {duration_days:.2f} days")
-
-        total_duration_days = total_duration / 24
-        mfo_cost = mfo_consumption * total_duration_days * bunker_price
-        mgo_cost = mgo_consumption * total_duration_days * bunker_price
-        total_cost = mfo_cost + mgo_cost
-
-        result_text = "경로 세부 정보:\n" + "\n".join(route_details) + f"\n\n총 거리: {total_distance:.1f} n.miles\n"
-        result_text += f"총 소요 시간: {total_duration_days:.2f} days\n"
-        result_text += f"총 비용: ${total_cost:.2f}\n"
-        result_text += f"출발지: {waypoints[0]}\n"
-        result_text += f"도착지: {waypoints[-1]}"
-
-        result.set(result_text)
-    except Exception as e:
-        error_message = f"오류 발생: {str(e)}\n"
-        error_message += f"오류 타입: {type(e).__name__}\n"
-        error_message += f"오류 위치:\n{traceback.format_exc()}"
-        messagebox.showerror("오류", error_message)
-        print(error_message)  # 콘솔에도 오류 메시지 출력
-
-def reset_fields():
-    entry_origin_name.delete(0, tk.END)
-    entry_destination_name.delete(0, tk.END)
-    entry_speed.delete(0, tk.END)
-    entry_mfo.delete(0, tk.END)
-    entry_mgo.delete(0, tk.END)
-    entry_bunker_price.delete(0, tk.END)
-    for entry in waypoint_entries:
-        entry.master.destroy()
-    waypoint_entries.clear()
-    result.set("")
-
-waypoint_entries = []
-
-def add_waypoint(event=None):
-    waypoint_frame = ttk.Frame(waypoints_frame)
-    waypoint_frame.pack(fill=tk.X, padx=5, pady=2)
-    
-    waypoint_entry = ttk.Entry(waypoint_frame)
-    waypoint_entry.pack(side=tk.LEFT, expand=True, fill=tk.X)
-    waypoint_entry.bind("<Return>", on_waypoint_enter)
-    
-    remove_button = ttk.Button(waypoint_frame, text="삭제", command=lambda: remove_waypoint(waypoint_frame, waypoint_entry))
-    remove_button.pack(side=tk.RIGHT)
-    
-    waypoint_entries.append(waypoint_entry)
-    
-    waypoint_entry.focus()  # 새로 추가된 입력 칸에 포커스 설정
-
-def on_waypoint_enter(event):
-    if event.widget.get().strip():
-        add_waypoint()
-    else:
-        event.widget.tk_focusNext().focus()
-    return "break"
-
-def remove_waypoint(frame, entry):
-    frame.destroy()
-    if entry in waypoint_entries:
-        waypoint_entries.remove(entry)
-
-def focus_next_widget(event):
-    event.widget.tk_focusNext().focus()
-    return "break"
-
-app = tk.Tk()
-app.title("Sea Route Calculator")
-app.protocol("WM_DELETE_WINDOW", app.destroy)  # Close the app properly
-
-main_frame = ttk.Frame(app, padding="10")
-main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-
-input_frame = ttk.Frame(main_frame)
-input_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-
-ttk.Label(input_frame, text="출발지 항구 이름").grid(column=0, row=0, sticky=tk.W)
-entry_origin_name = ttk.Entry(input_frame)
-entry_origin_name.grid(column=1, row=0, sticky=(tk.W, tk.E))
-entry_origin_name.bind("<Return>", focus_next_widget)
-
-ttk.Label(input_frame, text="도착지 항구 이름").grid(column=0, row=1, sticky=tk.W)
-entry_destination_name = ttk.Entry(input_frame)
-entry_destination_name.grid(column=1, row=1, sticky=(tk.W, tk.E))
-entry_destination_name.bind("<Return>", focus_next_widget)
-
-ttk.Label(input_frame, text="선박 속도 (Knot)").grid(column=0, row=2, sticky=tk.W)
-entry_speed = ttk.Entry(input_frame)
-entry_speed.grid(column=1, row=2, sticky=(tk.W, tk.E))
-entry_speed.bind("<Return>", focus_next_widget)
-
-ttk.Label(input_frame, text="MFO 소모량 (톤/일)").grid(column=0, row=3, sticky=tk.W)
-entry_mfo = ttk.Entry(input_frame)
-entry_mfo.grid(column=1, row=3, sticky=(tk.W, tk.E))
-entry_mfo.bind("<Return>", focus_next_widget)
-
-ttk.Label(input_frame, text="MGO 소모량 (톤/일)").grid(column=0, row=4, sticky=tk.W)
-entry_mgo = ttk.Entry(input_frame)
-entry_mgo.grid(column=1, row=4, sticky=(tk.W, tk.E))
-entry_mgo.bind("<Return>", focus_next_widget)
+        for first, last in bounds:
+            length_segment = float(segments[first:last - 1].sum())
+            total_length += length_segment
+            total_duration += get_duration(speed_knot, length_segment, units)
 
-ttk.Label(input_frame, text="Bunker 가격 ($/톤)").grid(column=0, row=5, sticky=tk.W)
-entry_bunker_price = ttk.Entry(input_frame)
-entry_bunker_price.grid(column=1, row=5, sticky=(tk.W, tk.E))
-entry_bunker_price.bind("<Return>", focus_next_widget)
+    vertices = len(complete_route)
+    if simplify:
+        # length and duration stay measured on the complete route
+        with phase('simplify'):
+            complete_route = np.asarray(simplify_linestring(complete_route, simplify, units))
 
-waypoints_frame = ttk.LabelFrame(main_frame, text="경유지")
-waypoints_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
+    properties = {'length': total_length, 'units': units, 'duration_hours': total_duration}
 
-ttk.Button(main_frame, text="경유지 추가", command=add_waypoint).grid(row=2, column=0, sticky=(tk.W, tk.E))
+    if simplify:
+        properties['vertices'] = vertices
+        properties['vertices_simplified'] = len(complete_route)
 
-ttk.Button(main_frame, text="계산", command=calculate_route).grid(row=3, column=0, sticky=(tk.W, tk.E))
-
-reset_button = ttk.Button(main_frame, text="리셋", command=reset_fields)
-reset_button.grid(row=4, column=0, sticky=(tk.W, tk.E))
-
-result = tk.StringVar()
-result_label = ttk.Label(main_frame, textvariable=result, wraplength=400)
-result_label.grid(row=5, column=0, sticky=(tk.W, tk.E))
-
-for child in main_frame.winfo_children():
-    child.grid_configure(padx=5, pady=5)
+    if return_passages:
+        with phase('passages'):
+            properties['traversed_passages'] = passages.Passage.filter_valid_passages(M.passage_names(traversed_passages))
+
+    with phase('output'):
+        if output == 'geojson':
+            complete_route = complete_route.tolist()
+            geometry = LineString(complete_route) if precision is None else LineString(complete_route, precision=precision)
+            return Feature(geometry=geometry, properties=properties)
+
+        route = Route(complete_route, properties, precision, speed_knot=speed_knot)
+        if output == 'route':
+            return route
+        elif output == 'array':
+            return route.coordinates, properties
+        elif output == 'polyline':
+            return route.to_polyline(), properties
+        else:
+            return route.to_wkb(), properties
+
+def searoute_alternatives(origin, destination, k=3, units='naut', speed_knot=24, restrictions=[passages.Passage.northwest], distinct_passages:bool = False, method:str = 'penalty', M:marnet.Marnet=None, P:ports.Ports=None, overlay:CostOverlay = None, zones=None, unreachable:str = 'raise'):
+    """
+    Alternative sea routes between an origin and a destination, shortest first.
+
+    Parameters
+    ----------
+    origin : (lon, lat) of the origin
+    destination : (lon, lat) of the destination
+    k : number of routes, default 3
+    units : the unit of the lengths, default is `naut`
+    speed_knot : speed of the boat, default 24 knots
+    restrictions : list of passages to be restricted, default is ['northwest']
+    distinct_passages : boolean, default False
+        Only returns routes traversing distinct sets of passages (e.g. via Suez, via the Cape, via Panama)
+    method : str, default `penalty`
+        `penalty` repeated searches increasing the weights of the edges already used,
+        giving clearly different routes,
+        `yen` exact loopless k shortest paths (Yen's algorithm), which are often small
+        variations of the shortest route. With `distinct_passages`, only the k shortest paths
+        are examined, as their variations rarely traverse other passages, and the routes
+        missing are found by penalty
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports
+    overlay : CostOverlay, default None
+        Costs of edges replacing their weight during the search
+    zones : exclusion zones to avoid, default None
+        An AreaFeature, a list of AreaFeature or a FeatureCollection of them
+    unreachable : str, default 'raise'
+        When the destination can not be reached from the origin, 'raise' raises NetworkXNoPath,
+        'snap' routes to the closest node reachable from the origin instead, as `searoute`
+
+    Returns
+    -------
+    A list of up to k GeoJson Features of LineString, with properties `length`, `units`,
+    `duration_hours`, `traversed_passages` and `rank`.
+    As `searoute`, the fewest restricted passages are lifted when the destination can only be reached through them
+    """
+    if M is None:
+        M = setup_M()
+    validate_lon_lat(origin)
+    validate_lon_lat(destination)
 
-app.bind_all("<Tab>", focus_next_widget)
+    if method not in ('yen', 'penalty'):
+        raise ValueError(f"Invalid method '{method}', must be yen or penalty")
+    if unreachable not in ('raise', 'snap'):
+        raise ValueError(f"Invalid unreachable '{unreachable}', must be raise or snap")
+
+    sg = M.search_graph
+    source, target = M.snap([origin, destination])
+    zones_key = M.zones_key(zones)
+    restricted = sg.passage_mask(M.restrictions if restrictions is None else restrictions)
+    mask, target = M._leg_target(source, target, restricted, zones_key, unreachable, origin, destination)
+    closed = sg.closed_edges(mask, zones_key)
+
+    def passages_of(mask):
+        return frozenset(passages.Passage.filter_valid_passages(sg.passage_names(mask)))
+
+    key = passages_of if distinct_passages else None
+    weights = overlay.weights(sg) if overlay is not None else None
+    if method == 'yen':
+        paths = sg.k_shortest_paths(source, target, k, closed, key=key, max_paths=k, weights=weights)
+        if key is not None and len(paths) < k:
+            keys = {key(mask) for _, _, mask in paths}
+            paths += [path for path in sg.penalized_paths(source, target, k, closed, key=key, weights=weights)
+                      if key(path[2]) not in keys][:k - len(paths)]
+            paths.sort(key=lambda path: path[0])
+    else:
+        paths = sg.penalized_paths(source, target, k, closed, key=key, weights=weights)
+
+    features = []
+    for rank, (_, path, mask) in enumerate(paths):
+        ls, _ = process_route([sg.nodes[i] for i in path], M)
+        length = distance_length(ls, units=units)
+        features.append(Feature(geometry=LineString(ls), properties={
+            'length': length, 'units': units, 'duration_hours': get_duration(speed_knot, length, units),
+            'traversed_passages': sorted(passages_of(mask)), 'rank': rank}))
+
+    return features
+
+def reachable_ports(origin, max_length:float = None, max_duration:float = None, units='naut', speed_knot=24, restrictions=[passages.Passage.northwest], frontier:bool = False, M:marnet.Marnet=None, P:ports.Ports=None, overlay:CostOverlay = None, zones=None):
+    """
+    Ports reachable from an origin within a distance or a duration.
+
+    A single search, truncated at the bound, is run on the Marnet from the origin,
+    each port being reached at its closest node of the Marnet.
+
+    Parameters
+    ----------
+    origin : (lon, lat) of the origin
+    max_length : float, maximum length in `units`
+    max_duration : float, maximum duration in hours at `speed_knot`
+        One of max_length or max_duration is required, both can be combined
+    units : the unit of the lengths, default is `naut`
+    speed_knot : speed of the boat, default 24 knots
+    restrictions : list of passages to be restricted, default is ['northwest']
+    frontier : boolean, default False
+        Adds a Polygon Feature (convex hull of the reachable part of the network),
+        with property `frontier` set to True, at the end of the collection
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports, can be a filtered `P.query(...)`
+    overlay : CostOverlay, default None
+        Costs of edges replacing their weight, the bound then applies to the costs
+    zones : exclusion zones to avoid, default None
+        An AreaFeature, a list of AreaFeature or a FeatureCollection of them
+
+    Returns
+    -------
+    A FeatureCollection of Point Features of the reachable ports, sorted by length,
+    with the port attributes as properties, plus `length`, `units` and `duration_hours`
+
+    Examples
+    --------
+    >>> # ports within 10 days at 14 knots
+    >>> reachable_ports(origin, max_duration=240, speed_knot=14)
+    """
+    if M is None:
+        M = setup_M()
+    if P is None:
+        P = setup_P()
+    validate_lon_lat(origin)
 
-app.mainloop()
\ No newline at end of file
+    if max_length is None and max_duration is None:
+        raise ValueError('max_length or max_duration must be set')
+
+    cutoff = float('inf')
+    if max_length is not None:
+        cutoff = max_length
+    if max_duration is not None and speed_knot > 0:
+        cutoff = min(cutoff, max_duration * speed_knot * speed_coef(units))
+    # the weights of the Marnet are in km
+    to_units = conversions[units] / conversions['km']
+    cutoff_km = cutoff / to_units
+
+    sg = M.search_graph
+    source, = M.snap([origin])
+    weights = overlay.weights(sg) if overlay is not None else None
+    dist, _, _ = sg.dijkstra({source: 0}, closed=M.closed_edges(restrictions, zones), cutoff=cutoff_km, weights=weights)
+
+    features = []
+    port_list, port_indexes = M.port_nodes(P)
+    for port, i in zip(port_list, port_indexes):
+        if dist[i] <= cutoff_km:
+            length = dist[i] * to_units
+            properties = dict(P.nodes[port])
+            properties.update({'length': length, 'units': units, 'duration_hours': get_duration(speed_knot, length, units)})
+            features.append(Feature(geometry=Point(port), properties=properties))
+    features.sort(key=lambda feature: feature.properties['length'])
+
+    if frontier:
+        # longitudes around the origin, not to wrap the polygon around the world
+        reached = [normalize_linestring(origin, node) for node, d in zip(sg.nodes, dist) if d <= cutoff_km]
+        features.append(Feature(geometry=Polygon([convex_hull(reached)]), properties={
+            'frontier': True, 'length': cutoff, 'units': units}))
+
+    return FeatureCollection(features)
+
+def optimize_rotation(origin, destination, calls, units='naut', speed_knot=24, restrictions=[passages.Passage.northwest], exact_max:int = 12, M:marnet.Marnet=None, P:ports.Ports=None, overlay:CostOverlay = None, zones=None, **params):
+    """
+    Sea route calling at a set of locations in the cheapest order, from an origin to a destination.
+
+    The sea distances between all locations are computed with one search per location,
+    then the order is solved exactly (dynamic programming) up to `exact_max` calls,
+    or with 2-opt and Or-opt improvements of the nearest neighbour order for more calls.
+
+    Parameters
+    ----------
+    origin : (lon, lat) of the origin, the first call of the rotation
+    destination : (lon, lat) of the destination, the last call, can be the origin for a loop
+    calls : list of (lon, lat) of the calls in between, in any order
+    units : the unit of the lengths, default is `naut`
+    speed_knot : speed of the boat, default 24 knots
+    restrictions : list of passages to be restricted, default is ['northwest']
+    exact_max : int, default 12, maximum number of calls solved exactly
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports
+    overlay : CostOverlay, default None
+        Costs of edges replacing their weight, the order minimizes the costs
+    zones : exclusion zones to avoid, default None
+    params : other parameters of `searoute`, as `return_passages` or `output`
+
+    Returns
+    -------
+    The result of `searoute` with the calls as waypoints in the best order,
+    its properties include `order`, the indexes in `calls` in order of visit
+
+    Examples
+    --------
+    >>> optimize_rotation(rotterdam, rotterdam, [hamburg, le_havre, shanghai, singapore, ...], speed_knot=14)
+    """
+    if M is None:
+        M = setup_M()
+    validate_lon_lat(origin)
+    validate_lon_lat(destination)
+    for call in calls:
+        validate_lon_lat(call)
+
+    points = [tuple(origin), *(tuple(call) for call in calls), tuple(destination)]
+    sg = M.search_graph
+    nodes = M.snap(points)
+    closed = M.closed_edges(restrictions, zones)
+    weights = overlay.weights(sg) if overlay is not None else None
+
+    # symmetric costs, each search only goes as far as the following points
+    n = len(points)
+    matrix = np.zeros((n, n))
+    for i in range(n - 1):
+        targets = nodes[i + 1:]
+        dist = sg.dijkstra({nodes[i]: 0}, set(targets), closed, weights=weights)[0]
+        row = [dist[v] for v in targets]
+        if closed is not None and float('inf') in row:
+            # only reachable through restricted passages, as for the legs of `searoute`
+            dist = sg.dijkstra({nodes[i]: 0}, set(targets), M.closed_edges([], zones), weights=weights)[0]
+            row = [min(d, dist[v]) for d, v in zip(row, targets)]
+        matrix[i, i + 1:] = row
+        matrix[i + 1:, i] = row
+
+    order, cost = shortest_visit_order(matrix, exact_max)
+    if cost == float('inf'):
+        raise nx.NetworkXNoPath('Some calls can not be reached from the others.')
+
+    result = searoute(origin, destination, waypoints=[calls[k - 1] for k in order], units=units, speed_knot=speed_knot,
+                      restrictions=restrictions, M=M, P=P, overlay=overlay, zones=zones, **params)
+    properties = result[1] if isinstance(result, tuple) else result.properties
+    properties['order'] = [k - 1 for k in order]
+    return result
+
+def hub_routes(origin, destination, hubs, k=3, max_hubs:int = 2, handling_hours=24, units='naut', speed_knot=24, restrictions=[passages.Passage.northwest], M:marnet.Marnet=None, P:ports.Ports=None, overlay:CostOverlay = None, zones=None):
+    """
+    Best routes through one or two transshipment hubs, ranked by duration including the handling time at the hubs.
+
+    The shortest paths from each hub to the whole Marnet are computed once and cached,
+    the itineraries origin -> hub(s) -> destination are then combined with a few vector
+    operations, so that a new origin-destination pair costs no search.
+
+    Parameters
+    ----------
+    origin : (lon, lat) of the origin
+    destination : (lon, lat) of the destination
+    hubs : the candidate hubs, a Ports network (e.g. `P.query(terminals=True, cty='SG')`)
+        or a list of port codes (e.g. 'SGSIN') or of (lon, lat)
+    k : number of itineraries, default 3
+    max_hubs : 1 or 2, maximum number of hubs of an itinerary, default 2
+    handling_hours : float or dict of hub (port code or (lon, lat)) -> hours, default 24
+        Time spent at each hub, hubs missing from a dict have no handling time
+    units : the unit of the lengths, default is `naut`
+    speed_knot : speed of the boat, default 24 knots
+    restrictions : list of passages to be restricted, default is ['northwest']
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports
+    overlay : CostOverlay, default None
+    zones : exclusion zones to avoid, default None
+
+    Returns
+    -------
+    A list of up to k GeoJson Features of LineString, fastest first, with properties `length`, `units`,
+    `duration_hours` (sailing and handling), `sailing_hours`, `handling_hours`, `hubs` and `rank`
+    """
+    if M is None:
+        M = setup_M()
+    if P is None:
+        P = setup_P()
+    validate_lon_lat(origin)
+    validate_lon_lat(destination)
+    if max_hubs not in (1, 2):
+        raise ValueError('max_hubs must be 1 or 2')
+
+    if isinstance(hubs, ports.Ports):
+        hubs = list(hubs.nodes)
+    codes = {data.get('port'): node for node, data in P.nodes(data=True)}
+    locations = []
+    for hub in hubs:
+        if isinstance(hub, str):
+            if hub not in codes:
+                raise KeyError(f'No port {hub} in the Ports')
+            hub = codes[hub]
+        validate_lon_lat(hub)
+        locations.append(tuple(hub))
+    if not locations:
+        return []
+
+    def hub_name(location):
+        data = P.nodes[location] if location in P else {}
+        return data.get('port') or location
+
+    def handling(location):
+        if not isinstance(handling_hours, dict):
+            return handling_hours
+        return handling_hours.get(hub_name(location), handling_hours.get(location, 0))
+
+    sg = M.search_graph
+    source, target, *hub_nodes = M.snap([origin, destination, *locations])
+    trees = [M.search_tree(node, restrictions, zones, overlay) for node in hub_nodes]
+
+    # durations in hours: sailing from/to the hubs and between hubs, plus handling
+    hours_per_km = 1 / (speed_knot * speed_coef('km')) if speed_knot > 0 else 0
+    to_hub = np.array([tree[0][source] for tree in trees]) * hours_per_km
+    from_hub = np.array([tree[0][target] for tree in trees]) * hours_per_km
+    between = np.array([tree[0][hub_nodes] for tree in trees]) * hours_per_km
+    stay = np.array([handling(location) for location in locations], dtype=float)
+
+    candidates = [(float(to_hub[i] + stay[i] + from_hub[i]), (i,)) for i in range(len(locations))]
+    if max_hubs == 2:
+        two = to_hub[:, None] + stay[:, None] + between + stay[None, :] + from_hub[None, :]
+        np.fill_diagonal(two, np.inf)
+        flat = two.ravel()
+        best = np.argpartition(flat, k)[:k] if flat.size > k else range(flat.size)
+        candidates += [(float(flat[b]), divmod(int(b), len(locations))) for b in best]
+    candidates = sorted(c for c in candidates if c[0] < float('inf'))[:k]
+
+    def tree_path(i, node):
+        """Nodes from hub i to a node"""
+        _, pred_node, _ = trees[i]
+        path = [node]
+        while pred_node[path[-1]] >= 0:
+            path.append(pred_node[path[-1]])
+        return path[::-1]
+
+    features = []
+    for rank, (_, itinerary) in enumerate(candidates):
+        legs = [tree_path(itinerary[0], source)[::-1]]
+        if len(itinerary) == 2:
+            legs.append(tree_path(itinerary[0], hub_nodes[itinerary[1]]))
+        legs.append(tree_path(itinerary[-1], target))
+
+        coordinates, length = [], 0
+        for leg in legs:
+            ls, _ = process_route([sg.nodes[i] for i in leg], M)
+            length += distance_length(ls, units=units)
+            coordinates.extend(ls)
+        sailing = get_duration(speed_knot, length, units)
+        stays = float(sum(stay[i] for i in itinerary))
+        features.append(Feature(geometry=LineString(coordinates), properties={
+            'length': length, 'units': units, 'duration_hours': sailing + stays, 'sailing_hours': sailing,
+            'handling_hours': stays, 'hubs': [hub_name(locations[i]) for i in itinerary], 'rank': rank}))
+
+    return features
+
+def fleet_costs(lanes, profiles, speeds=None, units='naut'):
+    """
+    Voyage duration, fuel and cost of lanes for vessel profiles and speeds, computed at once
+    as numpy arrays of shape (lanes, profiles, speeds), without routing again.
+
+    The consumption of MFO (main engine) at a speed scales with the cube of the speed
+    (`exponent`) from its value at the speed of the profile, MGO is consumed per day.
+
+    Parameters
+    ----------
+    lanes : the lanes, either
+        a list or a dict of results of `searoute` (Feature, Route, or tuple of (geometry, properties)),
+        their `traversed_passages` are charged with the `passage_costs` of the profiles;
+        or an array of lengths in `units` of any shape, e.g. a distance matrix
+    profiles : list of dict, one per vessel:
+        `speed_knot` speed of the consumptions, required (ValueError when missing)
+        `name` of the profile in errors, default its index
+        `mfo_consumption` and `mgo_consumption` in tons per day, default 0
+        `bunker_price` price per ton of both fuels, or `mfo_price` and `mgo_price`, default 0
+        `exponent` of the speed of the MFO consumption, default 3
+        `daily_cost` cost per day of the vessel (hire), default 0
+        `passage_costs` dict of passage -> cost of a transit (e.g. canal dues), default {}
+    speeds : array-like of speeds in knots, default None
+        Speeds evaluated for every profile, None evaluates each profile at its own speed
+    units : the unit of lengths given as an array, default is `naut`
+
+    Returns
+    -------
+    A dict of numpy arrays of shape lanes + (profiles, speeds): `duration_hours`, `mfo`, `mgo` (tons),
+    `fuel_cost`, `passage_cost`, `time_cost` and `cost` (total), and `speeds` of shape (profiles, speeds)
+
+    Examples
+    --------
+    >>> lanes = {key: searoute(o, d, return_passages=True) for key, (o, d) in od_pairs.items()}
+    >>> grid = fleet_costs(lanes, profiles, speeds=np.arange(10, 22))
+    >>> best_speed = grid['speeds'][np.arange(len(profiles)), grid['cost'].argmin(axis=-1)]
+    """
+    passage_names = []
+    lane_passages = None
+    if isinstance(lanes, dict):
+        lanes = list(lanes.values())
+    results = isinstance(lanes, list) and len(lanes) > 0 and (
+        hasattr(lanes[0], 'properties') or isinstance(lanes[0], tuple) and isinstance(lanes[0][-1], dict))
+    if results:
+        properties = [lane[1] if isinstance(lane, tuple) else lane.properties for lane in lanes]
+        length = np.array([p['length'] / speed_coef(p.get('units', 'naut')) for p in properties])
+        passage_names = sorted({name for p in properties for name in p.get('traversed_passages') or ()})
+        lane_passages = np.array([[name in (p.get('traversed_passages') or ()) for name in passage_names] for p in properties],
+                                 dtype=float).reshape(len(properties), len(passage_names))
+    else:
+        length = np.asarray(lanes, dtype=float) / speed_coef(units)
+
+    def column(key, default=0.0):
+        return np.array([profile.get(key, default) for profile in profiles], dtype=float)
+
+    for i, profile in enumerate(profiles):
+        if not profile.get('speed_knot', 0) > 0:
+            raise ValueError(f"Profile {profile.get('name', i)} must have a positive speed_knot")
+    speed = column('speed_knot')
+    price = column('bunker_price')
+    mfo_price = np.array([profile.get('mfo_price', b) for profile, b in zip(profiles, price)], dtype=float)
+    mgo_price = np.array([profile.get('mgo_price', b) for profile, b in zip(profiles, price)], dtype=float)
+
+    # (profiles, speeds)
+    grid = speed[:, None] if speeds is None else np.broadcast_to(np.asarray(speeds, dtype=float), (len(profiles), np.size(speeds)))
+    scale = (grid / speed[:, None]) ** column('exponent', 3)[:, None]
+
+    # lanes + (profiles, speeds)
+    length = length[..., None, None]
+    with np.errstate(divide='ignore'):
+        hours = np.where(grid > 0, length / grid, np.inf)
+    days = hours / 24
+    mfo = column('mfo_consumption')[:, None] * scale * days
+    mgo = column('mgo_consumption')[:, None] * days
+    fuel_cost = mfo * mfo_price[:, None] + mgo * mgo_price[:, None]
+    time_cost = column('daily_cost')[:, None] * days
+
+    passage_cost = np.zeros_like(hours)
+    if passage_names:
+        fees = np.array([[profile.get('passage_costs', {}).get(name, 0) for name in passage_names] for profile in profiles], dtype=float)
+        passage_cost = passage_cost + (lane_passages @ fees.T)[..., None]
+
+    return {
+        'duration_hours': hours,
+        'mfo': mfo,
+        'mgo': mgo,
+        'fuel_cost': fuel_cost,
+        'passage_cost': passage_cost,
+        'time_cost': time_cost,
+        'cost': fuel_cost + passage_cost + time_cost,
+        'speeds': np.array(grid),
+    }
+
+
+if __name__ == '__main__':
+    from searoute.calculator import main
+    main()
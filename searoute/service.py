@@ -0,0 +1,410 @@
+"""
+Local HTTP routing service, keeping the networks loaded between requests.
+
+Endpoints
+---------
+POST /route   a route request, returns a GeoJson Feature
+POST /batch   {"routes": [route request, ...]}, returns {"routes": [Feature or {"error": ...}, ...]}
+GET /healthz  the process is up
+GET /readyz   the networks are loaded, 503 until then
+GET /metrics  Prometheus text format
+
+A route request is a JSON object with `origin` and `destination` (lon, lat) and optionally
+`waypoints`, `units`, `speed_knot`, `restrictions`, `return_passages`, `simplify`, `precision`,
+`heuristic` and `unreachable`, see `searoute`.
+
+Concurrent requests from the same origin node with the same restrictions are grouped during
+a short window and answered from a single search. Only the standard library is used, the
+service runs offline.
+
+Run with `python -m searoute.service --port 8080`.
+"""
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import networkx as nx
+
+from searoute.classes.passages import Passage
+from searoute.main import _build_route, searoute, setup_M, setup_P
+from searoute.utils import conversions, validate_lon_lat
+
+PARAMETERS = ('origin', 'destination', 'waypoints', 'units', 'speed_knot', 'restrictions', 'return_passages',
+              'simplify', 'precision', 'heuristic', 'unreachable')
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PATHS = ('/route', '/batch', '/healthz', '/readyz', '/metrics')
+MAX_BODY = 16 * 1024 * 1024
+
+
+class ServiceUnavailable(RuntimeError):
+    """The networks are not loaded in time or failed to load, answered with 503"""
+
+
+class Metrics:
+    """Counters and request duration histogram, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.buckets = [0] * len(BUCKETS)
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.searches = 0
+        self.batched = 0
+        self.graph_loaded = 0
+        self.graph_load_seconds = 0.0
+
+    def observe(self, path, status, seconds):
+        with self._lock:
+            self.requests[(path, status)] += 1
+            self.duration_sum += seconds
+            self.duration_count += 1
+            for i, le in enumerate(BUCKETS):
+                if seconds <= le:
+                    self.buckets[i] += 1
+
+    def count(self, searches=0, batched=0):
+        with self._lock:
+            self.searches += searches
+            self.batched += batched
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP searoute_requests_total HTTP requests by path and status.',
+                     '# TYPE searoute_requests_total counter']
+            for (path, status), n in sorted(self.requests.items()):
+                lines.append(f'searoute_requests_total{{path="{path}",status="{status}"}} {n}')
+            lines += ['# HELP searoute_request_duration_seconds Duration of the HTTP requests.',
+                      '# TYPE searoute_request_duration_seconds histogram']
+            for le, n in zip(BUCKETS, self.buckets):
+                lines.append(f'searoute_request_duration_seconds_bucket{{le="{le}"}} {n}')
+            lines += [f'searoute_request_duration_seconds_bucket{{le="+Inf"}} {self.duration_count}',
+                      f'searoute_request_duration_seconds_sum {self.duration_sum}',
+                      f'searoute_request_duration_seconds_count {self.duration_count}',
+                      '# HELP searoute_searches_total Shortest path searches run.',
+                      '# TYPE searoute_searches_total counter',
+                      f'searoute_searches_total {self.searches}',
+                      '# HELP searoute_batched_requests_total Routes answered from a search shared with other routes.',
+                      '# TYPE searoute_batched_requests_total counter',
+                      f'searoute_batched_requests_total {self.batched}',
+                      '# HELP searoute_graph_loaded Whether the networks are loaded.',
+                      '# TYPE searoute_graph_loaded gauge',
+                      f'searoute_graph_loaded {self.graph_loaded}',
+                      '# HELP searoute_graph_load_seconds Time spent loading the networks.',
+                      '# TYPE searoute_graph_load_seconds gauge',
+                      f'searoute_graph_load_seconds {self.graph_load_seconds}']
+        return '\n'.join(lines) + '\n'
+
+
+class _Pending:
+    __slots__ = ('params', 'done', 'result', 'error')
+
+    def __init__(self, params):
+        self.params = params
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RouteService:
+    """
+    Routing with warm networks and micro-batching of the requests sharing an origin.
+
+    Parameters
+    ----------
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports
+    batch_window : float, default 0.005
+        Seconds a request waits for others from the same origin, 0 disables micro-batching
+    ready_timeout : float, default 60, seconds a request waits for the networks to be loaded
+
+    Examples
+    --------
+    >>> service = RouteService().start()
+    >>> service.route({'origin': [0.3515625, 50.064191736659104], 'destination': [117.42187500000001, 39.36827914916014]})
+    """
+
+    def __init__(self, M=None, P=None, batch_window=0.005, ready_timeout=60.0):
+        self.M = M
+        self.P = P
+        self.batch_window = batch_window
+        self.ready_timeout = ready_timeout
+        self.metrics = Metrics()
+        self.loaded = threading.Event()
+        self.failed = threading.Event()
+        self.load_error = None
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def start(self):
+        """Load the networks in a background thread, returns the service"""
+        threading.Thread(target=self._load, name='searoute-load', daemon=True).start()
+        return self
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            if self.M is None:
+                self.M = setup_M()
+            if self.P is None:
+                self.P = setup_P()
+            # builds the search graph, the components of the default restrictions and reads the landmarks
+            # before the first request, the other caches of the Marnet are filled under its lock
+            sg = self.M.search_graph
+            sg.components(sg.passage_mask([Passage.northwest]))
+            self.M.landmarks()
+        except Exception as e:
+            self.load_error = e
+            self.failed.set()
+            raise
+        self.metrics.graph_load_seconds = time.perf_counter() - start
+        self.metrics.graph_loaded = 1
+        self.loaded.set()
+
+    def wait_ready(self, timeout=None):
+        """Waits for the networks to be loaded, ServiceUnavailable when they are not in time or failed to load"""
+        if not self.failed.is_set() and not self.loaded.wait(self.ready_timeout if timeout is None else timeout):
+            raise ServiceUnavailable('The networks are not loaded')
+        if self.load_error is not None:
+            raise ServiceUnavailable(f'The networks failed to load: {self.load_error}')
+
+    @staticmethod
+    def parse(params):
+        """Validated parameters of a route request"""
+        if not isinstance(params, dict):
+            raise ValueError('A route request must be a JSON object')
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        for key in ('origin', 'destination'):
+            if key not in params:
+                raise ValueError(f"Missing parameter '{key}'")
+        params = dict(params)
+        params['origin'] = tuple(params['origin'])
+        params['destination'] = tuple(params['destination'])
+        params['waypoints'] = [tuple(waypoint) for waypoint in params.get('waypoints') or []]
+        restrictions = params.get('restrictions', [Passage.northwest])
+        if not isinstance(restrictions, list) or not all(isinstance(r, str) for r in restrictions):
+            raise ValueError('restrictions must be a list of passage names')
+        params['restrictions'] = tuple(restrictions)
+        if params.get('units', 'naut') not in conversions:
+            raise ValueError(f"Invalid units '{params['units']}', must be one of {', '.join(conversions)}")
+        if params.get('heuristic') not in (None, 'alt'):
+            raise ValueError(f"Invalid heuristic '{params['heuristic']}', must be None or 'alt'")
+        if params.get('unreachable', 'raise') not in ('raise', 'snap'):
+            raise ValueError(f"Invalid unreachable '{params['unreachable']}', must be raise or snap")
+        for point in (params['origin'], params['destination'], *params['waypoints']):
+            validate_lon_lat(point)
+        return params
+
+    def route(self, params):
+        """Route of a request, a GeoJson Feature"""
+        params = self.parse(params)
+        self.wait_ready()
+        if params['waypoints'] or params.get('heuristic') or not self.batch_window:
+            return self._single(params)
+
+        pending = _Pending(params)
+        key = self._group_key(params)
+        with self._lock:
+            group = self._pending.get(key)
+            leader = group is None
+            if leader:
+                group = self._pending[key] = []
+            group.append(pending)
+
+        if leader:
+            time.sleep(self.batch_window)
+            with self._lock:
+                del self._pending[key]
+            self._run(group)
+        else:
+            pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def batch(self, requests):
+        """Routes of a list of requests, a list of GeoJson Feature or {'error': message}"""
+        self.wait_ready()
+        results = [None] * len(requests)
+        groups = defaultdict(list)
+        for i, params in enumerate(requests):
+            try:
+                params = self.parse(params)
+            except (ValueError, TypeError) as e:
+                results[i] = {'error': str(e)}
+                continue
+            pending = _Pending(params)
+            if params['waypoints'] or params.get('heuristic'):
+                self._run([pending])
+            else:
+                groups[self._group_key(params)].append(pending)
+            results[i] = pending
+        for group in groups.values():
+            self._run(group)
+        return [r if not isinstance(r, _Pending) else {'error': str(r.error)} if r.error is not None else r.result
+                for r in results]
+
+    def _group_key(self, params):
+        return self.M.snap([params['origin']])[0], params['restrictions'], params.get('unreachable', 'raise')
+
+    def _single(self, params):
+        self.metrics.count(searches=len(params['waypoints']) + 1)
+        options = {k: v for k, v in params.items() if k not in ('origin', 'destination', 'waypoints', 'restrictions')}
+        return searoute(params['origin'], params['destination'], waypoints=params['waypoints'],
+                        restrictions=list(params['restrictions']), M=self.M, P=self.P, **options)
+
+    def _run(self, group):
+        """Answers a group of requests sharing an origin node with a single search"""
+        try:
+            self._search_group(group)
+        except Exception as e:
+            for pending in group:
+                if not pending.done.is_set():
+                    pending.error = e
+        finally:
+            # the requests waiting for the group must never hang
+            for pending in group:
+                pending.done.set()
+
+    def _search_group(self, group):
+        if len(group) == 1:
+            for pending in group:
+                self._answer(pending, self._single, pending.params)
+            return
+
+        first = group[0].params
+        try:
+            legs = self.M.shortest_paths_from(first['origin'], [p.params['destination'] for p in group],
+                                              restrictions=first['restrictions'],
+                                              unreachable=first.get('unreachable', 'raise'))
+        except nx.NetworkXNoPath:
+            # a destination can not be reached, the others must still be answered
+            for pending in group:
+                self._answer(pending, self._single, pending.params)
+            return
+
+        self.metrics.count(searches=1, batched=len(group))
+        for pending, leg in zip(group, legs):
+            params = pending.params
+            self._answer(pending, _build_route, self.M, [leg], params.get('units', 'naut'), params.get('speed_knot', 24),
+                         params.get('return_passages', False), params.get('simplify'), 'geojson', params.get('precision'))
+
+    @staticmethod
+    def _answer(pending, function, *args):
+        try:
+            pending.result = function(*args)
+        except Exception as e:
+            pending.error = e
+        pending.done.set()
+
+
+class RouteHandler(BaseHTTPRequestHandler):
+    """HTTP requests of a `RouteService`, set as the `service` attribute of the server"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/healthz':
+            self._reply(200, {'status': 'ok'})
+        elif self.path == '/readyz':
+            if service.loaded.is_set():
+                self._reply(200, {'status': 'ready'})
+            else:
+                self._reply(503, {'status': 'loading' if service.load_error is None else 'failed'})
+        elif self.path == '/metrics':
+            self._reply(200, service.metrics.render(), 'text/plain; version=0.0.4')
+        else:
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path not in ('/route', '/batch'):
+            self._reply(404, {'error': f'Unknown path {self.path}'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            self._reply(413, {'error': 'Request body too large'})
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b'null')
+            if self.path == '/route':
+                result = service.route(body)
+            else:
+                if not isinstance(body, dict) or not isinstance(body.get('routes'), list):
+                    raise ValueError("A batch request must be a JSON object with a list of 'routes'")
+                result = {'routes': service.batch(body['routes'])}
+        except (ValueError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+        except nx.NetworkXNoPath as e:
+            self._reply(422, {'error': str(e)})
+        except ServiceUnavailable as e:
+            self._reply(503, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': str(e) or type(e).__name__})
+        else:
+            self._reply(200, result)
+
+    def _reply(self, status, body, content_type='application/json'):
+        data = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        path = self.path if self.path in PATHS else 'other'
+        self.server.service.metrics.observe(path, status, time.perf_counter() - self._start)
+
+    def handle_one_request(self):
+        self._start = time.perf_counter()
+        super().handle_one_request()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host='127.0.0.1', port=8080, batch_window=0.005, verbose=False, M=None, P=None):
+    """
+    Runs the routing service until interrupted, the networks are loaded while it starts listening
+
+    Parameters
+    ----------
+    host : str, default '127.0.0.1'
+    port : int, default 8080
+    batch_window : float, default 0.005, see `RouteService`
+    verbose : boolean, default False, logs every request
+    M : Marnet, default None uses the default network
+    P : Ports, default None uses the default ports
+    """
+    server = ThreadingHTTPServer((host, port), RouteHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.service = RouteService(M, P, batch_window).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local HTTP routing service.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--batch-window', type=float, default=0.005,
+                        help='seconds a request waits for others from the same origin, 0 disables micro-batching')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.batch_window, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
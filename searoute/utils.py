@@ -1,6 +1,12 @@
 from math import atan2, cos,  pow, radians, sin, sqrt, tan
-import geojson
+import gzip
 import inspect
+import json
+import os
+import re
+import struct
+
+import numpy as np
 
 
 def get_unique_number(lon, lat):
@@ -107,6 +113,74 @@ def distance(coordinates1, coordinates2, units: str = "km"):
     return b * avg_earth_radius_km * conversions[units]
 
 
+def distances(coordinates1, coordinates2, units: str = "km"):
+    """
+    Vectorized distance calculation, element-wise between two sets of locations
+
+    Parameters
+    ----------
+    coordinates1 : array-like of shape (n, 2) of (lon, lat), from locations
+    coordinates2 : array-like of shape (n, 2) of (lon, lat), to locations
+    units : a unit, default is `km`
+
+    Returns
+    -------
+    A numpy array of n distances in `units`
+
+    """
+    c1 = np.asarray(coordinates1, dtype=float)
+    c2 = np.asarray(coordinates2, dtype=float)
+
+    lat1 = np.radians(c1[..., 1])
+    lat2 = np.radians(c2[..., 1])
+    dlat = lat2 - lat1
+    dlon = np.radians(c2[..., 0] - c1[..., 0])
+
+    a = np.sin(dlat / 2) ** 2 + np.sin(dlon / 2) ** 2 * np.cos(lat1) * np.cos(lat2)
+    a = np.clip(a, 0, 1)
+    b = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return b * avg_earth_radius_km * conversions[units]
+
+
+def cumulative_distances(line, units: str = "km"):
+    """
+    Cumulative distance along a line of coordinates
+
+    Parameters
+    ---------
+    line : array-like of shape (n, 2), [(lon, lat), (lon, lat), ...]
+    units: the unit, default is `km`
+
+    Returns
+    -------
+    A numpy array of n distances in `units`, from the first point to each point of the line
+    """
+    coords = np.asarray(line, dtype=float).reshape(-1, 2)
+    cumulative = np.zeros(len(coords))
+    if len(coords) > 1:
+        np.cumsum(distances(coords[:-1], coords[1:], units), out=cumulative[1:])
+    return cumulative
+
+
+def distance_matrix(coordinates1, coordinates2, units: str = "km"):
+    """
+    Distances between every pair of locations of two sets (many-to-many)
+
+    Parameters
+    ----------
+    coordinates1 : array-like of shape (n, 2) of (lon, lat)
+    coordinates2 : array-like of shape (m, 2) of (lon, lat)
+    units : a unit, default is `km`
+
+    Returns
+    -------
+    A numpy array of shape (n, m) of distances in `units`
+    """
+    c1 = np.asarray(coordinates1, dtype=float).reshape(-1, 2)
+    c2 = np.asarray(coordinates2, dtype=float).reshape(-1, 2)
+    return distances(c1[:, None, :], c2[None, :, :], units)
+
+
 def distance_length(line: list, units: str = "km"):
     """
     Length of a line of coordinates 
@@ -120,17 +194,11 @@ def distance_length(line: list, units: str = "km"):
     -------
     Distance in `units`
     """
-    if line is None:
+    if line is None or len(line) < 2:
         return 0
 
-    length = 0
-    coords = line
-    le = len(coords)-1
-    for i, point in enumerate(coords):
-        if i != le:
-            length += distance(point, coords[i+1], units)
-
-    return length
+    coords = np.asarray(line, dtype=float)
+    return float(distances(coords[:-1], coords[1:], units).sum())
 
 
 def get_duration(speed_knot, length, units):
@@ -210,17 +278,21 @@ def nearest_node(G, *args, filter=None, fargs=()):
     if f_params == 2:
         ignoreEdgeCheck = True
 
-    for node, data in G.nodes(data=True):
-        x = data.get('x', None)
-        y = data.get('y', None)
+    nodes = list(G.nodes(data=True))
+    args = [tuple(arg) for arg in args]
+    if not nodes or not args:
+        return None
+
+    # all distances at once, node by arg
+    matrix = distance_matrix([(data.get('x', None), data.get('y', None)) for _, data in nodes], args).tolist()
 
+    for (node, data), row in zip(nodes, matrix):
         filtered = False
         if ignoreEdgeCheck:
             filtered = filter(node, fargs)
 
         for ix, arg in enumerate(args):
-            arg = tuple(arg)
-            aDist = distance((x, y), arg)
+            aDist = row[ix]
             if node not in dists:
                 dists[node] = {}
 
@@ -316,48 +388,255 @@ def from_nodes_edges_list(G, node_list, edge_list):
     #else:
     #    raise Exception(f"{type(G)} not supported")
 
+class _JSONStream:
+    """
+    Minimal incremental reader of a JSON text, decoding one value at a time
+    from a file object read by chunks.
+    """
+    _WS = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, fp, chunk_size=1 << 16):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=None):
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            self.pos = self._WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f'Invalid GeoJSON: expected {char!r} at position {self.pos}')
+        self.pos += 1
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number may be cut at the end of the buffer
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # grow geometrically, so that a large value is not decoded again for every chunk
+            self._fill(max(self.chunk_size, len(self.buf) - self.pos))
+
+
+def iter_geojson_features(fp, members=None, chunk_size=1 << 16):
+    """
+    Iterate over the features of a GeoJSON document without loading it as a whole.
+    Features of a FeatureCollection are decoded one by one while the file is read.
+
+    Parameters
+    ----------
+    fp : a file object opened in text mode
+    members : dict, optional
+        Filled with the top-level members other than `features` (e.g. `type`, `crs`)
+    chunk_size : int, size of the chunks read from `fp`
+
+    Returns
+    -------
+    A generator of features as dict, a single Feature or geometry document yields itself
+    """
+    if members is None:
+        members = {}
+
+    stream = _JSONStream(fp, chunk_size)
+    stream.expect('{')
+
+    has_features = False
+    while stream.peek() != '}':
+        key = stream.decode()
+        stream.expect(':')
+
+        if key == 'features' and stream.peek() == '[':
+            has_features = True
+            stream.expect('[')
+            while stream.peek() != ']':
+                yield stream.decode()
+                if stream.peek() == ',':
+                    stream.expect(',')
+            stream.expect(']')
+        else:
+            members[key] = stream.decode()
+
+        if stream.peek() == ',':
+            stream.expect(',')
+    stream.expect('}')
+
+    if not has_features:
+        if members.get('type') == 'Feature':
+            yield members
+        elif 'type' in members:
+            yield {'type': 'Feature', 'geometry': members, 'properties': {}}
+
+
 def load_from_geojson(G, *geojson_file):
+    """
+    Load features of GeoJSON files into a graph (Ports or Marnet).
+
+    Files are streamed feature by feature, coordinates are interned so that each
+    location is a single node, and the graph receives nodes and edges in bulk,
+    which computes the missing weights and builds the spatial index only once.
+
+    Parameters
+    ----------
+    G : a Ports or Marnet network (instance)
+    geojson_file : path(s) of GeoJSON files
+        LineString/MultiLineString are loaded as edges and Point/MultiPoint as nodes,
+        with the properties of the feature as attributes
+
+    Returns
+    -------
+    G
+    """
+    node_ids = {}
+    node_list = []
+    edges = {}
+
+    def intern(coords):
+        # same precision as geojson objects, 6 decimals
+        coords = tuple(round(c, 6) for c in coords)
+        return node_ids.setdefault(coords, coords)
+
+    def add_line(line, properties):
+        previous = None
+        for point in line:
+            now = intern(point)
+            if previous is not None:
+                # (u, v) and (v, u) are the same edge of the undirected graph
+                key = (previous, now) if (now, previous) not in edges else (now, previous)
+                edges.setdefault(key, {}).update(properties)
+            previous = now
+
+    def handle_geometry(geometry, properties):
+        if not geometry:
+            return
+        properties = properties or {}
+        gtype = geometry.get('type')
+        if gtype == 'LineString':
+            add_line(geometry['coordinates'], properties)
+        elif gtype == 'MultiLineString':
+            for line_string in geometry['coordinates']:
+                add_line(line_string, properties)
+        elif gtype == 'Point':
+            node_list.append((intern(geometry['coordinates']), dict(properties)))
+        elif gtype == 'MultiPoint':
+            for point_coords in geometry['coordinates']:
+                node_list.append((intern(point_coords), dict(properties)))
+        else:
+            # Handle other geometries if needed (e.g., MultiPolygon, Polygon, etc.)
+            pass
+
     for gf in geojson_file:
+        members = {}
         with open(gf, 'r') as f:
-            data = geojson.load(f)
-
-        def handle_geometry(geometry, properties):
-            if geometry.type == 'LineString':
-                coords = geometry.coordinates
-                for u, v in zip(coords[:-1], coords[1:]):
-                    G.add_edge(tuple(u), tuple(v), **properties)
-                    # the other side as well
-                    G.add_edge(tuple(v), tuple(u), **properties)
-            elif geometry.type == 'MultiLineString':
-                for line_string in geometry.coordinates:
-                    for u, v in zip(line_string[:-1], line_string[1:]):
-                        G.add_edge(tuple(u), tuple(v), **properties)
-                        # the other side as well
-                        G.add_edge(tuple(v), tuple(u), **properties)
-            elif geometry.type == 'Point':
-                coords = tuple(geometry.coordinates)
-                G.add_node(coords, **properties)
-            elif geometry.type == 'MultiPoint':
-                for point_coords in geometry.coordinates:
-                    coords = tuple(point_coords)
-                    G.add_node(coords, **properties)
-            else:
-                # Handle other geometries if needed (e.g., MultiPolygon, Polygon, etc.)
-                pass
+            for feature in iter_geojson_features(f, members):
+                handle_geometry(feature.get('geometry'), feature.get('properties'))
 
         # Extract CRS information from FeatureCollection
-        if data.type == 'FeatureCollection':
-            G.graph['crs'] = data.get('crs', {}).get(
+        if members.get('type') == 'FeatureCollection':
+            G.graph['crs'] = (members.get('crs') or {}).get(
                 'properties', {}).get('name', None) or G.graph['crs']
 
-            for feature in data.features:
-                handle_geometry(feature.geometry, feature.properties)
-        else:
-            handle_geometry(data.geometry, data.properties)
+    G.add_nodes_from_list(node_list)
+    G.add_edges_from_list([(u, v, args) for (u, v), args in edges.items()])
 
     return G
 
 
+def _feature_parts(result):
+    """(geometry type, coordinates, properties) of a route result"""
+    if isinstance(result, tuple):
+        coordinates, properties = result
+        if isinstance(coordinates, (str, bytes)):
+            raise TypeError('Encoded routes (polyline, wkb) can not be written as GeoJSON, use output `array` or `route`')
+        return 'LineString', coordinates, properties
+    if hasattr(result, 'coordinates') and hasattr(result, 'properties'):
+        # a Route
+        return 'LineString', result.coordinates, result.properties
+
+    geometry = result.get('geometry') or {}
+    return geometry.get('type', 'LineString'), geometry.get('coordinates', []), result.get('properties') or {}
+
+
+def write_routes(routes, file, format: str = 'ndjson', precision: int = 6, compress: bool = None):
+    """
+    Write route results to a file as they come, keeping memory constant whatever
+    the number of routes.
+
+    Parameters
+    ----------
+    routes : an iterable of route results, as returned by `searoute` with output
+        `geojson`, `route` or `array`; a generator is consumed lazily
+    file : a path or a text file object
+    format : str, default `ndjson`
+        `ndjson` writes one Feature per line (newline delimited JSON),
+        `geojson` writes a FeatureCollection, emitted feature by feature
+    precision : int, default 6
+        Number of decimals of the coordinates, None keeps them as they are
+    compress : boolean, default None
+        gzip the output, by default when `file` is a path ending with `.gz`
+
+    Returns
+    -------
+    The number of routes written
+    """
+    if format not in ('ndjson', 'geojson'):
+        raise ValueError(f"Invalid format '{format}', must be ndjson or geojson")
+
+    close = False
+    if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+        path = os.fspath(file)
+        if compress is None:
+            compress = str(path).endswith('.gz')
+        file = gzip.open(path, 'wt', encoding='utf-8') if compress else open(path, 'w', encoding='utf-8')
+        close = True
+
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    head, separator, tail = ('', '\n', '\n') if format == 'ndjson' else ('{"type":"FeatureCollection","features":[\n', ',\n', '\n]}\n')
+
+    count = 0
+    try:
+        file.write(head)
+        for result in routes:
+            gtype, coordinates, properties = _feature_parts(result)
+            coordinates = np.asarray(coordinates, dtype=float)
+            if precision is not None:
+                coordinates = np.round(coordinates, precision)
+
+            if count:
+                file.write(separator)
+            file.write('{"type":"Feature","geometry":{"type":' + dumps(gtype) + ',"coordinates":'
+                       + dumps(coordinates.tolist()) + '},"properties":' + dumps(properties) + '}')
+            count += 1
+        if count or format == 'geojson':
+            file.write(tail)
+    finally:
+        if close:
+            file.close()
+
+    return count
+
+
 def normalize_linestring(prev, now):
     """
     Normalize the coordinate for the lineString.
@@ -430,6 +709,134 @@ def process_route(shortest_route_by_distance, M, return_passages=False):
 
 
 
+def to_unit_vectors(line):
+    """
+    Convert (lon, lat) coordinates to 3D unit vectors on the sphere.
+    Longitudes out of the -180..180 range (as normalized by `normalize_linestring`) are supported.
+
+    Parameters
+    ----------
+    line : array-like of shape (n, 2) of (lon, lat)
+
+    Returns
+    -------
+    A numpy array of shape (n, 3)
+    """
+    coords = np.radians(np.asarray(line, dtype=float).reshape(-1, 2))
+    lon, lat = coords[:, 0], coords[:, 1]
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+
+def simplify_linestring(line, tolerance: float, units: str = "km"):
+    """
+    Simplify a line of coordinates with the Douglas-Peucker algorithm.
+
+    Distances are measured on the sphere (from a vertex to the great circle arc of the
+    simplified line), so the simplification is not affected by the antimeridian or by
+    longitudes normalized beyond -180..180.
+    Every removed vertex lies within `tolerance` of the simplified line.
+    Each split is evaluated at once on the coordinate array, which makes the
+    simplification O(n log n) for usual routes.
+
+    Parameters
+    ----------
+    line : a list of tuple [(lon, lat), (lon, lat), ...]
+    tolerance : maximum distance of a removed vertex to the simplified line, in `units`
+    units : the unit of `tolerance`, default is `km`
+
+    Returns
+    -------
+    A list of tuple [(lon, lat), ...], the first and last vertices are always kept
+    """
+    n = len(line)
+    if n < 3 or not tolerance or tolerance <= 0:
+        return list(line)
+
+    xyz = to_unit_vectors(line)
+    max_angle = tolerance / (avg_earth_radius_km * conversions[units])
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+
+        a, b, points = xyz[i], xyz[j], xyz[i + 1:j]
+        # angular distance to the closest end
+        angles = np.arccos(np.clip(np.maximum(points @ a, points @ b), -1, 1))
+
+        normal = _cross(a, b)
+        norm = sqrt(normal[0] ** 2 + normal[1] ** 2 + normal[2] ** 2)
+        if norm > 1e-12:
+            normal = np.array(normal) / norm
+            # vertices projecting inside the arc use the cross-track distance
+            inside = (points @ _cross(normal, a) > 0) & (points @ _cross(b, normal) > 0)
+            cross_track = np.arcsin(np.minimum(np.abs(points @ normal), 1))
+            angles = np.where(inside, cross_track, angles)
+
+        k = int(np.argmax(angles))
+        if angles[k] > max_angle:
+            k += i + 1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+
+    return [p for p, kept in zip(line, keep.tolist()) if kept]
+
+
+def encode_polyline(line, precision: int = 5):
+    """
+    Encode a line of coordinates with the Google encoded polyline algorithm.
+    document : https://developers.google.com/maps/documentation/utilities/polylinealgorithm
+
+    Parameters
+    ----------
+    line : array-like of shape (n, 2) of (lon, lat)
+    precision : number of decimals kept, default is 5 (as Google Maps)
+
+    Returns
+    -------
+    str : the encoded polyline, of (lat, lon) pairs as expected by map clients
+    """
+    coords = np.asarray(line, dtype=float).reshape(-1, 2)[:, ::-1]
+    values = np.round(coords * 10 ** precision).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    # zigzag encoding of the signed deltas
+    deltas = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chars = []
+    for value in deltas.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return ''.join(chars)
+
+
+def linestring_to_wkb(line):
+    """
+    Encode a line of coordinates as a WKB (Well-Known Binary) LineString, little endian.
+
+    Parameters
+    ----------
+    line : array-like of shape (n, 2) of (lon, lat)
+
+    Returns
+    -------
+    bytes
+    """
+    coords = np.asarray(line, dtype='<f8').reshape(-1, 2)
+    return struct.pack('<BII', 1, 2, len(coords)) + coords.tobytes()
+
+
 def validate_lon_lat(coord):
     """
     Validate a (lon, lat) coordinate.
@@ -479,6 +886,232 @@ def normalize_longitude(longitude:float):
     return (longitude % 360 + 540) % 360 - 180
 
 
+def points_in_polygon(xs, ys, ring):
+    """
+    Vectorized `pnpoly`, determines which points are inside a polygon.
+
+    Parameters
+    ----------
+    xs, ys : array-like of the coordinates of the points
+    ring : list of (x, y) of the polygon, it's not necessary to repeat the first vertex at the end
+
+    Returns
+    -------
+    A numpy array of bool
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    ring = np.asarray(ring, dtype=float)
+    inside = np.zeros(xs.shape, dtype=bool)
+    vx, vy = ring[:, 0], ring[:, 1]
+    wx, wy = np.roll(vx, 1), np.roll(vy, 1)
+    for xi, yi, xj, yj in zip(vx.tolist(), vy.tolist(), wx.tolist(), wy.tolist()):
+        if yi == yj:
+            continue
+        crossing = ((yi > ys) != (yj > ys)) & (xs < (xj - xi) * (ys - yi) / (yj - yi) + xi)
+        inside ^= crossing
+    return inside
+
+
+def segments_cross_polygon(a, b, ring):
+    """
+    Vectorized test of segments intersecting a polygon (crossing its boundary or inside it).
+
+    Parameters
+    ----------
+    a, b : array-like of shape (n, 2), the ends of n segments
+    ring : list of (x, y) of the polygon
+
+    Returns
+    -------
+    A numpy array of n bool
+    """
+    a = np.asarray(a, dtype=float).reshape(-1, 2)
+    b = np.asarray(b, dtype=float).reshape(-1, 2)
+    ring = np.asarray(ring, dtype=float)
+    p, q = ring, np.roll(ring, -1, axis=0)
+
+    def orient(o, s, t):
+        return (s[..., 0] - o[..., 0]) * (t[..., 1] - o[..., 1]) - (s[..., 1] - o[..., 1]) * (t[..., 0] - o[..., 0])
+
+    A, B = a[:, None, :], b[:, None, :]
+    P, Q = p[None, :, :], q[None, :, :]
+    crossing = (orient(A, B, P) * orient(A, B, Q) <= 0) & (orient(P, Q, A) * orient(P, Q, B) <= 0)
+    # bounding boxes overlap, for collinear segments
+    for axis in (0, 1):
+        crossing &= (np.maximum(A[..., axis], B[..., axis]) >= np.minimum(P[..., axis], Q[..., axis])) \
+            & (np.maximum(P[..., axis], Q[..., axis]) >= np.minimum(A[..., axis], B[..., axis]))
+
+    return crossing.any(axis=1) | points_in_polygon(a[:, 0], a[:, 1], ring)
+
+
+def convex_hull(points):
+    """
+    Convex hull of points, with the monotone chain algorithm.
+
+    Parameters
+    ----------
+    points : list of (x, y)
+
+    Returns
+    -------
+    A closed ring of the hull as a list of (x, y), counter-clockwise
+    """
+    points = sorted(set(map(tuple, points)))
+    if len(points) < 3:
+        return points + points[:1]
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+
+    ring = lower[:-1] + upper[:-1]
+    return ring + ring[:1]
+
+
+def shortest_visit_order(matrix, exact_max: int = 12):
+    """
+    Order of visit of the inner points of a path with a fixed start (first point) and end (last point),
+    minimizing the total cost of the path.
+
+    Solved exactly with the Held-Karp dynamic programming up to `exact_max` inner points,
+    otherwise with the nearest neighbour path improved by 2-opt and Or-opt moves
+    until no move shortens it (costs are then assumed symmetric).
+
+    Parameters
+    ----------
+    matrix : array-like of shape (n, n) of costs between the points
+    exact_max : int, default 12
+
+    Returns
+    -------
+    A tuple of (list of the indexes 1..n-2 of the inner points in order of visit, cost of the path),
+    the cost is inf when no path visits all the points
+    """
+    d = np.asarray(matrix, dtype=float)
+    n = len(d)
+    if n <= 2:
+        order = []
+    elif n - 2 <= exact_max:
+        order = _held_karp(d)
+    else:
+        order = _local_search(d.tolist(), _nearest_neighbour(d))
+    return order, _path_cost(d.tolist(), [0, *order, n - 1])
+
+
+def _path_cost(d, route):
+    return sum(d[a][b] for a, b in zip(route, route[1:]))
+
+
+def _held_karp(d):
+    k = len(d) - 2
+    inner = d[1:-1, 1:-1]
+    bits = 1 << np.arange(k)
+    # cost[mask, j]: cheapest path from the start visiting the points of mask, ending at j
+    cost = np.full((1 << k, k), np.inf)
+    parent = np.full((1 << k, k), -1)
+    cost[bits, np.arange(k)] = d[0, 1:-1]
+
+    for mask in range(1, 1 << k):
+        paths = cost[mask][:, None] + inner
+        best, previous = paths.min(axis=0), paths.argmin(axis=0)
+        free = np.flatnonzero((mask & bits) == 0)
+        extended = mask | bits[free]
+        better = best[free] < cost[extended, free]
+        cost[extended[better], free[better]] = best[free][better]
+        parent[extended[better], free[better]] = previous[free][better]
+
+    mask = (1 << k) - 1
+    ends = cost[mask] + d[1:-1, -1]
+    if np.isinf(ends).all():
+        # a point can not be reached, all are kept in the order so that the path cost is inf
+        return list(range(1, k + 1))
+    j = int(np.argmin(ends))
+    order = []
+    while j >= 0:
+        order.append(j + 1)
+        mask, j = mask ^ (1 << j), int(parent[mask, j])
+    order.reverse()
+    return order
+
+
+def _nearest_neighbour(d):
+    left = set(range(1, len(d) - 1))
+    order, current = [], 0
+    while left:
+        current = min(left, key=lambda j: d[current, j])
+        left.remove(current)
+        order.append(current)
+    return order
+
+
+def _local_search(d, order):
+    route = [0, *order, len(d) - 1]
+    cost = _path_cost(d, route)
+    while True:
+        route = _or_opt(d, _two_opt(d, route))
+        new_cost = _path_cost(d, route)
+        if new_cost >= cost - 1e-9:
+            return route[1:-1]
+        cost = new_cost
+
+
+def _two_opt(d, route):
+    """Reverses parts of the route while it shortens it"""
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(route) - 2):
+            a, b = route[i - 1], route[i]
+            for j in range(i + 1, len(route) - 1):
+                c, e = route[j], route[j + 1]
+                if d[a][c] + d[b][e] < d[a][b] + d[c][e] - 1e-9:
+                    route[i:j + 1] = route[i:j + 1][::-1]
+                    b = route[i]
+                    improved = True
+    return route
+
+
+def _or_opt(d, route):
+    """Moves segments of 1 to 3 points elsewhere in the route, possibly reversed, while it shortens it"""
+    improved = True
+    while improved:
+        improved = False
+        n = len(route)
+        for length in (1, 2, 3):
+            for i in range(1, n - length):
+                j = i + length - 1
+                a, first, last, b = route[i - 1], route[i], route[j], route[j + 1]
+                gain = d[a][first] + d[last][b] - d[a][b]
+                for p in range(n - 1):
+                    if i - 1 <= p <= j:
+                        continue
+                    x, y = route[p], route[p + 1]
+                    forward = d[x][first] + d[last][y] - d[x][y]
+                    backward = d[x][last] + d[first][y] - d[x][y]
+                    if min(forward, backward) < gain - 1e-9:
+                        segment = route[i:j + 1] if forward <= backward else route[i:j + 1][::-1]
+                        rest = route[:i] + route[j + 1:]
+                        at = p + 1 if p < i else p + 1 - length
+                        route = rest[:at] + segment + rest[at:]
+                        improved = True
+                        break
+                if improved:
+                    break
+            if improved:
+                break
+    return route
+
+
 def pnpoly(nvert: int, vertx: list, verty: list, testx :float, testy: float) ->bool:
     """
     Determines if a point is inside a polygon.
@@ -30,10 +30,16 @@ setup(
     classifiers=classifiers,
     keywords='searoute map sea route ocean ports',
     packages=find_packages(),
-    install_requires=['geojson', 'networkx'],
+    install_requires=['geojson', 'networkx', 'numpy'],
     project_urls={
         "Documentation": "https://github.com/genthalili/searoute-py/blob/main/README.md",
         "Source": "https://github.com/genthalili/searoute-py",
     },
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['searoute=searoute.cli:main'],
+    },
+    extras_require={
+        'parquet': ['pyarrow'],
+    },
 )
@@ -0,0 +1,52 @@
+import csv
+import os
+
+import pytest
+
+from searoute import cli
+
+ROWS = [('FRLEH', 'CNSHA'), ('NLRTM', 'USNYC'), ('SGSIN', 'AEJEA'), ('0.35,50.06', '117.42,39.37'), ('FRLEH', 'XXXXX'),
+        ('USLAX', 'JPTYO'), ('DEHAM', 'BRSSZ')]
+
+
+@pytest.fixture
+def od_file(tmp_path):
+    path = str(tmp_path / 'od.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['origin', 'destination'])
+        writer.writerows(ROWS)
+    return path
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_resume(tmp_path, od_file, monkeypatch):
+    expected = str(tmp_path / 'expected.csv')
+    assert cli.route_file(od_file, expected, workers=1, chunk_size=2, geometry='polyline', report=None) == len(ROWS)
+
+    output = str(tmp_path / 'routes.csv')
+    route_chunk = cli._worker_route_chunk
+    calls = []
+
+    def interrupted(rows):
+        calls.append(rows)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return route_chunk(rows)
+
+    monkeypatch.setattr(cli, '_worker_route_chunk', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        cli.route_file(od_file, output, workers=1, chunk_size=2, geometry='polyline', report=None)
+    monkeypatch.setattr(cli, '_worker_route_chunk', route_chunk)
+    assert os.path.exists(output + '.checkpoint')
+
+    with pytest.raises(ValueError, match='other options'):
+        cli.route_file(od_file, output, workers=1, chunk_size=2, units='km', geometry='polyline', report=None)
+    # the 4 rows of the chunks written are not routed again
+    assert cli.route_file(od_file, output, workers=1, chunk_size=2, geometry='polyline', report=None) == len(ROWS) - 4
+    assert not os.path.exists(output + '.checkpoint')
+    assert read(output) == read(expected)
@@ -0,0 +1,112 @@
+from copy import copy
+
+import pytest
+
+import searoute as sr
+from searoute import CostOverlay
+from searoute.main import setup_M
+
+ORIGIN = (0.3515625, 50.064191736659104)
+DESTINATION = (117.42187500000001, 39.36827914916014)
+
+
+@pytest.fixture
+def M():
+    M = copy(setup_M())
+    M._indexes = {}
+    return M
+
+
+def overlay_key(overlay):
+    return overlay.token, overlay.version
+
+
+def test_key_changes_and_trees_are_invalidated(M):
+    overlay = CostOverlay(M)
+    sg = M.search_graph
+    u, v = sg.nodes[sg.edges_u[0]], sg.nodes[sg.edges_v[0]]
+    edits = [lambda: overlay.set(u, v, factor=2.0),
+             lambda: overlay.update({(u, v): (0.5, 0.0)}),
+             lambda: overlay.set_passage('suez', penalty=1000),
+             lambda: overlay.remove(u, v),
+             lambda: overlay.clear()]
+
+    tree = M.search_tree(0, overlay=overlay)
+    keys = {overlay_key(overlay)}
+    for edit in edits:
+        edit()
+        assert overlay_key(overlay) not in keys
+        keys.add(overlay_key(overlay))
+        assert M.search_tree(0, overlay=overlay) is not tree
+        tree = M.search_tree(0, overlay=overlay)
+        assert M.search_tree(0, overlay=overlay) is tree
+
+    # another overlay never shares the trees of the first one
+    other = CostOverlay(M)
+    other.version = overlay.version
+    assert overlay_key(other) != overlay_key(overlay)
+    assert M.search_tree(0, overlay=other) is not tree
+
+
+def test_reachable_ports_bound(M):
+    ports = sr.reachable_ports(ORIGIN, max_length=1000, units='km', M=M)
+    lengths = [feature.properties['length'] for feature in ports.features]
+    assert lengths and lengths == sorted(lengths) and lengths[-1] <= 1000
+    within = sr.reachable_ports(ORIGIN, max_duration=1000 / 24 / 1.852, units='km', speed_knot=24, M=M)
+    assert len(within.features) == len(ports.features)
+
+    overlay = CostOverlay(M)
+    sg = M.search_graph
+    overlay.update({(sg.nodes[u], sg.nodes[v]): (2.0, 0.0) for u, v in zip(sg.edges_u, sg.edges_v)})
+    costly = sr.reachable_ports(ORIGIN, max_length=1000, units='km', M=M, overlay=overlay)
+    assert 0 < len(costly.features) < len(ports.features)
+    assert costly.features[0].properties['length'] == pytest.approx(2 * lengths[0])
+
+
+def test_scale(M):
+    overlay = CostOverlay(M)
+    sg = M.search_graph
+    u, v = sg.nodes[sg.edges_u[0]], sg.nodes[sg.edges_v[0]]
+    assert overlay.scale == 1.0
+    overlay.set(u, v, factor=0.25)
+    assert overlay.scale == 0.25
+    overlay.set(u, v, factor=3.0)
+    assert overlay.scale == 1.0
+    overlay.set(u, v, factor=1.0, penalty=-sg.weights[0] / 2)
+    assert overlay.scale == 0
+
+
+def test_costs_change_routes(M):
+    overlay = CostOverlay(M)
+    plain = sr.searoute(ORIGIN, DESTINATION, M=M, units='km', return_passages=True)
+    assert 'suez' in plain.properties['traversed_passages']
+    assert sr.searoute(ORIGIN, DESTINATION, M=M, units='km', overlay=overlay).properties == {
+        k: v for k, v in plain.properties.items() if k != 'traversed_passages'}
+
+    overlay.set_passage('suez', penalty=20000)
+    around = sr.searoute(ORIGIN, DESTINATION, M=M, units='km', return_passages=True, overlay=overlay)
+    assert 'suez' not in around.properties['traversed_passages']
+    # the length stays the one of the geometry, costs only choose the route
+    assert around.properties['length'] > plain.properties['length']
+    assert sr.searoute(ORIGIN, DESTINATION, M=M, units='km', overlay=overlay, heuristic='alt').geometry == around.geometry
+    # the Marnet is unchanged
+    assert sr.searoute(ORIGIN, DESTINATION, M=M, units='km').geometry == plain.geometry
+
+    overlay.clear()
+    assert len(overlay) == 0
+    assert sr.searoute(ORIGIN, DESTINATION, M=M, units='km', overlay=overlay).geometry == plain.geometry
+
+
+def test_invalid_costs(M):
+    overlay = CostOverlay(M)
+    sg = M.search_graph
+    u, v = sg.nodes[sg.edges_u[0]], sg.nodes[sg.edges_v[0]]
+    with pytest.raises(ValueError):
+        overlay.set(u, v, factor=-1)
+    with pytest.raises(ValueError):
+        overlay.set(u, v, penalty=-2 * sg.weights[0])
+    with pytest.raises(KeyError):
+        overlay.set((0.0, 0.0), (1.0, 1.0), factor=2)
+    with pytest.raises(ValueError):
+        sr.searoute(ORIGIN, DESTINATION, overlay=overlay)
+    assert len(overlay) == 0 and (u, v) not in overlay
@@ -0,0 +1,67 @@
+import searoute as sr
+from searoute.instrumentation import BUCKETS, Collector, collector, count, phase
+from searoute.main import setup_M
+
+ORIGIN = (0.3515625, 50.064191736659104)
+DESTINATION = (117.42187500000001, 39.36827914916014)
+
+
+def test_instrument_properties():
+    before = collector.count
+    plain = sr.searoute(ORIGIN, DESTINATION)
+    assert 'instrumentation' not in plain.properties
+    assert collector.count == before
+
+    route = sr.searoute(ORIGIN, DESTINATION, return_passages=True, instrument=True)
+    trace = route.properties['instrumentation']
+    assert {'snap', 'reachability', 'search', 'geometry', 'length', 'passages', 'output'} <= set(trace['phases'])
+    assert sum(trace['phases'].values()) <= trace['total']
+    counters = trace['counters']
+    assert counters['nodes_settled'] > 0 and counters['edges_relaxed'] >= counters['nodes_settled'] - 1
+    assert counters['heap_pops'] <= counters['heap_pushes']
+    assert collector.count == before + 1
+    assert route.geometry == plain.geometry
+    assert {k: v for k, v in route.properties.items() if k not in ('instrumentation', 'traversed_passages')} \
+        == plain.properties
+
+
+def test_instrument_collector():
+    own = Collector()
+    before = collector.count
+    for _ in range(3):
+        route = sr.searoute(ORIGIN, DESTINATION, instrument=own)
+        assert 'instrumentation' not in route.properties
+    setup_M().shortest_path(ORIGIN, DESTINATION, instrument=own)
+    assert own.count == 4 and collector.count == before + 4
+
+    histograms = own.histograms()
+    assert histograms['total']['count'] == 4
+    assert sum(n for _, n in histograms['search']['buckets']) == 4
+    summary = own.summary()
+    assert summary['count'] == 4
+    assert summary['counters']['nodes_settled'] > 0
+    assert summary['seconds']['search'] <= summary['seconds']['total']
+
+
+def test_collector_histograms():
+    own = Collector(buckets=(0.01, 0.1))
+    own.record({'total': 0.005, 'phases': {'search': 0.005}, 'counters': {'nodes_settled': 10}})
+    own.record({'total': 0.05, 'phases': {'search': 0.01}, 'counters': {'nodes_settled': 30}})
+    own.record({'total': 5.0, 'phases': {}, 'counters': {}})
+    histograms = own.histograms()
+    assert histograms['total']['buckets'] == [(0.01, 1), (0.1, 1), (float('inf'), 1)]
+    assert histograms['search']['buckets'] == [(0.01, 2), (0.1, 0), (float('inf'), 0)]
+    assert own.summary() == {'count': 3, 'seconds': {'total': 5.055 / 3, 'search': 0.0075},
+                             'counters': {'nodes_settled': 40 / 3}}
+    own.reset()
+    assert own.summary() == {'count': 0, 'seconds': {}, 'counters': {}}
+    assert Collector().buckets == BUCKETS
+
+
+def test_nothing_measured_when_off():
+    # outside of an instrumented call, phases and counters do nothing
+    with phase('search'):
+        count('nodes_settled')
+    before = collector.count
+    sr.searoute(ORIGIN, DESTINATION, instrument=False)
+    assert collector.count == before
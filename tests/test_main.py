@@ -0,0 +1,54 @@
+import networkx as nx
+import pytest
+
+import searoute as sr
+from searoute.classes.area_feature import AreaFeature
+
+ORIGIN = (0.3515625, 50.064191736659104)
+DESTINATION = (117.42187500000001, 39.36827914916014)
+
+
+@pytest.mark.parametrize('output', ['geojson', 'route', 'array', 'polyline', 'wkb'])
+def test_simplify_outputs(output):
+    complete = sr.searoute(ORIGIN, DESTINATION, output=output)
+    simplified = sr.searoute(ORIGIN, DESTINATION, simplify=10, output=output)
+    if output == 'geojson':
+        properties = simplified.properties
+        assert len(simplified.geometry.coordinates) == properties['vertices_simplified']
+        assert properties['length'] == complete.properties['length']
+    elif output == 'route':
+        properties = simplified.properties
+        assert len(simplified.coordinates) == properties['vertices_simplified']
+    else:
+        properties = simplified[1]
+        if output == 'array':
+            assert len(simplified[0]) == properties['vertices_simplified']
+    assert properties['vertices_simplified'] < properties['vertices']
+
+
+@pytest.mark.parametrize('method', ['penalty', 'yen'])
+def test_alternatives_distinct_passages(method):
+    routes = sr.searoute_alternatives(ORIGIN, DESTINATION, k=3, method=method, distinct_passages=True)
+    assert len(routes) == 3
+    assert len({tuple(route.properties['traversed_passages']) for route in routes}) == 3
+    lengths = [route.properties['length'] for route in routes]
+    assert lengths == sorted(lengths)
+
+
+def test_alternatives_unreachable():
+    # the Bosporus is closed, the Black Sea can not be reached
+    zone = AreaFeature(coordinates=[[[26, 39], [30, 39], [30, 42], [26, 42], [26, 39]]])
+    black_sea = (31.0, 43.0)
+    with pytest.raises(nx.NetworkXNoPath):
+        sr.searoute(ORIGIN, black_sea, zones=zone)
+    with pytest.raises(nx.NetworkXNoPath):
+        sr.searoute_alternatives(ORIGIN, black_sea, zones=zone)
+    assert sr.searoute_alternatives(ORIGIN, black_sea, k=2, zones=zone, unreachable='snap')
+
+
+def test_fleet_costs_requires_speed():
+    profiles = [{'name': 'feeder', 'speed_knot': 14, 'mfo_consumption': 20}, {'name': 'panamax', 'mfo_consumption': 40}]
+    with pytest.raises(ValueError, match='panamax'):
+        sr.fleet_costs([1000.0], profiles)
+    grid = sr.fleet_costs([1000.0], profiles[:1])
+    assert grid['duration_hours'][0, 0, 0] == pytest.approx(1000 / 14)
@@ -0,0 +1,26 @@
+import random
+
+import searoute as sr
+from searoute.main import setup_M
+
+ORIGIN = (0.3515625, 50.064191736659104)
+DESTINATION = (117.42187500000001, 39.36827914916014)
+
+
+def noisy_track(step, noise, seed):
+    """Positions every `step` vertices of a route, moved by a gaussian noise in degrees"""
+    rng = random.Random(seed)
+    line = sr.searoute(ORIGIN, DESTINATION).geometry.coordinates
+    points = [line[0]] + [line[i] for i in range(step, len(line) - 1, step)] + [line[-1]]
+    return [(t, (lon + rng.gauss(0, noise) + 180) % 360 - 180, lat + rng.gauss(0, noise))
+            for t, (lon, lat) in enumerate(points)]
+
+
+def test_nodes_stay_connected_across_commits():
+    M = setup_M()
+    matches = list(sr.MapMatcher(M, radius=80, lag=2).match(noisy_track(step=2, noise=0.2, seed=1)))
+    assert all(match.edge is not None for match in matches)
+    nodes = [node for match in matches for node in match.nodes]
+    assert len(nodes) > 100
+    breaks = [(a, b) for a, b in zip(nodes, nodes[1:]) if a != b and not M.has_edge(a, b)]
+    assert breaks == []
@@ -0,0 +1,165 @@
+from copy import copy
+
+import numpy as np
+import pytest
+
+from searoute import CostOverlay
+from searoute.main import setup_M
+
+ORIGIN = (0.3515625, 50.064191736659104)
+DESTINATION = (117.42187500000001, 39.36827914916014)
+
+
+def test_search_trees_are_bounded():
+    M = copy(setup_M())
+    M._indexes = dict(M._indexes)
+    M.SEARCH_TREES = 3
+    overlay = CostOverlay(M)
+    first = M.search_tree(0, overlay=overlay)
+    assert M.search_tree(0, overlay=overlay) is first
+    # another overlay at the same version
+    assert M.search_tree(0, overlay=CostOverlay(M)) is not first
+    for factor in (1.5, 2.0, 2.5, 3.0):
+        overlay.set_passage('suez', factor=factor)
+        tree = M.search_tree(0, overlay=overlay)
+    assert len(M._indexes['search_trees']) == 3
+    assert M.search_tree(0, overlay=overlay) is tree
+
+
+def test_bulk_adds_copy_attributes():
+    from searoute.classes.marnet import Marnet
+    M = Marnet()
+    nodes = [((0.0, 0.0), {'name': 'a'})]
+    edges = [((0.0, 0.0), (1.0, 0.0), {'passage': 'suez'}), ((1.0, 0.0), (2.0, 0.0), {'weight': 5.0})]
+    M.add_nodes_from_list(nodes)
+    M.add_edges_from_list(edges)
+    assert nodes == [((0.0, 0.0), {'name': 'a'})]
+    assert edges[0][2] == {'passage': 'suez'}
+    assert M.nodes[(0.0, 0.0)] == {'name': 'a', 'x': 0.0, 'y': 0.0}
+    assert M.edges[(0.0, 0.0), (1.0, 0.0)]['weight'] == 111.2
+    assert M.edges[(1.0, 0.0), (2.0, 0.0)]['weight'] == 5.0
+
+
+def test_only_blocking_restrictions_are_lifted():
+    import searoute as sr
+    shanghai, odessa = (121.47, 31.23), (30.73, 46.48)
+    # the Black Sea is only reached through the Bosporus, Suez stays closed
+    route = sr.searoute(shanghai, odessa, restrictions=['northwest', 'bosporus', 'suez'], return_passages=True)
+    assert 'bosporus' in route.properties['traversed_passages']
+    assert 'suez' not in route.properties['traversed_passages']
+    open_route = sr.searoute(shanghai, odessa, restrictions=['northwest', 'bosporus'], return_passages=True)
+    assert 'suez' in open_route.properties['traversed_passages']
+    assert route.properties['length'] > open_route.properties['length']
+
+
+def test_snapped_target_keeps_restrictions():
+    import searoute as sr
+    from searoute.classes.area_feature import AreaFeature
+    shanghai, odessa = (121.47, 31.23), (30.73, 46.48)
+    bosporus = AreaFeature(coordinates=[[[28.5, 40.8], [29.5, 40.8], [29.5, 41.4], [28.5, 41.4], [28.5, 40.8]]], name='Bosporus')
+    # Odessa is snapped south of the Bosporus, reached around Africa with Suez closed
+    route = sr.searoute(shanghai, odessa, restrictions=['northwest', 'suez'], zones=[bosporus], unreachable='snap', return_passages=True)
+    assert 'suez' not in route.properties['traversed_passages']
+    assert 'south_africa' in route.properties['traversed_passages']
+    open_route = sr.searoute(shanghai, odessa, restrictions=['northwest'], zones=[bosporus], unreachable='snap', return_passages=True)
+    assert route.geometry['coordinates'][-1] == open_route.geometry['coordinates'][-1]
+    assert 'suez' in open_route.properties['traversed_passages']
+
+
+def _zone(min_x, min_y, max_x, max_y):
+    from searoute.classes.area_feature import AreaFeature
+    return AreaFeature(coordinates=[[[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y], [min_x, min_y]]])
+
+
+def _crossing_edges(sg, ring):
+    # every edge tested, without the spatial index, with copies of the polygon around the antimeridian
+    from searoute.utils import segments_cross_polygon
+    a, b = sg.edge_segments()
+    ring = np.asarray(ring, dtype=float)
+    return np.any([segments_cross_polygon(a, b, ring + (shift, 0)) for shift in (-360, 0, 360)], axis=0)
+
+
+@pytest.mark.parametrize('box', [(32, 12, 44, 30), (-6, 35, -5, 37), (175, -10, 185, 60), (-185, 30, -170, 40)])
+def test_zone_edges(box):
+    from searoute.classes.area_feature import AreaFeature
+    M = setup_M()
+    sg = M.search_graph
+    zone = _zone(*box)
+    closed = M.closed_edges([], zone)
+    ring = zone['geometry']['coordinates'][0]
+    expected = _crossing_edges(sg, ring)
+    assert expected.any()
+    assert np.array_equal(np.frombuffer(closed, dtype=np.uint8).astype(bool), expected)
+
+    # edges with an end inside the zone are closed
+    min_x, min_y, max_x, max_y = box
+    for e, (u, v) in enumerate(zip(sg.edges_u, sg.edges_v)):
+        for lon, lat in (sg.coords[u], sg.coords[v]):
+            if min_y < lat < max_y and any(min_x < lon + shift < max_x for shift in (-360, 0, 360)):
+                assert closed[e]
+
+    # restrictions are added to the zones, and the compiled mask is cached
+    with_suez = M.closed_edges(['suez'], zone)
+    assert all(c >= z for c, z in zip(with_suez, closed))
+    assert M.closed_edges([], AreaFeature.create([zone])) is closed
+    assert M.closed_edges([], [zone]) is closed
+
+
+def test_routes_avoid_zones():
+    import searoute as sr
+    red_sea = _zone(32, 12, 44, 30)
+    route = sr.searoute(ORIGIN, DESTINATION, zones=[red_sea], return_passages=True)
+    assert not {'suez', 'babalmandab'} & set(route.properties['traversed_passages'])
+    assert not any(32 < lon < 44 and 12 < lat < 30 for lon, lat in route.geometry['coordinates'])
+    assert route.properties['length'] > sr.searoute(ORIGIN, DESTINATION).properties['length']
+
+
+def _port_pairs(count, seed):
+    import random
+    from searoute.main import setup_P
+    rng = random.Random(seed)
+    ports = sorted(setup_P().nodes)
+    return [(rng.choice(ports), rng.choice(ports)) for _ in range(count)]
+
+
+def _path_cost(sg, path):
+    return sum(sg.weights[sg.edge(u, v)] for u, v in zip(path, path[1:]))
+
+
+@pytest.mark.parametrize('restrictions', [['northwest'], [], ['northwest', 'suez', 'panama']])
+def test_alt_matches_dijkstra(restrictions):
+    # weights are rounded to 0.1 km, paths of the same cost can differ a little in length
+    M = setup_M()
+    sg = M.search_graph
+    pairs = _port_pairs(15, len(restrictions))
+    points = [point for pair in pairs for point in pair]
+    dijkstra = M.shortest_paths(points, restrictions=restrictions)[::2]
+    alt = M.shortest_paths(points, restrictions=restrictions, heuristic='alt')[::2]
+    for (expected, _), (path, _) in zip(dijkstra, alt):
+        assert (path[0], path[-1]) == (expected[0], expected[-1])
+        assert _path_cost(sg, path) == pytest.approx(_path_cost(sg, expected), rel=1e-12)
+
+
+def test_alt_with_zones_and_stored_landmarks(tmp_path):
+    zone = _zone(32, 12, 44, 30)
+    M = setup_M()
+    sg = M.search_graph
+    for origin, destination in _port_pairs(10, 7):
+        (expected, _), = M.shortest_paths([origin, destination], zones=[zone], unreachable='snap')
+        (path, _), = M.shortest_paths([origin, destination], zones=[zone], unreachable='snap', heuristic='alt')
+        assert _path_cost(sg, path) == pytest.approx(_path_cost(sg, expected), rel=1e-12)
+
+    M = copy(setup_M())
+    M._indexes = {}
+    M.landmarks_path = None
+    landmarks_path = str(tmp_path / 'landmarks.npz')
+    M.save_landmarks(landmarks_path)
+    loaded = copy(setup_M())
+    loaded._indexes = {}
+    loaded.landmarks_path = landmarks_path
+    (selected, table), (stored, stored_table) = M.landmarks(), loaded.landmarks()
+    assert selected == stored and np.array_equal(table, stored_table)
+    for origin, destination in _port_pairs(5, 3):
+        (expected, _), = M.shortest_paths([origin, destination])
+        (path, _), = loaded.shortest_paths([origin, destination], heuristic='alt')
+        assert _path_cost(sg, path) == pytest.approx(_path_cost(sg, expected), rel=1e-12)
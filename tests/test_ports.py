@@ -0,0 +1,9 @@
+from searoute.classes.ports import Ports
+
+
+def test_bulk_add_copies_attributes():
+    P = Ports()
+    nodes = [((0.1, 49.5), {'port': 'FRLEH', 'cty': 'France'})]
+    P.add_nodes_from_list(nodes)
+    assert nodes == [((0.1, 49.5), {'port': 'FRLEH', 'cty': 'France'})]
+    assert P.nodes[(0.1, 49.5)] == {'port': 'FRLEH', 'cty': 'France', 'x': 0.1, 'y': 49.5}
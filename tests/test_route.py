@@ -0,0 +1,104 @@
+import struct
+
+import geojson
+import numpy as np
+import pytest
+
+import searoute as sr
+from searoute.utils import distance_length
+
+ORIGIN = (0.3515625, 50.064191736659104)
+DESTINATION = (117.42187500000001, 39.36827914916014)
+
+
+def decode_polyline(text, precision):
+    values, value, shift = [], 0, 0
+    for char in text:
+        byte = ord(char) - 63
+        value |= (byte & 0x1f) << shift
+        shift += 5
+        if byte < 0x20:
+            values.append(~(value >> 1) if value & 1 else value >> 1)
+            value, shift = 0, 0
+    lat_lon = np.cumsum(np.array(values).reshape(-1, 2), axis=0) / 10 ** precision
+    return lat_lon[:, ::-1]
+
+
+def decode_wkb(data):
+    byte_order, kind, n = struct.unpack('<BII', data[:9])
+    assert (byte_order, kind, len(data)) == (1, 2, 9 + 16 * n)
+    return np.frombuffer(data[9:], dtype='<f8').reshape(n, 2)
+
+
+@pytest.mark.parametrize('precision', [None, 2, 4])
+def test_feature_matches_geojson_output(precision):
+    feature = sr.searoute(ORIGIN, DESTINATION, return_passages=True, precision=precision)
+    route = sr.searoute(ORIGIN, DESTINATION, return_passages=True, precision=precision, output='route')
+    assert geojson.dumps(route.feature, sort_keys=True) == geojson.dumps(feature, sort_keys=True)
+    assert route.to_geojson() is route.feature
+    assert route.__geo_interface__['geometry']['coordinates'] == route.feature['geometry']['coordinates']
+
+
+@pytest.mark.parametrize('precision', [None, 3])
+def test_polyline_round_trip(precision):
+    route = sr.searoute(ORIGIN, DESTINATION, precision=precision, output='route')
+    places = 5 if precision is None else precision
+    decoded = decode_polyline(route.to_polyline(), places)
+    assert decoded == pytest.approx(np.round(route.coordinates, places), abs=10 ** -places / 2)
+    assert decode_polyline(route.to_polyline(6), 6) == pytest.approx(route.coordinates, abs=5e-7)
+    assert sr.searoute(ORIGIN, DESTINATION, precision=precision, output='polyline')[0] == route.to_polyline()
+
+
+def test_wkb_round_trip():
+    route = sr.searoute(ORIGIN, DESTINATION, output='route')
+    assert np.array_equal(decode_wkb(route.to_wkb()), route.coordinates)
+    assert sr.searoute(ORIGIN, DESTINATION, output='wkb')[0] == route.to_wkb()
+
+
+def test_cumulative():
+    route = sr.searoute(ORIGIN, DESTINATION, units='km', output='route')
+    cumulative = route.cumulative
+    assert len(cumulative) == len(route)
+    assert cumulative[0] == 0 and np.all(np.diff(cumulative) >= 0)
+    assert cumulative[-1] == pytest.approx(route.properties['length'], rel=1e-9)
+    assert cumulative[-1] == pytest.approx(distance_length(route.coordinates.tolist(), 'km'), rel=1e-12)
+    assert route.cumulative is cumulative
+
+
+def test_positions_at_endpoints():
+    route = sr.searoute(ORIGIN, DESTINATION, speed_knot=14, output='route')
+    duration = route.properties['duration_hours']
+    positions = route.positions_at([-1, 0, duration, duration + 100])
+    assert positions[0] == pytest.approx(route.coordinates[0]) and positions[1] == pytest.approx(route.coordinates[0])
+    assert positions[2] == pytest.approx(route.coordinates[-1]) and positions[3] == pytest.approx(route.coordinates[-1])
+    assert route.position_at(duration / 2) == pytest.approx(tuple(route.positions_at([duration / 2])[0]))
+    assert route.etas([route.coordinates[0], route.coordinates[-1]]) == pytest.approx([0, duration])
+
+    departure = np.datetime64('2026-01-01T00:00')
+    dated = sr.searoute(ORIGIN, DESTINATION, speed_knot=14, output='route')
+    dated.departure = departure
+    assert dated.positions_at([departure]) == pytest.approx(route.positions_at([0]))
+    etas = dated.etas([route.coordinates[-1]])
+    assert (etas[0] - departure) / np.timedelta64(1, 'h') == pytest.approx(duration)
+    with pytest.raises(ValueError):
+        route.positions_at([departure])
+    with pytest.raises(ValueError):
+        sr.searoute(ORIGIN, DESTINATION, speed_knot=0, output='route').positions_at([1])
+
+
+def test_positions_across_antimeridian():
+    tokyo, los_angeles = (139.7, 35.4), (-118.2, 33.7)
+    route = sr.searoute(tokyo, los_angeles, speed_knot=20, output='route')
+    assert route.coordinates[:, 0].max() > 180
+    hours = np.arange(0, route.properties['duration_hours'], 1.0)
+    positions = route.positions_at(hours)
+    # 20 knots is about a third of a degree per hour, positions never jump across the map
+    steps = np.diff(positions[:, 0])
+    assert np.abs(steps).max() < 1
+    assert positions[:, 0].min() >= route.coordinates[:, 0].min() - 1e-9
+    assert positions[:, 0].max() <= route.coordinates[:, 0].max() + 1e-9
+    assert route.positions_at([route.properties['duration_hours']])[0] == pytest.approx(route.coordinates[-1])
+    # the positions at the times the route passes by its coordinates are the coordinates
+    etas = route.etas(route.coordinates)
+    assert np.all(np.diff(etas) >= 0)
+    assert np.allclose(route.positions_at(etas), route.coordinates, rtol=0, atol=1e-6)
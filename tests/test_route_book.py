@@ -0,0 +1,40 @@
+import networkx as nx
+
+from searoute import RouteBook
+from searoute.classes import route_book
+
+SUEZ = ('FRLEH-CNSHA', (0.107, 49.486), (121.47, 31.23))
+PANAMA = ('FRLEH-USLAX', (0.107, 49.486), (-118.28, 33.72))
+
+
+def test_apply_restrictions():
+    book = RouteBook()
+    book.add_many([SUEZ, PANAMA])
+    assert 'suez' in book['FRLEH-CNSHA']['traversed_passages']
+    diff = book.apply_restrictions(['northwest', 'suez'])
+    assert set(diff) == {'FRLEH-CNSHA'}
+    assert diff['FRLEH-CNSHA']['length_delta'] > 0
+    assert 'suez' not in diff['FRLEH-CNSHA']['passages_after']
+
+
+def test_route_becoming_unreachable(monkeypatch):
+    book = RouteBook()
+    book.add_many([SUEZ, PANAMA])
+    searoute = route_book.searoute
+
+    def closed_suez(origin, destination, restrictions, **kwargs):
+        if 'suez' in restrictions and destination == SUEZ[2]:
+            raise nx.NetworkXNoPath('No path')
+        return searoute(origin, destination, restrictions=restrictions, **kwargs)
+
+    monkeypatch.setattr(route_book, 'searoute', closed_suez)
+    assert book.apply_restrictions(['northwest', 'suez']) == {}
+    assert book.failed == {'FRLEH-CNSHA': 'No path'}
+    assert 'length' not in book['FRLEH-CNSHA']
+    assert book.routes_through(['suez']) == set()
+
+    # lifted again, the route is computed but has no diff
+    diff = book.apply_restrictions(['northwest'])
+    assert set(diff) == {'FRLEH-USLAX'}
+    assert book.failed == {}
+    assert 'suez' in book['FRLEH-CNSHA']['traversed_passages']
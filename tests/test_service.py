@@ -0,0 +1,106 @@
+import http.client
+import json
+import threading
+from copy import copy
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from searoute.service import RouteHandler, RouteService
+
+ORIGIN = [0.3515625, 50.064191736659104]
+DESTINATIONS = [[117.42187500000001, 39.36827914916014], [-74.0, 40.6], [31.0, 31.5]]
+
+
+@pytest.fixture(scope='module')
+def service():
+    service = RouteService(batch_window=0.05).start()
+    service.wait_ready()
+    return service
+
+
+def test_failed_group_answers_every_request(service, monkeypatch):
+    def fail(*args, **kwargs):
+        raise KeyError('boom')
+
+    monkeypatch.setattr(service.M, 'shortest_paths_from', fail)
+    errors = []
+
+    def request(destination):
+        try:
+            service.route({'origin': ORIGIN, 'destination': destination})
+        except KeyError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=request, args=(d,)) for d in DESTINATIONS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads)
+    assert len(errors) == len(DESTINATIONS)
+
+
+@pytest.mark.parametrize('params', [{'restrictions': [['suez']]}, {'restrictions': 'suez'}, {'units': 'parsec'},
+                                    {'heuristic': 'bogus'}, {'unreachable': 'bogus'}])
+def test_invalid_request_fails_alone(service, params):
+    routes = service.batch([{'origin': ORIGIN, 'destination': d} for d in DESTINATIONS[:2]]
+                           + [dict(params, origin=ORIGIN, destination=DESTINATIONS[2])])
+    assert all(route['type'] == 'Feature' for route in routes[:2])
+    assert 'error' in routes[2]
+
+
+def _post(server, path, body):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    connection.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+@pytest.fixture
+def server(service):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RouteHandler)
+    server.daemon_threads = True
+    server.verbose = False
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_only_unavailable_is_503(server, monkeypatch):
+    request = {'origin': ORIGIN, 'destination': DESTINATIONS[0]}
+    assert _post(server, '/route', request)[0] == 200
+
+    def fail(params):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(server.service, 'route', fail)
+    assert _post(server, '/route', request) == (500, {'error': 'boom'})
+
+    server.service = RouteService(ready_timeout=0)
+    assert _post(server, '/route', request)[0] == 503
+
+
+def test_concurrent_search_trees(service):
+    M = copy(service.M)
+    M._indexes = {'search_graph': M.search_graph}
+    M.SEARCH_TREES = 4
+    trees, errors = {}, []
+
+    def search(source):
+        try:
+            trees[source] = M.search_tree(source)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=search, args=(source % 8,)) for source in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not errors
+    assert len(M._indexes['search_trees']) == 4
+    for source, (dist, _, _) in trees.items():
+        assert dist[source] == 0
@@ -0,0 +1,192 @@
+import gzip
+import io
+import json
+import random
+from itertools import permutations
+
+import numpy as np
+import pytest
+
+import searoute as sr
+from searoute.utils import (avg_earth_radius_km, conversions, cumulative_distances, distance, distance_length,
+                            distance_matrix, distances, shortest_visit_order, simplify_linestring, to_unit_vectors,
+                            write_routes)
+
+inf = float('inf')
+
+
+def random_matrix(n, rng, symmetric=False):
+    d = [[0.0 if i == j else rng.uniform(1, 100) for j in range(n)] for i in range(n)]
+    if symmetric:
+        d = [[d[min(i, j)][max(i, j)] for j in range(n)] for i in range(n)]
+    return d
+
+
+def path_cost(d, order):
+    route = [0, *order, len(d) - 1]
+    return sum(d[a][b] for a, b in zip(route, route[1:]))
+
+
+def brute_force(d):
+    return min(path_cost(d, order) for order in permutations(range(1, len(d) - 1)))
+
+
+@pytest.mark.parametrize('n', [2, 3, 4, 5, 6, 7])
+def test_exact_is_optimal(n):
+    rng = random.Random(n)
+    for _ in range(5):
+        d = random_matrix(n, rng)
+        order, cost = shortest_visit_order(d)
+        assert sorted(order) == list(range(1, n - 1))
+        assert cost == pytest.approx(path_cost(d, order))
+        assert cost == pytest.approx(brute_force(d))
+
+
+def test_local_search():
+    rng = random.Random(1)
+    # points on a line, visited in order by the shortest path
+    xs = [0.0] + sorted(rng.uniform(0, 100) for _ in range(16)) + [100.0]
+    shuffled = [0] + rng.sample(range(1, 17), 16) + [17]
+    d = [[abs(xs[a] - xs[b]) for b in shuffled] for a in shuffled]
+    order, cost = shortest_visit_order(d, exact_max=8)
+    assert sorted(order) == list(range(1, 17))
+    assert cost == pytest.approx(100.0)
+
+    d = random_matrix(8, rng, symmetric=True)
+    order, cost = shortest_visit_order(d, exact_max=2)
+    assert sorted(order) == list(range(1, 7))
+    assert brute_force(d) <= cost + 1e-9
+
+
+@pytest.mark.parametrize('exact_max', [12, 1])
+def test_unreachable_point(exact_max):
+    d = [[0, 1, inf, 1], [1, 0, inf, 1], [inf, inf, 0, inf], [1, 1, inf, 0]]
+    order, cost = shortest_visit_order(d, exact_max)
+    assert sorted(order) == [1, 2]
+    assert cost == inf
+
+
+PAIRS = [((0.3515625, 50.064191736659104), (117.42187500000001, 39.36827914916014)),
+         ((121.47, 31.23), (30.73, 46.48)),
+         ((-74.0, 40.6), (4.0, 51.9)),
+         ((139.7, 35.4), (-118.2, 33.7))]
+
+
+def segment_length(line, units):
+    # the previous scalar implementation, one distance per segment
+    return sum(distance(a, b, units) for a, b in zip(line, line[1:]))
+
+
+@pytest.mark.parametrize('origin, destination', PAIRS)
+@pytest.mark.parametrize('units', ['km', 'naut', 'mi'])
+def test_vectorized_route_length(origin, destination, units):
+    route = sr.searoute(origin, destination, units=units)
+    line = route.geometry['coordinates']
+    expected = segment_length(line, units)
+    assert route.properties['length'] == pytest.approx(expected, rel=1e-12)
+    assert distance_length(line, units) == pytest.approx(expected, rel=1e-12)
+    cumulative = cumulative_distances(line, units)
+    assert cumulative[0] == 0
+    assert cumulative[-1] == pytest.approx(expected, rel=1e-12)
+    assert distances(line[:-1], line[1:], units).tolist() == pytest.approx(
+        [distance(a, b, units) for a, b in zip(line, line[1:])], rel=1e-12)
+
+
+def test_distance_matrix():
+    points = [p for pair in PAIRS for p in pair]
+    matrix = distance_matrix(points, points[:3])
+    assert matrix.shape == (len(points), 3)
+    for i, a in enumerate(points):
+        for j, b in enumerate(points[:3]):
+            assert matrix[i, j] == pytest.approx(distance(a, b), rel=1e-12, abs=1e-9)
+    assert distance_length([]) == 0 and distance_length([(1.0, 2.0)]) == 0
+
+
+def arc_distance(point, a, b):
+    """Distance in km of a point to the great circle arc a-b, computed vertex by vertex"""
+    p, a, b = to_unit_vectors([point, a, b])
+    normal = np.cross(a, b)
+    angle = min(np.arccos(np.clip(p @ a, -1, 1)), np.arccos(np.clip(p @ b, -1, 1)))
+    if np.linalg.norm(normal) > 1e-12:
+        normal /= np.linalg.norm(normal)
+        if p @ np.cross(normal, a) > 0 and p @ np.cross(b, normal) > 0:
+            angle = np.arcsin(min(abs(p @ normal), 1))
+    return angle * avg_earth_radius_km * conversions['km']
+
+
+@pytest.mark.parametrize('origin, destination', PAIRS)
+@pytest.mark.parametrize('tolerance', [1, 10, 100])
+def test_simplify_within_tolerance(origin, destination, tolerance):
+    line = [tuple(p) for p in sr.searoute(origin, destination).geometry['coordinates']]
+    simplified = simplify_linestring(line, tolerance)
+    assert simplified[0] == line[0] and simplified[-1] == line[-1]
+    assert len(simplified) < len(line)
+    kept = [line.index(p) for p in simplified]
+    assert kept == sorted(kept)
+    for i, j in zip(kept, kept[1:]):
+        for point in line[i + 1:j]:
+            assert arc_distance(point, line[i], line[j]) <= tolerance * (1 + 1e-9)
+
+
+def test_simplify_units_and_trivial_lines():
+    line = [tuple(p) for p in sr.searoute(*PAIRS[0]).geometry['coordinates']]
+    assert simplify_linestring(line, 10, 'naut') == simplify_linestring(line, 18.52, 'km')
+    assert simplify_linestring(line, 0) == line
+    assert simplify_linestring(line, None) == line
+    assert simplify_linestring(line[:2], 1000) == line[:2]
+    # a straight meridian keeps its ends only, across the antimeridian too
+    assert simplify_linestring([(0, 0), (0, 1), (0, 2)], 1) == [(0, 0), (0, 2)]
+    assert simplify_linestring([(179, 0), (180, 0), (181, 0)], 1) == [(179, 0), (181, 0)]
+
+
+def route_results():
+    yield sr.searoute(*PAIRS[0])
+    yield sr.searoute(*PAIRS[1], output='route')
+    yield sr.searoute(*PAIRS[2], output='array')
+
+
+def test_write_routes_ndjson():
+    expected = list(route_results())
+    file = io.StringIO()
+    written = []
+
+    def routes():
+        for result in route_results():
+            # the previous routes are already written when the next one is computed
+            assert file.getvalue().count('"type":"Feature"') == len(written)
+            written.append(result)
+            yield result
+
+    assert write_routes(routes(), file, precision=4) == 3
+    lines = file.getvalue().splitlines()
+    assert len(lines) == 3
+    for line, result in zip(lines, expected):
+        feature = json.loads(line)
+        assert feature['type'] == 'Feature' and feature['geometry']['type'] == 'LineString'
+        coordinates = result[0] if isinstance(result, tuple) else getattr(result, 'coordinates', None)
+        if coordinates is None:
+            coordinates = result['geometry']['coordinates']
+        assert np.allclose(feature['geometry']['coordinates'], np.round(coordinates, 4), rtol=0, atol=1e-9)
+        properties = result[1] if isinstance(result, tuple) else result.properties
+        assert feature['properties'] == properties
+
+
+def test_write_routes_feature_collection(tmp_path):
+    path = tmp_path / 'routes.geojson.gz'
+    assert write_routes(route_results(), path, format='geojson') == 3
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        collection = json.load(f)
+    assert collection['type'] == 'FeatureCollection' and len(collection['features']) == 3
+
+    file = io.StringIO()
+    assert write_routes(iter(()), file, format='geojson') == 0
+    assert json.loads(file.getvalue()) == {'type': 'FeatureCollection', 'features': []}
+    file = io.StringIO()
+    assert write_routes([], file) == 0 and file.getvalue() == ''
+
+
+def test_write_routes_errors():
+    with pytest.raises(ValueError):
+        write_routes([], io.StringIO(), format='csv')
+    with pytest.raises(TypeError):
+        write_routes([sr.searoute(*PAIRS[0], output='polyline')], io.StringIO())